@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+"""
+Benchmarks leech cycles against local stand-in seedboxes
+
+Runs leecher.download() against a fake seedbox of each client type with
+10, 1000 and 50000 finished torrents (by default), and prints one JSON
+document with the cycle latency, the time spent in each phase, the number
+of requests served and the peak memory of every run.  Everything runs
+offline on the local machine; see fakes.py.
+
+Usage:
+
+    PYTHONPATH=src python3 benchmarks/bench_leecher.py [-o results.json]
+
+Every run does two cycles: a cold one, with new_items torrents left to
+download (all others already recorded as done), and a warm one, where
+everything is done, which measures the steady-state polling cost.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes  # noqa: E402
+from seedboxtools import clients, leecher, state, util  # noqa: E402
+from seedboxtools.scheduler import TransferScheduler  # noqa: E402
+
+PHASES = [
+    "list_torrents",
+    "exists_on_server_many",
+    "transfer",
+    "remove_remote_downloads",
+]
+
+
+class PhaseTimer:
+    """Accumulates the time spent in some methods of a client."""
+
+    def __init__(self, client):
+        self.seconds = dict((p, 0.0) for p in PHASES)
+        self.calls = dict((p, 0) for p in PHASES)
+        self._lock = threading.Lock()
+        for phase in PHASES:
+            if hasattr(client, phase):
+                setattr(client, phase, self._wrap(phase, getattr(client, phase)))
+
+    def _add(self, phase, seconds):
+        with self._lock:
+            self.seconds[phase] += seconds
+            self.calls[phase] += 1
+
+    def _wrap(self, phase, method):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._add(phase, time.perf_counter() - start)
+
+        return wrapper
+
+    def reset(self):
+        for p in PHASES:
+            self.seconds[p] = 0.0
+            self.calls[p] = 0
+
+
+def make_client(name, root, bindir, torrents):
+    """Sets up a fake seedbox for client type name.  Returns the client and
+    the fake server (None if the client does not talk HTTP)."""
+    local = os.path.join(root, "local")
+    os.makedirs(local, exist_ok=True)
+    server = None
+    if name == "TorrentFluxClient":
+        kwargs = fakes.setup_torrentflux(root, bindir, torrents)
+    elif name == "TransmissionClient":
+        kwargs = fakes.setup_transmission_remote(root, bindir, torrents)
+    elif name == "TransmissionRPCClient":
+        server = fakes.FakeTransmissionRPC(root, torrents)
+        kwargs = server.client_kwargs()
+    elif name == "PulsedMedia":
+        server = fakes.FakeRuTorrent(root, torrents)
+        kwargs = server.client_kwargs()
+    else:
+        raise ValueError("no fake seedbox for client %s" % name)
+    client = clients.lookup_client(name)(local_download_dir=local, **kwargs)
+    if name == "PulsedMedia":
+        client.base_url = server.base_url()
+    return client, server
+
+
+def run_cycle(client, store, timer, args):
+    timer.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    retvalue = leecher.download(
+        client,
+        remove_finished=args.remove,
+        scheduler=TransferScheduler(args.parallel),
+        store=store,
+    )
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "retvalue": retvalue,
+        "cycle_seconds": elapsed,
+        "phase_seconds": dict(timer.seconds),
+        "phase_calls": dict(timer.calls),
+        "peak_traced_bytes": peak,
+    }
+
+
+def bench(name, count, new_items, args):
+    root = tempfile.mkdtemp(prefix="seedboxtools-bench-")
+    oldcwd = os.getcwd()
+    oldpath = os.environ["PATH"]
+    oldcache = os.environ.get("XDG_CACHE_HOME")
+    server = None
+    try:
+        bindir = os.path.join(root, "bin")
+        fakes.install_shims(bindir)
+        os.environ["PATH"] = bindir + os.pathsep + oldpath
+        os.environ["XDG_CACHE_HOME"] = os.path.join(root, "cache")
+        torrents = fakes.make_torrents(count)
+        client, server = make_client(name, root, bindir, torrents)
+        os.chdir(client.local_download_dir)
+        timer = PhaseTimer(client)
+
+        # Everything but new_items is already downloaded.
+        store = state.StateStore(os.path.join(root, "state.sqlite"))
+        store.migrate_markers(client.identity)
+        for t in torrents[new_items:]:
+            store.finished(client.identity, t.name, t.name, True)
+
+        result = {"client": name, "torrents": count, "new_items": new_items}
+        for cycle in ("cold", "warm"):
+            before = server.requests if server else None
+            result[cycle] = run_cycle(client, store, timer, args)
+            if server:
+                result[cycle]["http_requests"] = server.requests - before
+        result["maxrss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        store.close()
+        return result
+    finally:
+        if server:
+            server.close()
+        os.chdir(oldcwd)
+        os.environ["PATH"] = oldpath
+        if oldcache is None:
+            os.environ.pop("XDG_CACHE_HOME", None)
+        else:
+            os.environ["XDG_CACHE_HOME"] = oldcache
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        default="10,1000,50000",
+        help="comma-separated numbers of torrents (default %(default)s)",
+    )
+    parser.add_argument(
+        "-c",
+        "--clients",
+        default=",".join(sorted(clients.clients)),
+        help="comma-separated client types (default %(default)s)",
+    )
+    parser.add_argument(
+        "-n",
+        "--new-items",
+        type=int,
+        default=10,
+        help="torrents left to download in the cold cycle (default %(default)s)",
+    )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        type=int,
+        default=1,
+        help="transfers at the same time (default %(default)s)",
+    )
+    parser.add_argument(
+        "-r",
+        "--remove",
+        action="store_true",
+        default=False,
+        help="remove finished torrents, like leechtorrents -r",
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="write JSON results here (default stdout)"
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    util.set_verbose(False)
+    results = []
+    for name in args.clients.split(","):
+        for count in [int(x) for x in args.sizes.split(",")]:
+            new_items = min(args.new_items, count)
+            print("%s with %s torrents..." % (name, count), file=sys.stderr)
+            results.append(bench(name, count, new_items, args))
+    document = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Local stand-ins for seedboxes, used by the benchmarks
+
+Every seedbox lives under a local directory (the "remote" root).  The fake
+ssh runs remote commands locally, so remote paths are local paths under
+that root; the fake rsync only creates an empty file where the download
+would have landed.  The HTTP servers run in threads of the calling process.
+"""
+
+import hashlib
+import http.server
+import json
+import os
+import stat
+import threading
+import xmlrpc.client
+
+# Runs the remote command locally.  ssh -O (master control) reports that
+# there is no master; ssh -N (starting a master) succeeds doing nothing.
+SSH_SHIM = r"""#!/bin/sh
+while [ $# -gt 0 ] ; do
+    case "$1" in
+        -O) exit 255 ;;
+        -o|-e|-p|-l|-i|-F|-S) shift 2 ;;
+        -*) shift ;;
+        *) shift ; break ;;
+    esac
+done
+[ $# -eq 0 ] && exit 0
+exec sh -c "$*"
+"""
+
+# Creates an empty file named like the source in the destination.
+RSYNC_SHIM = r"""#!/bin/sh
+src= ; dest=
+for a ; do src=$dest ; dest=$a ; done
+src=${src#*:}
+touch "$dest/$(basename "$src")"
+"""
+
+FLUXCLI_SHIM = r"""#!/bin/sh
+exec cat "$(dirname "$0")/fluxcli-transfers.txt"
+"""
+
+# transmission-remote HOST --auth=U:P -l
+# env LANG=C transmission-remote HOST --auth=U:P -t ID -f
+# env LANG=C transmission-remote HOST --auth=U:P -t ID,ID,... --remove-and-delete
+TRANSMISSION_REMOTE_SHIM = r"""#!/bin/sh
+dir=$(dirname "$0")
+while [ $# -gt 0 ] ; do
+    case "$1" in
+        -l) exec cat "$dir/transmission-list.txt" ;;
+        -t) id=$2 ; shift 2 ;;
+        -f) exec cat "$dir/transmission-files/$id" ;;
+        --remove-and-delete)
+            for one in $(echo "$id" | tr , ' ') ; do
+                sed -i "/^ *$one   /d" "$dir/transmission-list.txt" || exit 1
+            done
+            exit 0 ;;
+        *) shift ;;
+    esac
+done
+"""
+
+
+def install_shims(bindir):
+    """Writes the fake commands to bindir.  Put bindir first on PATH."""
+    os.makedirs(bindir, exist_ok=True)
+    for name, text in [
+        ("ssh", SSH_SHIM),
+        ("rsync", RSYNC_SHIM),
+        ("fluxcli", FLUXCLI_SHIM),
+        ("transmission-remote", TRANSMISSION_REMOTE_SHIM),
+    ]:
+        path = os.path.join(bindir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP)
+
+
+class FakeTorrent:
+    __slots__ = ("id", "infohash", "name", "size", "seeding")
+
+    def __init__(self, n, size=1 << 20):
+        self.id = n + 1
+        self.name = "Linux-ISO-%06d.iso" % n
+        self.infohash = hashlib.sha1(self.name.encode()).hexdigest().upper()
+        self.size = size
+        self.seeding = n % 2 == 0
+
+
+def make_torrents(count):
+    return [FakeTorrent(n) for n in range(count)]
+
+
+def populate_incoming(incoming_dir, torrents):
+    """Creates the downloaded (empty) files of torrents on the remote side."""
+    os.makedirs(incoming_dir, exist_ok=True)
+    for t in torrents:
+        open(os.path.join(incoming_dir, t.name), "w").close()
+
+
+def torrent_file(t):
+    """Returns the bencoded .torrent of a fake torrent."""
+    name = t.name.encode()
+    info = b"d6:lengthi%de4:name%d:%s12:piece lengthi262144e6:pieces0:e" % (
+        t.size,
+        len(name),
+        name,
+    )
+    return b"d8:announce16:http://tracker/a4:info" + info + b"e"
+
+
+def setup_torrentflux(root, bindir, torrents):
+    """Lays out a TorrentFlux seedbox under root.  Returns client kwargs."""
+    base_dir = os.path.join(root, "torrentflux")
+    transfers = os.path.join(base_dir, ".transfers")
+    os.makedirs(transfers, exist_ok=True)
+    lines = ["Transfers:", ""]
+    for t in torrents:
+        with open(os.path.join(transfers, t.name + ".torrent"), "wb") as f:
+            f.write(torrent_file(t))
+        lines.append(
+            "- %s.torrent - %.1f MB - %s"
+            % (t.name, t.size / 1048576.0, "Seeding" if t.seeding else "Done")
+        )
+    lines += ["", "", "", "", ""]
+    with open(os.path.join(bindir, "fluxcli-transfers.txt"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    incoming = os.path.join(root, "incoming")
+    populate_incoming(incoming, torrents)
+    return dict(
+        hostname="fakeflux",
+        base_dir=base_dir,
+        incoming_dir=incoming,
+        torrentinfo_path="",
+        fluxcli_path=os.path.join(bindir, "fluxcli"),
+    )
+
+
+def setup_transmission_remote(root, bindir, torrents):
+    """Lays out a Transmission seedbox queried through transmission-remote.
+    Returns client kwargs."""
+    lines = ["%-70s" % "    ID   Done       Have  ETA           Up    Down  Ratio  Status       Name"]
+    filesdir = os.path.join(bindir, "transmission-files")
+    os.makedirs(filesdir, exist_ok=True)
+    for t in torrents:
+        status = "Seeding" if t.seeding else "Stopped"
+        row = "%6d   100%%   1.0 MB  Done         0.0     0.0    1.0  %-12s " % (
+            t.id,
+            status,
+        )
+        lines.append("%-70s%s" % (row, t.name))
+        with open(os.path.join(filesdir, str(t.id)), "w") as f:
+            f.write("%s (1 files):\n" % t.name)
+            f.write("  #  Done Priority Get      Size  Name\n")
+            f.write("%-34s%s\n" % ("  0: 100% Normal   Yes    1.0 MB", t.name))
+    lines.append("Sum:           1.0 MB               0.0     0.0")
+    with open(os.path.join(bindir, "transmission-list.txt"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    incoming = os.path.join(root, "incoming")
+    populate_incoming(incoming, torrents)
+    return dict(
+        hostname="faketransmission",
+        torrents_dir=os.path.join(root, "torrents"),
+        incoming_dir=incoming,
+        torrentinfo_path="",
+        transmission_remote_path=os.path.join(bindir, "transmission-remote"),
+        transmission_remote_user="admin",
+        transmission_remote_password="",
+    )
+
+
+class _Server:
+    """An HTTP server running in a daemon thread."""
+
+    def __init__(self, handler):
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add 40 ms to every keep-alive request.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def reply(self, status, data, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeTransmissionRPC(_Server):
+    """Transmission RPC endpoint serving the given torrents."""
+
+    def __init__(self, root, torrents):
+        self.incoming = os.path.join(root, "incoming")
+        populate_incoming(self.incoming, torrents)
+        self.torrents = dict((t.id, t) for t in torrents)
+        self.requests = 0
+        server = self
+
+        class Handler(_Handler):
+            def do_POST(self):
+                body = self.body()
+                server.requests += 1
+                if self.headers.get("X-Transmission-Session-Id") != "fake":
+                    self.reply(409, b"", "text/plain", [("X-Transmission-Session-Id", "fake")])
+                    return
+                request = json.loads(body)
+                args = request.get("arguments", {})
+                result = {}
+                if request["method"] == "torrent-get":
+                    result["torrents"] = [
+                        {
+                            "id": t.id,
+                            "name": t.name,
+                            "hashString": t.infohash.lower(),
+                            "status": 6 if t.seeding else 0,
+                            "leftUntilDone": 0,
+                            "percentDone": 1.0,
+                            "downloadDir": server.incoming,
+                            "totalSize": t.size,
+                            "sizeWhenDone": t.size,
+                            "doneDate": 1600000000 + t.id,
+                            "files": [{"name": t.name, "length": t.size}],
+                        }
+                        for t in list(server.torrents.values())
+                    ]
+                elif request["method"] == "torrent-remove":
+                    for i in args.get("ids", []):
+                        server.torrents.pop(i, None)
+                data = json.dumps({"result": "success", "arguments": result})
+                self.reply(200, data.encode(), "application/json")
+
+        _Server.__init__(self, Handler)
+
+    def client_kwargs(self):
+        return dict(
+            hostname="127.0.0.1:%s" % self.port,
+            ssh_hostname="faketransmission",
+            incoming_dir=self.incoming,
+            rpc_url="http://127.0.0.1:%s/transmission/rpc" % self.port,
+        )
+
+
+class FakeRuTorrent(_Server):
+    """ruTorrent httprpc and addtorrent endpoints serving the given torrents."""
+
+    login = "fake"
+
+    def __init__(self, root, torrents):
+        self.incoming = os.path.join(root, "incoming")
+        populate_incoming(self.incoming, torrents)
+        self.torrents = dict((t.infohash, t) for t in torrents)
+        self.requests = 0
+        self.uploads = 0
+        server = self
+
+        class Handler(_Handler):
+            def do_POST(self):
+                body = self.body()
+                server.requests += 1
+                if self.path.endswith("/php/addtorrent.php"):
+                    server.uploads += 1
+                    self.reply(200, b"addTorrentSuccess", "text/html")
+                elif body.startswith(b"mode=list"):
+                    data = {"t": server.rows(), "cid": server.requests}
+                    self.reply(200, json.dumps(data).encode(), "application/json")
+                else:
+                    params, method = xmlrpc.client.loads(body)
+                    response = server.xmlrpc(method, params)
+                    data = xmlrpc.client.dumps((response,), methodresponse=True)
+                    self.reply(200, data.encode(), "text/xml")
+
+        _Server.__init__(self, Handler)
+
+    def row(self, t):
+        row = [""] * 34
+        row[0] = "1" if t.seeding else "0"
+        row[1] = t.name
+        row[2] = str(t.size)
+        row[5] = str(t.size)
+        row[6] = row[7] = "4"
+        row[14] = ""
+        row[25] = os.path.join(self.incoming, t.name)
+        row[26] = str(1600000000 + int(t.infohash[:6], 16) % 100000)
+        return row
+
+    def rows(self):
+        return dict((h, self.row(t)) for h, t in list(self.torrents.items()))
+
+    def xmlrpc(self, method, params):
+        calls = params[0] if method == "system.multicall" else [
+            {"methodName": method, "params": params}
+        ]
+        results = []
+        for call in calls:
+            if call["methodName"] == "d.erase":
+                self.torrents.pop(call["params"][0], None)
+            results.append([0])
+        return results if method == "system.multicall" else results[0][0]
+
+    def client_kwargs(self):
+        return dict(
+            hostname="127.0.0.1:%s" % self.port,
+            ssh_hostname="fakerutorrent",
+            login=self.login,
+            password="fake",
+        )
+
+    def base_url(self):
+        return "http://127.0.0.1:%s/user-%s/rutorrent" % (self.port, self.login)
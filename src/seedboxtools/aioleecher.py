@@ -0,0 +1,417 @@
+"""
+asyncio engine for the leecher, which keeps polling while downloads run
+"""
+
+import asyncio
+import concurrent.futures
+import signal
+import subprocess
+import time
+import traceback
+from seedboxtools import leecher, metrics, processor, util
+from seedboxtools.remotewatch import RemoteWatcher
+
+
+class Slots:
+    """Like asyncio.Semaphore, but a slot that frees up goes to the waiter
+    whose key() is lowest."""
+
+    def __init__(self, value):
+        self._value = value
+        self._waiters = []
+
+    async def acquire(self, key=tuple):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        waiter = (key, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif not waiter[1].cancelled():
+                # Given the slot just as it was cancelled.
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda w: w[0]())
+            self._waiters.remove(waiter)
+            if not waiter[1].done():
+                waiter[1].set_result(None)
+                return
+        self._value += 1
+
+
+class Engine:
+    """Leeches from client in an event loop, polling while at most parallel
+    transfers run."""
+
+    def __init__(
+        self,
+        client,
+        store,
+        remove_finished=False,
+        run_processor_program=None,
+        parallel=1,
+        shards=1,
+        processors=None,
+        pacer=None,
+        watch=False,
+        ordering=None,
+        space=None,
+    ):
+        self.client = client
+        self.store = store
+        self.remove_finished = remove_finished
+        self.run_processor_program = run_processor_program
+        self.parallel = parallel
+        self.shards = shards
+        self.processors = processors
+        self.pacer = pacer
+        self.watch = watch
+        self.ordering = ordering
+        self.space = space
+        self.retvalue = 0
+        # filename -> task, for items being transferred or removed, so that
+        # polls while they are in flight do not queue them again.
+        self._inflight = {}
+        # Items whose transfers wait for a free slot.
+        self._waiting = set()
+        # Items queued, and the state they were in before.
+        self._queued = {}
+        # Removals that go to the server together, as (torrent, seeding,
+        # filename, snapshot, future), and the task that sends them.
+        self._removals = []
+        self._remover = None
+        # The transfer slots shared with other engines, and how many of
+        # them this one holds.
+        self._shared = None
+        self._running = 0
+        self._wake = None
+
+    async def _call(self, function, *args):
+        """Runs a blocking call into the client in the thread pool."""
+        # Clients keep caches that are not safe to share between threads.
+        async with self._client_lock:
+            return await self._loop.run_in_executor(self._executor, function, *args)
+
+    async def _poll(self):
+        """Runs a leech cycle up to the point where work is handed out.
+        Returns False if the cycle failed."""
+        try:
+            await self._call(self.client.ensure_connected)
+            downloads, removals, snapshot = await self._call(
+                leecher.find_work, self.client, self.store, self.remove_finished
+            )
+        except Exception as e:
+            metrics.cycle_finished(self.client.identity, None)
+            status = leecher.cycle_exception_status(e)
+            if status:
+                self.retvalue = status
+            return False
+        metrics.cycle_finished(self.client.identity, 0)
+        if self.ordering is not None:
+            downloads = self.ordering.order(downloads, snapshot)
+        if self.space is not None:
+            downloads = [d for d in downloads if d[2] not in self._inflight]
+            # Walks the download directory, so not in the event loop.
+            downloads = await self._loop.run_in_executor(
+                self._executor,
+                leecher.admit_transfers,
+                self.client,
+                self.space,
+                downloads,
+            )
+        for torrent, seeding, filename, nbytes in downloads:
+            if leecher.sighandled:
+                break
+            if filename in self._inflight:
+                continue
+            self._queued[filename] = leecher.queue_transfer(
+                self.client, self.store, torrent, filename, nbytes, snapshot
+            )
+            self._waiting.add(filename)
+            self._start(
+                filename, self._transfer(torrent, seeding, filename, nbytes, snapshot)
+            )
+        for torrent, seeding, filename in removals:
+            if leecher.sighandled:
+                break
+            if filename in self._inflight:
+                continue
+            self._start(filename, self._remove(torrent, filename, seeding, snapshot))
+        return True
+
+    def _start(self, filename, coro):
+        task = self._loop.create_task(coro)
+        self._inflight[filename] = task
+        task.add_done_callback(lambda _: self._done(filename))
+
+    def _done(self, filename):
+        self._inflight.pop(filename, None)
+        if self.space is not None:
+            self.space.release(filename, self.client.identity)
+        if filename in self._queued:
+            # Back to how it was, if the transfer never started.
+            self.store.unqueued(
+                self.client.identity, filename, self._queued.pop(filename)
+            )
+        # Cancelled while waiting for a slot.
+        if filename in self._waiting:
+            self._waiting.discard(filename)
+            metrics.TRANSFERS_QUEUED.labels(self.client.identity).dec()
+
+    async def _remove(self, torrent, filename, seeding, snapshot):
+        if leecher.sighandled:
+            return
+        done = self._loop.create_future()
+        self._removals.append((torrent, seeding, filename, snapshot, done))
+        if self._remover is None or self._remover.done():
+            self._remover = self._loop.create_task(self._remove_batches())
+        await done
+
+    async def _remove_batches(self):
+        # Whatever is queued while a batch is under way goes in the next
+        # one, split by the listing the items came from.
+        while self._removals:
+            queued, self._removals = self._removals, []
+            batches = {}
+            for item in queued:
+                batches.setdefault(id(item[3]), []).append(item)
+            for batch in batches.values():
+                try:
+                    status = await self._call(
+                        leecher.remove_items,
+                        self.client,
+                        self.store,
+                        [item[:3] for item in batch],
+                        batch[0][3],
+                    )
+                except Exception as e:
+                    util.report_error(
+                        "Removal of %s failed -- %s: %s"
+                        % (", ".join(item[2] for item in batch), type(e).__name__, e)
+                    )
+                    traceback.print_exc()
+                    status = 1
+                if status:
+                    self.retvalue = self.retvalue or 1
+                for item in batch:
+                    if not item[4].done():
+                        item[4].set_result(None)
+
+    async def _run_transfer(self, filename, monitor, resume, snapshot):
+        if self.shards > 1:
+            return await self._loop.run_in_executor(
+                self._executor,
+                self.client.transfer_sharded,
+                filename,
+                self.shards,
+                monitor,
+                resume,
+                snapshot,
+            )
+        process = await asyncio.create_subprocess_exec(
+            *self.client.transfer_cmdline(filename, resume, snapshot),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+        )
+        output = util.RsyncOutput(monitor)
+        while True:
+            data = await process.stdout.read(65536)
+            if not data:
+                break
+            output.feed(data)
+        output.close()
+        return await process.wait()
+
+    async def _transfer(self, torrent, seeding, filename, nbytes, snapshot):
+        client, store = self.client, self.store
+        # If cancelled while waiting, _done() takes it off the queue.
+        key = tuple
+        if self.ordering is not None:
+            # Worked out when a slot frees up, as deadlines pass meanwhile.
+            record = snapshot.by_name(torrent)
+            key = lambda: self.ordering.key(record, filename, nbytes)
+        await self._transfers.acquire(key)
+        try:
+            # The engine with the fewest transfers running goes first.
+            await self._shared.acquire(lambda: (self._running,) + key())
+        except asyncio.CancelledError:
+            self._transfers.release()
+            raise
+        self._running += 1
+        self._waiting.discard(filename)
+        metrics.TRANSFERS_QUEUED.labels(client.identity).dec()
+        try:
+            if leecher.sighandled:
+                return
+            # From here on a signal lets the transfer finish on its own,
+            # rather than cancelling it.
+            resume = leecher.start_transfer(client, store, torrent, filename)
+            monitor = leecher.TransferMonitor(client, filename, nbytes, self.space)
+            try:
+                retvalue = await self._run_transfer(filename, monitor, resume, snapshot)
+            except Exception as e:
+                leecher.end_transfer(client, store, torrent, filename, nbytes, -1)
+                util.report_error(
+                    "Download of %s failed -- %s: %s"
+                    % (filename, type(e).__name__, e)
+                )
+                traceback.print_exc()
+                self.retvalue = self.retvalue or 1
+                return
+            finally:
+                monitor.close()
+            leecher.end_transfer(client, store, torrent, filename, nbytes, retvalue)
+        finally:
+            self._running -= 1
+            self._shared.release()
+            self._transfers.release()
+        if retvalue != 0:
+            if leecher.report_transfer_failure(filename, retvalue) == 2:
+                self._cancel_queued()
+                self.retvalue = 2
+            else:
+                self.retvalue = self.retvalue or 1
+            return
+        if self.run_processor_program is not None:
+            await self._run_processor(filename)
+        if self.remove_finished and not leecher.sighandled:
+            await self._remove(torrent, filename, seeding, snapshot)
+
+    async def _run_processor(self, filename):
+        program = self.run_processor_program
+        if self.processors is not None:
+            # Only blocks while the queue is full.
+            await self._loop.run_in_executor(
+                None, self.processors.submit, program, filename
+            )
+            return
+        async with self._processors:
+            try:
+                started = time.monotonic()
+                process = await asyncio.create_subprocess_exec(
+                    program, filename, stdin=subprocess.DEVNULL
+                )
+                retval = await process.wait()
+            except OSError as e:
+                util.report_error("Program %r is not executable: %s" % (program, e))
+                return
+        processor.report_exit(program, filename, retval, started)
+
+    def _cancel_queued(self):
+        """Cancels the tasks of transfers that have not started."""
+        for filename in list(self._waiting):
+            self._inflight[filename].cancel()
+
+    def _stop(self):
+        """Stops starting transfers, and ends the wait between polls."""
+        self._cancel_queued()
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _wait_inflight(self):
+        while self._inflight:
+            await asyncio.wait(list(self._inflight.values()))
+
+    async def _main(self, run_every, shared=None):
+        self._loop = asyncio.get_running_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.parallel + 1)
+        self._client_lock = asyncio.Lock()
+        self._transfers = Slots(self.parallel)
+        self._shared = Slots(self.parallel) if shared is None else shared
+        self._processors = asyncio.Semaphore(self.parallel)
+        # Set to end the wait between polls early.
+        self._wake = asyncio.Event()
+        watcher = None
+        if self.watch:
+            watcher = RemoteWatcher(
+                self.client,
+                lambda names: self._loop.call_soon_threadsafe(self._wake.set),
+            )
+        try:
+            if run_every is False:
+                await self._poll()
+                await self._wait_inflight()
+            else:
+                while not leecher.sighandled:
+                    self._wake.clear()
+                    await self._poll()
+                    if (
+                        watcher is not None
+                        and not leecher.sighandled
+                        and self.client.latest is not None
+                    ):
+                        watcher.watch(await self._call(self.client.watch_dirs))
+                    interval = await self._call(
+                        leecher.next_poll_interval, self.client, self.pacer, run_every
+                    )
+                    if not leecher.sighandled:
+                        util.report_message("Sleeping %s seconds" % interval)
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), interval)
+                    except asyncio.TimeoutError:
+                        pass
+                await self._wait_inflight()
+        finally:
+            if watcher is not None:
+                watcher.stop()
+            self._executor.shutdown()
+        leecher.report_cycle_result(self.retvalue)
+        return self.retvalue
+
+    def run(self, run_every=False):
+        """Leeches once, or every run_every seconds until a signal arrives.
+        Returns the same status as leecher.download()."""
+        return run([self], run_every)
+
+
+async def _run(engines, run_every, parallel):
+    loop = asyncio.get_running_loop()
+    shared = Slots(parallel)
+
+    def on_signal(signum):
+        # The same as the threaded engine: pass the signal on to the whole
+        # process group, so running rsyncs stop, and do not start more.
+        leecher.sighandler(signum, None)
+        for engine in engines:
+            engine._stop()
+
+    signums = [signal.SIGTERM, signal.SIGINT]
+    handlers = [signal.getsignal(s) for s in signums]
+    for signum in signums:
+        loop.add_signal_handler(signum, on_signal, signum)
+    try:
+        results = await asyncio.gather(
+            *[engine._main(run_every, shared) for engine in engines],
+            return_exceptions=len(engines) > 1,
+        )
+    finally:
+        for signum, handler in zip(signums, handlers):
+            loop.remove_signal_handler(signum)
+            signal.signal(signum, handler)
+    return results
+
+
+def run(engines, run_every=False, parallel=None):
+    """Runs engines, one per seedbox, in one event loop, sharing parallel
+    transfer slots.  Returns the highest of their statuses."""
+    if parallel is None:
+        parallel = engines[0].parallel
+    results = asyncio.run(_run(engines, run_every, parallel))
+    retvalue = 0
+    for engine, result in zip(engines, results):
+        if isinstance(result, BaseException):
+            util.report_error(
+                "Leeching from %s failed -- %s: %s"
+                % (engine.client.identity, type(result).__name__, result)
+            )
+            traceback.print_exception(type(result), result, result.__traceback__)
+            result = 1
+        retvalue = max(retvalue, result)
+    return retvalue
@@ -0,0 +1,84 @@
+"""
+Bencode decoding for seedboxtools
+"""
+
+import hashlib
+
+
+class BencodeError(ValueError):
+    pass
+
+
+def _decode(data, pos):
+    """Decodes the value at data[pos:], returning (value, end position)."""
+    try:
+        c = data[pos : pos + 1]
+        if c == b"i":
+            end = data.index(b"e", pos)
+            return int(data[pos + 1 : end]), end + 1
+        if c == b"l":
+            pos, value = pos + 1, []
+            while data[pos : pos + 1] != b"e":
+                item, pos = _decode(data, pos)
+                value.append(item)
+            return value, pos + 1
+        if c == b"d":
+            pos, value = pos + 1, {}
+            while data[pos : pos + 1] != b"e":
+                key, pos = _decode(data, pos)
+                value[key], pos = _decode(data, pos)
+            return value, pos + 1
+        if c.isdigit():
+            colon = data.index(b":", pos)
+            start = colon + 1
+            end = start + int(data[pos:colon])
+            if end > len(data):
+                raise BencodeError("string at %s runs past the end" % pos)
+            return data[start:end], end
+    except (ValueError, IndexError) as e:
+        if isinstance(e, BencodeError):
+            raise
+        raise BencodeError("malformed data at %s: %s" % (pos, e))
+    raise BencodeError("unexpected %r at %s" % (c, pos))
+
+
+def decode(data):
+    """Decodes bencoded bytes.  Strings are returned as bytes."""
+    value, end = _decode(data, 0)
+    if end != len(data):
+        raise BencodeError("trailing data at %s" % end)
+    return value
+
+
+def info_span(data):
+    """Returns (start, end) of the raw info dictionary in torrent data."""
+    if data[:1] != b"d":
+        raise BencodeError("torrent data is not a dictionary")
+    pos = 1
+    while data[pos : pos + 1] != b"e":
+        key, pos = _decode(data, pos)
+        start = pos
+        _, pos = _decode(data, pos)
+        if key == b"info":
+            return start, pos
+    raise BencodeError("torrent data has no info dictionary")
+
+
+def infohash(data):
+    """Returns the hex infohash of torrent data."""
+    start, end = info_span(data)
+    return hashlib.sha1(data[start:end]).hexdigest()
+
+
+def torrent_name(data):
+    """
+    Returns the name of the file (single-file torrents) or top directory
+    (multi-file torrents) that torrent data downloads to.
+    """
+    info = decode(data).get(b"info")
+    if not isinstance(info, dict):
+        raise BencodeError("torrent data has no info dictionary")
+    name = info.get(b"name.utf-8", info.get(b"name"))
+    if not isinstance(name, bytes):
+        raise BencodeError("torrent data has no name")
+    return name.decode("utf-8", "surrogateescape")
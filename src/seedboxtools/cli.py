@@ -23,6 +23,26 @@ def get_parser():
         help="start up and run forever, looping every X seconds; useful for systemd executions",
         action='store', dest='run_every', default=False
     )
+    parser.add_option(
+        '--adaptive',
+        help="with --run-every, poll the seedbox sooner when a torrent is about to finish, and less and less often while nothing changes, starting every X seconds",
+        action='store_true', dest='adaptive', default=False
+    )
+    parser.add_option(
+        '--watch',
+        help="with --run-every, keep an SSH session open to the seedbox that watches its download directories, and start downloading as soon as a torrent finishes instead of waiting for the next check",
+        action='store_true', dest='watch', default=False
+    )
+    parser.add_option(
+        '--poll-min',
+        help="with --adaptive, never poll more often than every SECONDS (default %default)",
+        action='store', type='int', dest='poll_min', default=10, metavar='SECONDS'
+    )
+    parser.add_option(
+        '--poll-max',
+        help="with --adaptive, never poll less often than every SECONDS (default %default)",
+        action='store', type='int', dest='poll_max', default=1800, metavar='SECONDS'
+    )
     parser.add_option(
         "-r", '--remove-finished',
         help="remove downloaded torrents that are not seeding anymore",
@@ -33,6 +53,26 @@ def get_parser():
         help="run program after completing download, passing path to download as first argument",
         action='store', dest='run_processor_program', default=None
     )
+    parser.add_option(
+        '--processor-jobs',
+        help="run the program of --run-processor-program on up to N downloads at the same time, in the background, while downloads carry on (default %default)",
+        action='store', type='int', dest='processor_jobs', default=1, metavar='N'
+    )
+    parser.add_option(
+        '--processor-timeout',
+        help="stop the program of --run-processor-program if it runs for more than SECONDS; 0 means no limit (default %default)",
+        action='store', type='int', dest='processor_timeout', default=0, metavar='SECONDS'
+    )
+    parser.add_option(
+        '--processor-retries',
+        help="run the program of --run-processor-program again up to N times if it fails, waiting a minute the first time and twice as long every next time (default %default)",
+        action='store', type='int', dest='processor_retries', default=0, metavar='N'
+    )
+    parser.add_option(
+        '--processor-queue',
+        help="let up to N downloads wait for the program of --run-processor-program; once that many wait, downloads pause until it catches up (default %default)",
+        action='store', type='int', dest='processor_queue', default=100, metavar='N'
+    )
     parser.add_option(
         "-l", '--lock',
         help="lock working directory; useful for cron executions (combine with --daemon to prevent cron from jamming until downloads are finished)",
@@ -43,6 +83,61 @@ def get_parser():
         help="lock home directory; alternative (mutually exclusive) to --lock",
         action='store_true', dest='lock_homedir', default=False
     )
+    parser.add_option(
+        "-p", '--parallel',
+        help="download up to N torrents at the same time, across all the seedboxes configured (default %default)",
+        action='store', type='int', dest='parallel', default=1, metavar='N'
+    )
+    parser.add_option(
+        '--parallel-per-host',
+        help="download at most N torrents at the same time from the same seedbox; 0 means no limit other than --parallel (default %default)",
+        action='store', type='int', dest='parallel_per_host', default=0, metavar='N'
+    )
+    parser.add_option(
+        '--shards',
+        help="split the files of each torrent in up to N groups of similar size, and download the groups with N simultaneous rsync processes (default %default)",
+        action='store', type='int', dest='shards', default=1, metavar='N'
+    )
+    parser.add_option(
+        '--order',
+        help="download finished torrents in this order: listing (as the seedbox lists them), smallest (smallest first), oldest (finished longest ago first), label (by --order-labels, smallest first within each label) or deadline (smallest first, but those finished more than --order-deadline seconds ago before all others) (default %default)",
+        action='store', type='choice', choices=['listing', 'smallest', 'oldest', 'label', 'deadline'], dest='order', default='listing'
+    )
+    parser.add_option(
+        '--order-labels',
+        help="with --order=label, download torrents with these comma-separated labels first, in this order, and those with other labels or none last",
+        action='store', dest='order_labels', default=None, metavar='LABELS'
+    )
+    parser.add_option(
+        '--order-deadline',
+        help="with --order=deadline, download torrents that finished on the seedbox more than SECONDS ago before all others (default %default)",
+        action='store', type='int', dest='order_deadline', default=3600, metavar='SECONDS'
+    )
+    parser.add_option(
+        '--min-free-space',
+        help="start a download only if it leaves at least SIZE (such as 500M or 10G) free in the download directory once done; downloads that do not fit wait for a later cycle (default %default)",
+        action='store', dest='min_free_space', default='0', metavar='SIZE'
+    )
+    parser.add_option(
+        '--engine',
+        help="run downloads with the threads engine, which polls the seedbox again only after the downloads of the previous poll are done, or with the asyncio engine, which polls the seedbox while downloads are running (default %default)",
+        action='store', type='choice', choices=['threads', 'asyncio'], dest='engine', default='threads'
+    )
+    parser.add_option(
+        '--metrics-port',
+        help="serve Prometheus metrics over HTTP at /metrics on PORT; 0 means off (default %default)",
+        action='store', type='int', dest='metrics_port', default=0, metavar='PORT'
+    )
+    parser.add_option(
+        '--metrics-address',
+        help="with --metrics-port, listen on ADDRESS (default %default)",
+        action='store', dest='metrics_address', default='127.0.0.1', metavar='ADDRESS'
+    )
+    parser.add_option(
+        '--metrics-textfile',
+        help="write Prometheus metrics to PATH every 15 seconds, for the textfile collector of the node exporter; PATH must end in .prom",
+        action='store', dest='metrics_textfile', default=None, metavar='PATH'
+    )
     parser.add_option(
         "-q", '--quiet',
         help="do not print anything, except for errors",
@@ -55,6 +150,10 @@ def get_uploader_parser():
     parser = argparse.ArgumentParser(description='Upload torrents and magnet links to seedbox.')
     parser.add_argument('-d', '--debug', action="store_true", default=False,
                         help='enable tracebacks for errors')
-    parser.add_argument('torrents', metavar='TORRENT', nargs='+',
+    parser.add_argument('-j', '--jobs', type=int, default=4, metavar='N',
+                        help='submit up to N requests to the seedbox at the same time (default %(default)s)')
+    parser.add_argument('-w', '--watch', metavar='DIR', action='append', default=[],
+                        help='keep running, and submit every torrent file (or .magnet file holding a magnet link) that shows up in DIR, moving it then to the done or error folder in DIR; can be given more than once')
+    parser.add_argument('torrents', metavar='TORRENT', nargs='*',
                         help='torrent file or magnet link')
     return parser
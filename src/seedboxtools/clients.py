@@ -3,23 +3,73 @@ Client classes for seedboxtools
 """
 
 import seedboxtools.util as util
+import seedboxtools.bencode as bencode
 import re
 import os
+import io
+import hashlib
 import requests
 import json
 import subprocess
+import tarfile
 import xmlrpc.client
 
+from collections import namedtuple
 from functools import partial
-from urllib.parse import quote
 
 # We must present some form of timeout or else the request can hang forever.
 # The documentation insists production code must specify it.
-def post(*args, **kwargs):
+def post(*args, session=None, **kwargs):
     if "timeout" not in kwargs:
         kwargs = dict(kwargs)
         kwargs["timeout"] = 15
-    return requests.post(*args, **kwargs)
+    return (session or requests).post(*args, **kwargs)
+
+
+def is_magnet_link(uploadable):
+    return uploadable.startswith("magnet:")
+
+
+def http_session(pool_size=4):
+    """
+    Returns a requests.Session that keeps up to pool_size connections per
+    host alive between requests, and asks for compressed responses.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+class SessionTransport(xmlrpc.client.Transport):
+    """An XML-RPC transport that sends its requests through a
+    requests.Session, reusing its connection pool."""
+
+    def __init__(self, session, url, timeout=15):
+        xmlrpc.client.Transport.__init__(self)
+        self.session = session
+        self.url = url
+        self.timeout = timeout
+
+    def request(self, host, handler, request_body, verbose=False):
+        r = self.session.post(
+            self.url,
+            data=request_body,
+            headers={"Content-Type": "text/xml"},
+            timeout=self.timeout,
+        )
+        if r.status_code != 200:
+            raise xmlrpc.client.ProtocolError(
+                self.url, r.status_code, r.reason, dict(r.headers)
+            )
+        parser, unmarshaller = self.getparser()
+        parser.feed(r.content)
+        parser.close()
+        return unmarshaller.close()
 
 
 def remote_test_minus_e(passthru, path):
@@ -35,6 +85,158 @@ def remote_test_minus_e(passthru, path):
         raise subprocess.CalledProcessError(returncode, ["ssh", "<host>"] + cmd)
 
 
+RemoteStat = namedtuple("RemoteStat", "exists size mtime")
+MISSING = RemoteStat(False, None, None)
+
+# How far along a torrent is: done out of size, in whatever unit the
+# server reports (bytes, chunks, percent), and the rate in that unit per
+# second, or None if the server does not say.
+Progress = namedtuple("Progress", "torrent done size rate")
+
+# A finished torrent: its name (the torrentdescriptor other methods take),
+# its status ("Done", "Seeding" or "Stopped"), the file or directory it
+# downloads to, and the full path of that on the server.  Its id, infohash,
+# files (a list of (path, size)), size in bytes, when it finished (seconds
+# since the epoch) and label are None if the server does not say.
+Torrent = namedtuple(
+    "Torrent",
+    "name status filename path id infohash files size completed label",
+    defaults=(None,) * 6,
+)
+
+
+class Snapshot:
+    """
+    The torrents on a server as of a single listing: the finished ones
+    (Torrent, in the order get_finished_torrents() returns them) with
+    indexes by id, infohash, name and filename, the progress of all of them
+    (Progress), and the directories on the server they download to.
+
+    It does not change once made, so it can be used by transfers and
+    removals while the next listing is taken.
+    """
+
+    __slots__ = (
+        "torrents",
+        "progress",
+        "dirs",
+        "_by_id",
+        "_by_infohash",
+        "_by_name",
+        "_by_filename",
+    )
+
+    def __init__(self, torrents=(), progress=(), dirs=()):
+        self.torrents = tuple(torrents)
+        self.progress = tuple(progress)
+        self.dirs = tuple(sorted(set(dirs)))
+        self._by_id = dict((t.id, t) for t in self.torrents if t.id is not None)
+        self._by_infohash = dict(
+            (t.infohash, t) for t in self.torrents if t.infohash is not None
+        )
+        self._by_name = dict((t.name, t) for t in self.torrents)
+        self._by_filename = dict((t.filename, t) for t in self.torrents)
+
+    def __iter__(self):
+        return iter(self.torrents)
+
+    def __len__(self):
+        return len(self.torrents)
+
+    def by_id(self, torrent_id):
+        return self._by_id.get(torrent_id)
+
+    def by_infohash(self, infohash):
+        return self._by_infohash.get(infohash)
+
+    def by_name(self, name):
+        return self._by_name.get(name)
+
+    def by_filename(self, filename):
+        return self._by_filename.get(filename)
+
+
+# Reads one path per line on standard input, and prints, for each one,
+# its line number followed by its size in bytes and modification time,
+# or followed by a dash if the path does not exist.  Only directories
+# are walked for their size.
+REMOTE_STAT_SCRIPT = """
+i=0
+while IFS= read -r p ; do
+    if [ -d "$p" ] ; then
+        printf '%s\\t%s\\t%s\\n' "$i" "$(du -sb -- "$p" | cut -f1)" "$(stat -c %Y -- "$p")"
+    elif [ -e "$p" ] ; then
+        printf '%s\\t%s\\t%s\\n' "$i" "$(stat -c %s -- "$p")" "$(stat -c %Y -- "$p")"
+    else
+        printf '%s\\t-\\n' "$i"
+    fi
+    i=$((i+1))
+done
+"""
+
+
+def remote_stat_many(getssh, paths):
+    """
+    Stats all paths on the server in a single SSH round trip.
+    Returns a list of RemoteStat in the same order as paths.
+    """
+    if not paths:
+        return []
+    for path in paths:
+        if "\n" in path:
+            raise ValueError("cannot stat path with a newline: %r" % path)
+    inp = "".join("%s\n" % path for path in paths).encode("utf-8")
+    stdout = getssh(["sh", "-c", REMOTE_STAT_SCRIPT], inp=inp)
+    stats = [MISSING] * len(paths)
+    for line in stdout.splitlines():
+        fields = line.split("\t")
+        if len(fields) == 2 and fields[1] == "-":
+            continue
+        try:
+            n = int(fields[0])
+            path = paths[n]
+        except (ValueError, IndexError):
+            util.report_error("Cannot make sense of remote stat output %r" % line)
+            continue
+        try:
+            size, mtime = int(fields[1]), int(fields[2])
+        except (ValueError, IndexError):
+            # It exists, but du or stat failed on it.
+            util.report_error("Cannot tell the size of %s on the server" % path)
+            size = mtime = None
+        stats[n] = RemoteStat(True, size, mtime)
+    return stats
+
+
+# Reads one path per line on standard input, removes each one, and prints
+# the line numbers of those that could not be removed.
+REMOTE_REMOVE_SCRIPT = """
+i=0
+while IFS= read -r p ; do
+    rm -rf -- "$p" || printf '%s\\n' "$i"
+    i=$((i+1))
+done
+"""
+
+
+def remote_remove_many(getssh, paths):
+    """
+    Removes all paths on the server in a single SSH round trip.
+    Returns a list with, for each path in turn, whether it was removed.
+    """
+    if not paths:
+        return []
+    for path in paths:
+        if "\n" in path:
+            raise ValueError("cannot remove path with a newline: %r" % path)
+    inp = "".join("%s\n" % path for path in paths).encode("utf-8")
+    stdout = getssh(["sh", "-c", REMOTE_REMOVE_SCRIPT], inp=inp)
+    removed = [True] * len(paths)
+    for line in stdout.splitlines():
+        removed[int(line)] = False
+    return removed
+
+
 class SeedboxClientException(Exception):
     pass
 
@@ -56,8 +258,137 @@ class InvalidTorrent(SeedboxClientException):
 
 
 class SeedboxClient:
-    def __init__(self, local_download_dir):
+    ssh_master = None
+    # The Snapshot of the last listing, for the methods not given one.
+    latest = None
+    def __init__(self, local_download_dir, section=None):
         self.local_download_dir = local_download_dir
+        # The configuration section, when it has to tell this client apart
+        # from another one of the same seedbox.
+        self.section = section
+
+    @property
+    def identity(self):
+        """Names the seedbox in the local state store.  The host name, so
+        that switching to another client type for the same seedbox keeps
+        the download history, and the section too if there is one."""
+        if self.section is not None:
+            return "%s@%s" % (self.section, self.hostname)
+        return self.hostname
+
+    def _setup_ssh(self, target):
+        """Sets up the multiplexed SSH connection to target (user@host)
+        and the helpers that run commands through it."""
+        self.ssh_target = target
+        self.ssh_master = util.SSHMaster(target)
+        opts = self.ssh_master.opts()
+        self.getssh = partial(util.ssh_getstdout, target, ssh_opts=opts)
+        self.passthru = partial(util.ssh_passthru, target, ssh_opts=opts)
+        self.popenssh = partial(util.ssh_popen, target, ssh_opts=opts)
+
+    def ensure_connected(self):
+        """
+        Brings up the shared SSH connection to the seedbox, restarting it
+        if it died since the last call.  Commands still work (only slower)
+        if the connection cannot be brought up.
+        """
+        if self.ssh_master is not None and not self.ssh_master.ensure():
+            util.report_error(
+                "Could not open a shared SSH connection to %s"
+                % self.ssh_master.hostname
+            )
+
+    def close(self):
+        """Shuts down the shared SSH connection, if any."""
+        if self.ssh_master is not None:
+            self.ssh_master.close()
+
+    def _rsync_cmdline(self, remote_path, resume=False):
+        rsh = self.ssh_master.rsh() if self.ssh_master else None
+        path = "%s:%s" % (self.ssh_target, remote_path)
+        return util.rsync_cmdline(
+            path, self.local_download_dir, rsh=rsh, resume=resume
+        )
+
+    def _rsync(self, remote_path, progress=None, resume=False):
+        return util.run_rsync(self._rsync_cmdline(remote_path, resume), progress)
+
+    def list_torrents(self):
+        """
+        Lists the torrents on the server, in as few requests as it takes.
+        Returns a Snapshot, which the other methods use from then on when
+        they are not given one.
+        If there is a temporary error, it raises TemporaryMalfunction.
+        """
+        self.latest = self._list_torrents()
+        return self.latest
+
+    def _list_torrents(self):
+        raise NotImplementedError
+
+    def _snapshot(self, snapshot):
+        # The given snapshot, else the latest one, listing if there is none.
+        if snapshot is None:
+            snapshot = self.latest
+        if snapshot is None:
+            snapshot = self.list_torrents()
+        return snapshot
+
+    def transfer_cmdline(self, filename, resume=False, snapshot=None):
+        """
+        Returns the command line that transfer() runs to download filename,
+        for callers that want to run it themselves.
+        """
+        return self._rsync_cmdline(self.remote_path(filename, snapshot), resume)
+
+    def get_file_list(self, filename, snapshot=None):
+        """
+        Returns a list of (path, size) of the files that make up filename,
+        with paths relative to the directory that contains filename.
+        """
+        if snapshot is None:
+            snapshot = self.latest
+        torrent = snapshot.by_filename(filename) if snapshot is not None else None
+        if torrent is not None and torrent.files is not None:
+            # The listing already carries them.
+            return list(torrent.files)
+        path = self.remote_path(filename, snapshot)
+        # ./ keeps find from taking names that start with - for options.
+        script = 'cd "$1" && find "./$2" -type f -printf "%s\\t%p\\0"'
+        stdout = self.getssh(
+            ["sh", "-c", script, "sh", os.path.dirname(path), os.path.basename(path)]
+        )
+        files = []
+        for entry in stdout.split("\0"):
+            if entry:
+                size, name = entry.split("\t", 1)
+                files.append((name[2:], int(size)))
+        return files
+
+    def transfer_sharded(
+        self, filename, shards, progress=None, resume=False, snapshot=None
+    ):
+        """
+        Like transfer(), but splits the files of filename in up to shards
+        groups of about the same size, and runs one rsync for each group at
+        the same time.  Returns 0 only if every rsync succeeded.
+        """
+        if shards > 1:
+            files = self.get_file_list(filename, snapshot)
+            if len(files) > 1:
+                rsh = self.ssh_master.rsh() if self.ssh_master else None
+                parent = os.path.dirname(self.remote_path(filename, snapshot))
+                source = "%s:%s/" % (self.ssh_target, parent)
+                return util.rsync_sharded(
+                    source,
+                    files,
+                    self.local_download_dir,
+                    shards,
+                    rsh=rsh,
+                    progress=progress,
+                    resume=resume,
+                )
+        return self.transfer(filename, progress, resume, snapshot)
 
     def get_finished_torrents(self):
         """
@@ -65,29 +396,103 @@ class SeedboxClient:
         for every torrent that is done.
         If there is a temporary error, it raises TemporaryMalfunction.
         """
-        raise NotImplementedError
+        return [(t.name, t.status) for t in self.list_torrents()]
 
-    def get_file_name(self, torrentname):
+    def get_file_name(self, torrentname, snapshot=None):
         """
         Returns the file or path name to the torrent given a
         torrentdescriptor.
         """
-        raise NotImplementedError
+        torrent = self._snapshot(snapshot).by_name(torrentname)
+        if torrent is None:
+            raise KeyError(torrentname)
+        return torrent.filename
 
-    def transfer(self, filename):
-        raise NotImplementedError
+    def transfer(self, filename, progress=None, resume=False, snapshot=None):
+        """
+        Downloads filename, passing its progress (util.RsyncProgress) to
+        progress if given.  resume says that an earlier download of it was
+        interrupted (see util.rsync_cmdline).  Returns the rsync status.
+        """
+        return self._rsync(self.remote_path(filename, snapshot), progress, resume)
 
-    def exists_on_server(self, filename):
-        raise NotImplementedError
+    def exists_on_server(self, filename, snapshot=None):
+        path = self.remote_path(filename, snapshot)
+        return remote_test_minus_e(self.passthru, path)
 
-    def remove_remote_download(self, filename):
+    def remote_path(self, filename, snapshot=None):
+        """Returns the path to filename on the server: where the torrent
+        that downloads to it keeps it, or else in the incoming directory."""
+        if snapshot is None:
+            snapshot = self.latest
+        torrent = snapshot.by_filename(filename) if snapshot is not None else None
+        if torrent is not None:
+            return torrent.path
+        return os.path.join(self.incoming_dir, filename)
+
+    def watch_dirs(self, snapshot=None):
+        """
+        Returns the directories on the server where finished downloads
+        land, for watching them for changes.
+        """
+        return list(self._snapshot(snapshot).dirs)
+
+    def exists_on_server_many(self, filenames, snapshot=None):
+        """
+        Returns a dictionary of {filename: RemoteStat} for every filename,
+        stating all of them in a single round trip to the server.
+        """
+        filenames = list(filenames)
+        paths = [self.remote_path(f, snapshot) for f in filenames]
+        try:
+            stats = remote_stat_many(self.getssh, paths)
+        except ValueError:
+            # Unusual file names; fall back to checking one by one.
+            stats = [
+                RemoteStat(self.exists_on_server(f, snapshot), None, None)
+                for f in filenames
+            ]
+        return dict(zip(filenames, stats))
+
+    def remove_remote_download(self, filename, snapshot=None):
         raise NotImplementedError
 
-    def get_files_to_download(self):
-        """Returns iterator with get_finished_torrents result."""
-        torrents = self.get_finished_torrents()
-        for name, status in torrents:
-            yield (name, status, self.get_file_name(name))
+    def remove_remote_downloads(self, filenames, snapshot=None):
+        """
+        Removes several downloads (and their torrents) in as few requests
+        as it takes.  Returns a list with, for each of them in turn, None
+        if it was removed, or the exception it failed with.  Raises if the
+        request for all of them failed.
+        """
+        results = []
+        for filename in filenames:
+            try:
+                self.remove_remote_download(filename, snapshot)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _lookup(self, filenames, snapshot):
+        # The torrent for each of filenames, or None if there is none.
+        snapshot = self._snapshot(snapshot)
+        return [snapshot.by_filename(f) for f in filenames]
+
+    def get_progress(self, snapshot=None):
+        """
+        Returns a list of Progress for the torrents on the server, finished
+        or not, as of the snapshot.  Makes no requests of its own, unless
+        there was no listing yet.
+        """
+        return list(self._snapshot(snapshot).progress)
+
+    def get_files_to_download(self, snapshot=None):
+        """Returns iterator with get_finished_torrents result, and the
+        file names, from snapshot or else a new listing."""
+        if snapshot is None:
+            snapshot = self.list_torrents()
+        for torrent in snapshot:
+            yield (torrent.name, torrent.status, torrent.filename)
 
     def upload_magnet_link(self, magnet_link):
         raise NotImplementedError
@@ -95,6 +500,99 @@ class SeedboxClient:
     def upload_torrent(self, torrent_path):
         raise NotImplementedError
 
+    # How many torrents upload_many() can submit in a single request.
+    upload_batch_size = 1
+
+    def upload_many(self, uploadables):
+        """
+        Submits several torrent files and magnet links.  Returns a list
+        with, for each of them in turn, None if it was submitted, or the
+        exception it failed with.
+        """
+        results = []
+        for uploadable in uploadables:
+            try:
+                if is_magnet_link(uploadable):
+                    self.upload_magnet_link(uploadable)
+                else:
+                    self.upload_torrent(uploadable)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class TorrentNameCache:
+    """
+    On-disk cache of the names torrents download to, keyed by infohash,
+    plus the infohash of every transfer seen so far.  Transfers whose
+    .torrent file could not be read are remembered with the size they
+    were listed with, so they are only tried again once that changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.transfers = {}
+        self.names = {}
+        # transfer: [listed size, name torrentinfo gave or None]
+        self.unreadable = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            self.transfers = data["transfers"]
+            self.names = data["names"]
+            self.unreadable = data.get("unreadable", {})
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+        self.dirty = False
+
+    def get(self, transfer, size=None):
+        infohash = self.transfers.get(transfer)
+        if infohash:
+            return self.names.get(infohash)
+        if self.is_unreadable(transfer, size):
+            return self.unreadable[transfer][1]
+        return None
+
+    def set(self, transfer, infohash, name):
+        self.transfers[transfer] = infohash
+        self.names[infohash] = name
+        self.unreadable.pop(transfer, None)
+        self.dirty = True
+
+    def is_unreadable(self, transfer, size):
+        entry = self.unreadable.get(transfer)
+        return size is not None and entry is not None and entry[0] == size
+
+    def set_unreadable(self, transfer, size, name=None):
+        self.unreadable[transfer] = [size, name]
+        self.dirty = True
+
+    def prune(self, transfers):
+        """Forgets everything about transfers not listed in transfers."""
+        transfers = set(transfers)
+        for t in [t for t in self.transfers if t not in transfers]:
+            del self.transfers[t]
+            self.dirty = True
+        for t in [t for t in self.unreadable if t not in transfers]:
+            del self.unreadable[t]
+            self.dirty = True
+        infohashes = set(self.transfers.values())
+        for h in [h for h in self.names if h not in infohashes]:
+            del self.names[h]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = {
+            "transfers": self.transfers,
+            "names": self.names,
+            "unreadable": self.unreadable,
+        }
+        util.write_atomically(self.path, json.dumps(data).encode("utf-8"))
+        self.dirty = False
+
 
 class TorrentFluxClient(SeedboxClient):
     def __init__(
@@ -106,31 +604,148 @@ class TorrentFluxClient(SeedboxClient):
         torrentinfo_path,
         fluxcli_path,
         ssh_hostname="",
+        section=None,
     ):
-        SeedboxClient.__init__(self, local_download_dir)
+        SeedboxClient.__init__(self, local_download_dir, section)
         self.hostname = hostname
         self.ssh_hostname = ssh_hostname or hostname
         self.base_dir = base_dir
         self.incoming_dir = incoming_dir
         self.fluxcli_path = fluxcli_path
         self.torrentinfo_path = torrentinfo_path
+        self.transfers_dir = os.path.join(self.base_dir, ".transfers")
+
+        self._setup_ssh(self.ssh_hostname)
+        self._name_cache = None
+
+    @property
+    def name_cache(self):
+        if self._name_cache is None:
+            key = "%s:%s" % (self.ssh_hostname, self.transfers_dir)
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            self._name_cache = TorrentNameCache(
+                os.path.join(util.cache_dir(), "torrentflux-%s.json" % digest)
+            )
+        return self._name_cache
 
-        self.getssh = partial(util.ssh_getstdout, self.ssh_hostname)
-        self.passthru = partial(util.ssh_passthru, self.ssh_hostname)
-
-    def get_finished_torrents(self):
-        stdout = self.getssh([self.fluxcli, "transfers"])
+    def _list_torrents(self):
+        stdout = self.getssh([self.fluxcli_path, "transfers"])
         stdout = stdout.splitlines()[2:-5]
         stdout.reverse()
         stdout = [
-            re.match("^- (.+) - [0123456789.]+ [KMG]B - (Seeding|Done)", line)
+            re.match("^- (.+) - ([0123456789.]+ [KMG]B) - (Seeding|Done)", line)
             for line in stdout
         ]
-        pairs = [(match.group(1), match.group(2)) for match in stdout if match]
-        return pairs
-
-    def get_file_name(self, torrentname):
-        fullpath = os.path.join(self.base_dir, ".transfers", torrentname)
+        matches = [match for match in stdout if match]
+        names = [match.group(1) for match in matches]
+        sizes = dict((match.group(1), match.group(2)) for match in matches)
+        cache = self.name_cache
+        cache.prune(names)
+        # Torrents that could not be read are left alone until they change.
+        missing = [
+            n
+            for n in names
+            if cache.get(n) is None and not cache.is_unreadable(n, sizes[n])
+        ]
+        self._fetch_names(missing)
+        for name in missing:
+            if cache.get(name) is not None:
+                continue
+            filename = None
+            if self.torrentinfo_path:
+                filename = self._get_file_name_torrentinfo(name)
+            cache.set_unreadable(name, sizes[name], filename)
+            if filename is None:
+                util.report_error(
+                    "Cannot read the name of torrent %s from %s, skipping it"
+                    % (name, self.transfers_dir)
+                )
+        cache.save()
+        torrents = []
+        for match in matches:
+            name = match.group(1)
+            filename = cache.get(name, sizes[name])
+            if filename is None:
+                continue
+            torrents.append(
+                Torrent(
+                    name,
+                    match.group(3),
+                    filename,
+                    os.path.join(self.incoming_dir, filename),
+                    infohash=self.name_cache.transfers.get(name),
+                    size=util.parse_size(match.group(2)),
+                )
+            )
+        # fluxcli only tells finished transfers apart from the rest.
+        progress = [Progress(name, 1, 1, None) for name in names]
+        return Snapshot(torrents, progress, [self.incoming_dir])
+
+    def _fetch_names(self, torrentnames):
+        """Fetches the given .torrent files in one go, and caches the names
+        they download to."""
+        if not torrentnames:
+            return
+        # Missing files are left out of the archive, not fatal.
+        script = 'tar -cf - -C "$1" --null -T - 2>/dev/null ; exit 0'
+        inp = b"".join(
+            ("./%s" % n).encode("utf-8", "surrogateescape") + b"\0"
+            for n in torrentnames
+        )
+        data = self.getssh(
+            ["sh", "-c", script, "sh", self.transfers_dir], inp=inp, encoding=None
+        )
+        if not data:
+            return
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                torrentname = os.path.basename(member.name)
+                content = archive.extractfile(member).read()
+                try:
+                    self.name_cache.set(
+                        torrentname,
+                        bencode.infohash(content),
+                        bencode.torrent_name(content),
+                    )
+                except bencode.BencodeError as e:
+                    util.report_error(
+                        "Cannot decode torrent %s: %s" % (torrentname, e)
+                    )
+
+    def get_file_name(self, torrentname, snapshot=None):
+        if snapshot is None:
+            snapshot = self.latest
+        torrent = snapshot.by_name(torrentname) if snapshot is not None else None
+        if torrent is not None:
+            return torrent.filename
+        # The name comes from the .transfers directory, no listing needed.
+        name = self._file_name(torrentname)
+        if name is None:
+            raise TemporaryMalfunction(
+                "Cannot read the name of torrent %s from %s"
+                % (torrentname, self.transfers_dir)
+            )
+        return name
+
+    def _file_name(self, torrentname):
+        """Returns the name torrentname downloads to, or None if it cannot
+        be read."""
+        name = self.name_cache.get(torrentname)
+        if name is not None:
+            return name
+        self._fetch_names([torrentname])
+        self.name_cache.save()
+        name = self.name_cache.get(torrentname)
+        if name is not None:
+            return name
+        if not self.torrentinfo_path:
+            return None
+        return self._get_file_name_torrentinfo(torrentname)
+
+    def _get_file_name_torrentinfo(self, torrentname):
+        fullpath = os.path.join(self.transfers_dir, torrentname)
         stdout = self.getssh(
             ["env", "LANG=C", self.torrentinfo_path, fullpath]
         ).splitlines()
@@ -149,19 +764,8 @@ class TorrentFluxClient(SeedboxClient):
         assert len(filenames) == 1, "Wrong length of filenames: %r" % filenames
         return filenames[0]
 
-    def transfer(self, filename):
-        path = os.path.join(self.incoming_dir, filename)
-        path = "%s:%s" % (self.ssh_hostname, path)
-        return util.rsync(path, self.local_download_dir)
-
-    def exists_on_server(self, filename):
-        path = os.path.join(self.incoming_dir, filename)
-        return remote_test_minus_e(self.passthru, path)
-
-    def remove_remote_download(self, filename):
-        returncode = self.passthru(
-            ["rm", "-rf", os.path.join(self.incoming_dir, filename)]
-        )
+    def remove_remote_download(self, filename, snapshot=None):
+        returncode = self.passthru(["rm", "-rf", self.remote_path(filename, snapshot)])
         if returncode == 0:
             return
         elif returncode == -2:
@@ -169,6 +773,19 @@ class TorrentFluxClient(SeedboxClient):
         else:
             raise AssertionError("remove dirs only returned %s" % returncode)
 
+    def remove_remote_downloads(self, filenames, snapshot=None):
+        filenames = list(filenames)
+        paths = [self.remote_path(f, snapshot) for f in filenames]
+        try:
+            removed = remote_remove_many(self.getssh, paths)
+        except ValueError:
+            # Unusual file names; fall back to removing one by one.
+            return SeedboxClient.remove_remote_downloads(self, filenames, snapshot)
+        return [
+            None if ok else IOError("cannot remove %s" % path)
+            for ok, path in zip(removed, paths)
+        ]
+
 
 class TransmissionClient(SeedboxClient):
     def __init__(
@@ -182,8 +799,9 @@ class TransmissionClient(SeedboxClient):
         transmission_remote_user,
         transmission_remote_password,
         ssh_hostname="",
+        section=None,
     ):
-        SeedboxClient.__init__(self, local_download_dir)
+        SeedboxClient.__init__(self, local_download_dir, section)
         self.hostname = hostname
         self.torrents_dir = torrents_dir
         self.incoming_dir = incoming_dir
@@ -192,10 +810,11 @@ class TransmissionClient(SeedboxClient):
         self.transmission_remote_password = transmission_remote_password
         self.ssh_hostname = ssh_hostname or hostname
 
-        self.getssh = partial(util.ssh_getstdout, self.ssh_hostname)
-        self.passthru = partial(util.ssh_passthru, self.ssh_hostname)
+        self._setup_ssh(self.ssh_hostname)
+        # (id, name): the name a finished torrent downloads to.
+        self._file_names = {}
 
-    def get_finished_torrents(self):
+    def _list_torrents(self):
         u, p = (
             self.transmission_remote_user,
             self.transmission_remote_password,
@@ -211,28 +830,42 @@ class TransmissionClient(SeedboxClient):
         stdout = stdout.splitlines()[1:-1]
         stdout.reverse()
         stdout = [x.split() + [x[70:]] for x in stdout]
+        progress = [
+            Progress(x[-1], int(x[1][:-1]), 100, None)
+            for x in stdout
+            if x[1][:-1].isdigit() and x[1].endswith("%")
+        ]
 
         def donetoseeding(t):
             return "Seeding" if t != "Stopped" else t
 
-        stdout = [
-            (
-                x[0],
-                donetoseeding(x[8]),
-                x[-1],
+        torrents = []
+        file_names = {}
+        for x in stdout:
+            if x[4] not in "Done":
+                continue
+            # The listing does not say where a torrent downloads to; that
+            # takes a request of its own, made once per torrent.  The name
+            # guards against ids given out again after a daemon restart.
+            key = (x[0], x[-1])
+            filename = self._file_names.get(key)
+            if filename is None:
+                filename = self._file_name(x[0])
+            file_names[key] = filename
+            torrents.append(
+                Torrent(
+                    x[-1],
+                    donetoseeding(x[8]),
+                    filename,
+                    os.path.join(self.incoming_dir, filename),
+                    id=x[0],
+                    size=util.parse_size("%s %s" % (x[2], x[3])),
+                )
             )
-            for x in stdout
-            if x[4] in "Done"
-        ]
-        self.torrent_to_id_map = dict((x[2], x[0]) for x in stdout)
-        pairs = [(x[2], x[1]) for x in stdout]
-        return pairs
-
-    def get_file_name(self, torrentname):
-        # first, cache the torrent names to IDs
-        if not hasattr(self, "torrent_to_id_map"):
-            self.get_finished_torrents()
-        torrent_id = self.torrent_to_id_map[torrentname]
+        self._file_names = file_names
+        return Snapshot(torrents, progress, [self.incoming_dir])
+
+    def _file_name(self, torrent_id):
         u, p = (
             self.transmission_remote_user,
             self.transmission_remote_password,
@@ -252,25 +885,21 @@ class TransmissionClient(SeedboxClient):
         filename = util.firstcomponent(stdout[2][34:])
         return filename
 
-    def transfer(self, filename):
-        path = os.path.join(self.incoming_dir, filename)
-        path = "%s:%s" % (self.ssh_hostname, path)
-        return util.rsync(path, self.local_download_dir)
-
-    def exists_on_server(self, filename):
-        path = os.path.join(self.incoming_dir, filename)
-        return remote_test_minus_e(self.passthru, path)
-
-    def remove_remote_download(self, filename):
-        if not hasattr(self, "torrent_to_id_map"):
-            self.get_finished_torrents()
-        if not hasattr(self, "filename_to_torrent_map"):
-            self.filename_to_torrent_map = dict(
-                (self.get_file_name(torrentname), torrentname)
-                for torrentname, _ in self.get_finished_torrents()
-            )
-        torrent = self.filename_to_torrent_map[filename]
-        torrent_id = self.torrent_to_id_map[torrent]
+    def remove_remote_download(self, filename, snapshot=None):
+        (error,) = self.remove_remote_downloads([filename], snapshot)
+        if error is not None:
+            raise error
+
+    def remove_remote_downloads(self, filenames, snapshot=None):
+        filenames = list(filenames)
+        torrents = self._lookup(filenames, snapshot)
+        ids = [t.id for t in torrents if t is not None]
+        if ids:
+            self._remove_torrents(ids)
+        return [None if t else KeyError(f) for f, t in zip(filenames, torrents)]
+
+    def _remove_torrents(self, torrent_ids):
+        """Removes several torrents and their data in one command."""
         u, p = (
             self.transmission_remote_user,
             self.transmission_remote_password,
@@ -283,7 +912,7 @@ class TransmissionClient(SeedboxClient):
                 self.hostname,
                 f"--auth={u}:{p}",
                 "-t",
-                torrent_id,
+                ",".join(torrent_ids),
                 "--remove-and-delete",
             ]
         )
@@ -295,6 +924,141 @@ class TransmissionClient(SeedboxClient):
             raise AssertionError("remove dirs only returned %s" % returncode)
 
 
+class TransmissionRPCClient(SeedboxClient):
+    """
+    Client for Transmission that talks to its JSON-RPC endpoint directly,
+    getting the state of all torrents in a single request per cycle.
+    """
+
+    SESSION_ID_HEADER = "X-Transmission-Session-Id"
+    TORRENT_FIELDS = [
+        "id",
+        "name",
+        "hashString",
+        "status",
+        "leftUntilDone",
+        "sizeWhenDone",
+        "rateDownload",
+        "downloadDir",
+        "files",
+        "doneDate",
+        "labels",
+    ]
+    # Transmission's TR_STATUS_STOPPED.
+    STATUS_STOPPED = 0
+
+    def __init__(
+        self,
+        local_download_dir,
+        hostname,
+        incoming_dir,
+        rpc_user="",
+        rpc_password="",
+        rpc_url="",
+        ssh_hostname="",
+        section=None,
+    ):
+        SeedboxClient.__init__(self, local_download_dir, section)
+        self.hostname = hostname
+        self.incoming_dir = incoming_dir
+        self.ssh_hostname = ssh_hostname or hostname.split(":")[0]
+        if not rpc_url:
+            # Same default as transmission-remote.
+            host = hostname if ":" in hostname else "%s:9091" % hostname
+            rpc_url = "http://%s/transmission/rpc" % host
+        self.rpc_url = rpc_url
+
+        self.session = http_session()
+        if rpc_user:
+            self.session.auth = (rpc_user, rpc_password)
+
+        self._setup_ssh(self.ssh_hostname)
+
+    def _rpc(self, method, **arguments):
+        body = {"method": method, "arguments": arguments}
+        # The first request of a session, and any request after the server
+        # restarts, is answered with 409 and a new session id to retry with.
+        for _ in range(2):
+            r = self.session.post(self.rpc_url, json=body, timeout=15)
+            if r.status_code != 409:
+                break
+            self.session.headers[self.SESSION_ID_HEADER] = r.headers.get(
+                self.SESSION_ID_HEADER, ""
+            )
+        if r.status_code in (401, 403, 404):
+            raise Misconfiguration(
+                "Transmission RPC address (%s) or credentials may be misconfigured: %s"
+                % (self.rpc_url, r.status_code)
+            )
+        if r.status_code >= 500:
+            raise TemporaryMalfunction(
+                "Server returned a temporary %s status code: %s"
+                % (r.status_code, r.text)
+            )
+        assert r.status_code == 200, (
+            "Non-OK status code while calling %s: %r" % (method, r.status_code)
+        )
+        data = r.json()
+        if data.get("result") != "success":
+            raise TemporaryMalfunction(
+                "Transmission RPC %s failed: %s" % (method, data.get("result"))
+            )
+        return data.get("arguments", {})
+
+    def _list_torrents(self):
+        torrents = self._rpc("torrent-get", fields=self.TORRENT_FIELDS)["torrents"]
+        # Most recent first, like transmission-remote -l reversed.
+        torrents.sort(key=lambda t: t["id"], reverse=True)
+        done = [t for t in torrents if t["leftUntilDone"] == 0 and t["files"]]
+        progress = [
+            Progress(
+                t["hashString"],
+                t.get("sizeWhenDone", 0) - t["leftUntilDone"],
+                t.get("sizeWhenDone", 0),
+                t.get("rateDownload"),
+            )
+            for t in torrents
+        ]
+        dirs = [t["downloadDir"] for t in torrents] + [self.incoming_dir]
+        snapshot = []
+        for t in done:
+            filename = util.firstcomponent(t["files"][0]["name"])
+            snapshot.append(
+                Torrent(
+                    t["name"],
+                    "Stopped" if t["status"] == self.STATUS_STOPPED else "Seeding",
+                    filename,
+                    os.path.join(t["downloadDir"], filename),
+                    t["id"],
+                    t["hashString"],
+                    # The listing already carries the files and their sizes.
+                    [(f["name"], f["length"]) for f in t["files"]],
+                    t.get("sizeWhenDone"),
+                    t.get("doneDate") or None,
+                    # Only Transmission 4 has labels.
+                    (t.get("labels") or [None])[0],
+                )
+            )
+        return Snapshot(snapshot, progress, dirs)
+
+    def _remove_torrents(self, torrent_ids):
+        """Removes several torrents and their data in one request."""
+        self._rpc("torrent-remove", ids=list(torrent_ids), **{"delete-local-data": True})
+
+    def remove_remote_download(self, filename, snapshot=None):
+        (error,) = self.remove_remote_downloads([filename], snapshot)
+        if error is not None:
+            raise error
+
+    def remove_remote_downloads(self, filenames, snapshot=None):
+        filenames = list(filenames)
+        torrents = self._lookup(filenames, snapshot)
+        ids = [t.id for t in torrents if t is not None]
+        if ids:
+            self._remove_torrents(ids)
+        return [None if t else KeyError(f) for f, t in zip(filenames, torrents)]
+
+
 class PulsedMediaClient(SeedboxClient):
     def __init__(
         self,
@@ -304,23 +1068,38 @@ class PulsedMediaClient(SeedboxClient):
         password,
         ssh_hostname="",
         label="",
+        http_timeout="15",
+        http_pool_size="4",
+        incremental_polling="no",
+        full_resync_every="100",
+        section=None,
     ):
         """Client for ruTorrent servers default in PulsedMedia seedboxes."""
-        SeedboxClient.__init__(self, local_download_dir)
+        SeedboxClient.__init__(self, local_download_dir, section)
         self.hostname = hostname
         self.ssh_hostname = ssh_hostname or hostname
         self.login = login
         self.password = password
         self.label = label.strip()
-
-        self.getssh = partial(
-            util.ssh_getstdout,
-            "%s@%s" % (login, self.ssh_hostname),
-        )
-        self.passthru = partial(
-            util.ssh_passthru,
-            "%s@%s" % (login, self.ssh_hostname),
-        )
+        self.base_url = "https://%s/user-%s/rutorrent" % (hostname, login)
+
+        # One pool of keep-alive connections for polls, uploads and
+        # removals alike.
+        self.http_timeout = float(http_timeout)
+        self.session = http_session(int(http_pool_size))
+        self.session.auth = (login, password)
+
+        # Torrent list kept between polls.  With incremental polling, only
+        # changes are fetched from the server, and a full list only every
+        # full_resync_every polls, which also catches deletions missed when
+        # the server dropped the cid of the last poll.
+        self.incremental_polling = util.parse_bool(incremental_polling)
+        self.full_resync_every = int(full_resync_every)
+        self._cid = None
+        self._polls_since_resync = 0
+        self.torrents_cache = {}
+
+        self._setup_ssh("%s@%s" % (login, self.ssh_hostname))
 
         # Here we disable the certificate warnings that take place with
         # PulsedMedia's less-than-nice SSL certificates.  Tragic, but the
@@ -332,12 +1111,17 @@ class PulsedMediaClient(SeedboxClient):
         except (ImportError, Exception):
             pass
 
-    def get_finished_torrents(self):
+    def _list(self, cid=None):
+        """Asks the httprpc plugin for the torrent list, or only for what
+        changed since cid.  Returns the decoded JSON data."""
+        data = "mode=list"
+        if cid is not None:
+            data += "&cid=%s" % cid
         r = post(
-            "https://%s/user-%s/rutorrent/plugins/httprpc/action.php"
-            % (self.hostname, self.login),
-            auth=(self.login, self.password),
-            data="mode=list",
+            self.base_url + "/plugins/httprpc/action.php",
+            session=self.session,
+            timeout=self.http_timeout,
+            data=data,
         )
         if r.status_code == 500:
             raise TemporaryMalfunction(
@@ -345,7 +1129,8 @@ class PulsedMediaClient(SeedboxClient):
             )
         if r.status_code == 404:
             raise Misconfiguration(
-                "Server address (%s) may be misconfigured: %s" % self.hostname
+                "Server address (%s) may be misconfigured: %s"
+                % (self.hostname, r.status_code)
             )
         assert r.status_code == 200, (
             "Non-OK status code while retrieving get_finished_torrents: %r"
@@ -353,62 +1138,100 @@ class PulsedMediaClient(SeedboxClient):
         )
         data = json.loads(r.content)
         torrents = data["t"]
+        # PHP serializes an empty dictionary as an empty list.
         if not torrents:
-            #  There are no torrents to download, or so the server says.
-            return []
-        self.torrents_cache = torrents
-        try:
-            self.path_for_filename_cache = dict(
-                [
-                    (os.path.basename(torrent[25]), torrent[25])
-                    for torrent in list(torrents.values())
-                ]
-            )
-            self.hash_for_filename_cache = dict(
-                [
-                    (os.path.basename(torrent[25]), thehash)
-                    for thehash, torrent in list(torrents.items())
-                ]
-            )
-        except AttributeError as e:
+            data["t"] = {}
+        elif not isinstance(torrents, dict):
             raise AttributeError(
-                "normally this would be a 'list' object has no attribute 'values', but in reality something went wrong with the unserialization of JSON values, which were serialized from %r and were supposed to come from the 't' bag of JSON data -- this happens when PulsedMedia's server fucks up (%s)"
-                % (r.content, e)
+                "normally this would be a 'list' object has no attribute 'values', but in reality something went wrong with the unserialization of JSON values, which were serialized from %r and were supposed to come from the 't' bag of JSON data -- this happens when PulsedMedia's server fucks up"
+                % (r.content,)
             )
-        done_torrents = []
-        for key, torrent in list(torrents.items()):
-            # filename = torrent[25]
-            completed_chunks = int(torrent[6])
-            size_chunks = int(torrent[7])
-            done = completed_chunks / size_chunks
+        return data
+
+    def _is_full_list(self, torrents):
+        """Tells whether torrents, sent in reply to an incremental poll,
+        are the full list of a server that dropped our cid.  Changes
+        never repeat a torrent as it was, but a full list mostly does."""
+        if set(torrents) >= set(self.torrents_cache):
+            return True
+        return any(
+            self.torrents_cache.get(thehash) == torrent
+            for thehash, torrent in torrents.items()
+        )
+
+    def _list_torrents(self):
+        incremental = (
+            self.incremental_polling
+            and self._cid is not None
+            and self._polls_since_resync < self.full_resync_every
+        )
+        data = self._list(self._cid if incremental else None)
+        # Deleted torrents come in the "d" list (or, in some versions of
+        # the plugin, as torrents whose value is false).
+        deleted = set(data.get("d") or [])
+        deleted.update(h for h, t in data["t"].items() if t is False)
+        active = dict((h, t) for h, t in data["t"].items() if t is not False)
+        if not incremental or self._is_full_list(active):
+            # A full list: asked for, or sent by a server that has dropped
+            # our cid.
+            self._polls_since_resync = 0
+            self.torrents_cache = active
+        else:
+            self._polls_since_resync += 1
+            for thehash in deleted:
+                self.torrents_cache.pop(thehash, None)
+            for thehash, torrent in active.items():
+                # Changed torrents go last, like new ones.
+                self.torrents_cache.pop(thehash, None)
+                self.torrents_cache[thehash] = torrent
+        self._cid = data.get("cid") if self.incremental_polling else None
+
+        torrents, progress = [], []
+        for thehash, torrent in self.torrents_cache.items():
             if self.label and self.label != torrent[14]:
                 # If it does not match the label, the torrent is
                 # never "done".
-                done = 0
-            if done == 1:
-                done_torrents.append(
-                    (key, "Done" if int(torrent[0]) == 0 else "Seeding")
+                continue
+            # Rows carry the download rate in bytes, and the chunk size.
+            try:
+                rate = int(torrent[12]) / int(torrent[13])
+            except (ValueError, IndexError, ZeroDivisionError):
+                rate = None
+            completed_chunks, size_chunks = int(torrent[6]), int(torrent[7])
+            progress.append(Progress(thehash, completed_chunks, size_chunks, rate))
+            if size_chunks and completed_chunks == size_chunks:
+                torrents.append(
+                    Torrent(
+                        thehash,
+                        "Done" if int(torrent[0]) == 0 else "Seeding",
+                        os.path.basename(torrent[25]),
+                        torrent[25],
+                        infohash=thehash,
+                        size=int(torrent[5]) if torrent[5] else None,
+                        completed=self._finished_at(torrent),
+                        label=torrent[14] or None,
+                    )
                 )
-        return done_torrents
-
-    def get_file_name(self, torrentname):
-        # in this implementation, get_finished_torrents MUST BE called first
-        # or else this will bomb out with an attribute error
-        torrent = self.torrents_cache[torrentname]
-        return os.path.basename(torrent[25])
-
-    def transfer(self, filename):
-        # in this implementation, get_finished_torrents MUST BE called first
-        # or else this will bomb out with an attribute error
-        path = self.path_for_filename_cache[filename]
-        path = "%s@%s:%s" % (self.login, self.ssh_hostname, path)
-        return util.rsync(path, self.local_download_dir)
-
-    def exists_on_server(self, filename):
-        # in this implementation, get_finished_torrents MUST BE called first
-        # or else this will bomb out with an attribute error
-        path = self.path_for_filename_cache[filename]
-        return remote_test_minus_e(self.passthru, path)
+        # ruTorrent does not tell where it keeps downloads, other than in
+        # the paths of the torrents themselves.
+        dirs = [os.path.dirname(t[25]) for t in self.torrents_cache.values()]
+        return Snapshot(torrents, progress, dirs)
+
+    @staticmethod
+    def _finished_at(torrent):
+        # ruTorrent stamps torrents with the time they finished downloading
+        # (the seedingtime custom field, the 42nd one of the row).
+        try:
+            return int(torrent[41]) or None
+        except (IndexError, ValueError):
+            return None
+
+    def remote_path(self, filename, snapshot=None):
+        # Only torrents say where their downloads are.
+        torrent = self._snapshot(snapshot).by_filename(filename)
+        if torrent is None:
+            raise KeyError(filename)
+        return torrent.path
 
     def upload_magnet_link(self, magnet_link):
         return self._upload(data={"url": magnet_link})
@@ -420,9 +1243,9 @@ class PulsedMediaClient(SeedboxClient):
 
     def _upload(self, **params):
         r = post(
-            "https://%s/user-%s/rutorrent/php/addtorrent.php"
-            % (self.hostname, self.login),
-            auth=(self.login, self.password),
+            self.base_url + "/php/addtorrent.php",
+            session=self.session,
+            timeout=self.http_timeout,
             **params,
         )
         if r.status_code == 500:
@@ -445,36 +1268,60 @@ class PulsedMediaClient(SeedboxClient):
 
         assert 0, (r.status_code, r.text)
 
-    def remove_remote_download(self, filename):
-        # in this implementation, get_finished_torrents MUST BE called first
-        # or else this will bomb out with an attribute error
-        login = quote(self.login, safe="")
-        passw = quote(self.password, safe="")
-        url = (
-            f"https://{login}:{passw}@{self.hostname}/user-{login}"
-            + "/rutorrent/plugins/httprpc/action.php"
-        )
-        client = xmlrpc.client.ServerProxy(url)
-        infohash = self.hash_for_filename_cache[filename]
-        mcall = xmlrpc.client.MultiCall(client)
-        mcall.d.custom5.set(infohash, "1")
-        mcall.d.delete_tied(infohash)
-        mcall.d.erase(infohash)
+    def _xmlrpc(self):
+        url = self.base_url + "/plugins/httprpc/action.php"
+        transport = SessionTransport(self.session, url, self.http_timeout)
+        return xmlrpc.client.ServerProxy(url, transport=transport)
+
+    def remove_remote_download(self, filename, snapshot=None):
+        (error,) = self.remove_remote_downloads([filename], snapshot)
+        if error is not None:
+            raise error
+
+    def remove_remote_downloads(self, filenames, snapshot=None):
+        # All of them in one XML-RPC multicall, three calls per torrent.
+        filenames = list(filenames)
+        torrents = self._lookup(filenames, snapshot)
+        mcall = xmlrpc.client.MultiCall(self._xmlrpc())
+        for torrent in torrents:
+            if torrent is not None:
+                mcall.d.custom5.set(torrent.infohash, "1")
+                mcall.d.delete_tied(torrent.infohash)
+                mcall.d.erase(torrent.infohash)
+        results = [KeyError(f) for f in filenames]
+        if not any(torrents):
+            return results
         try:
-            _, delete_tied_result, erase_result = list(mcall())
+            replies = mcall()
         except xmlrpc.client.ProtocolError as exc:
             raise Misconfiguration(
                 f"Server address ({self.hostname}) may be misconfigured"
             ) from exc
         except xmlrpc.client.Fault as exc:
             raise TemporaryMalfunction("Server returned a fault.") from exc
-
-        assert delete_tied_result == 0, f"Delete tied result {delete_tied_result}"
-        assert erase_result == 0, f"Erase result {erase_result}"
+        n = 0
+        for i, torrent in enumerate(torrents):
+            if torrent is None:
+                continue
+            try:
+                delete_tied_result, erase_result = replies[n + 1], replies[n + 2]
+                assert delete_tied_result == 0, (
+                    f"Delete tied result {delete_tied_result}"
+                )
+                assert erase_result == 0, f"Erase result {erase_result}"
+                results[i] = None
+            except xmlrpc.client.Fault as exc:
+                results[i] = TemporaryMalfunction("Server returned a fault.")
+                results[i].__cause__ = exc
+            except AssertionError as exc:
+                results[i] = exc
+            n += 3
+        return results
 
 
 clients = {
     "TransmissionClient": TransmissionClient,
+    "TransmissionRPCClient": TransmissionRPCClient,
     "TorrentFluxClient": TorrentFluxClient,
     "PulsedMedia": PulsedMediaClient,
 }
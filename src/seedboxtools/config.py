@@ -32,14 +32,50 @@ def save_config(cfgobject, fobject):
     fobject.write(text)
     fobject.flush()
 
-def get_client(config):
-    client_constructor = clients.lookup_client(config.general.client)
+client_types = ["TorrentFluxClient", "TransmissionClient", "TransmissionRPCClient", "PulsedMedia"]
+
+def client_names(config):
+    """Returns the names of the client sections in use, in order.  The
+    client setting of the general section holds one, or several separated
+    by commas."""
+    return [ x.strip() for x in config.general.client.split(",") if x.strip() ]
+
+def get_client(config, name=None, section=None):
+    """Returns the client of section name (by default, the first one in
+    use).  The section is of the client type it is named after, unless it
+    has a client setting of its own naming the type.  section, if given,
+    tells the client apart from others of the same seedbox."""
+    if name is None:
+        name = client_names(config)[0]
+    client_props = getattr(config, name)
+    client_constructor = clients.lookup_client(client_type(config, name))
     args = {"local_download_dir":config.general.local_download_dir}
-    client_props = getattr(config, config.general.client)
-    args.update(set([ (x, getattr(client_props, x)) for x in client_props ]))
+    args.update(set([ (x, getattr(client_props, x)) for x in client_props if x != "client" ]))
     args = dict(args)
+    if section is not None:
+        args["section"] = section
     return client_constructor(**args)
 
+def client_type(config, name):
+    """Returns the client type of section name."""
+    section = getattr(config, name)
+    kind = section if isinstance(section, Undefined) else section.client
+    if isinstance(kind, Undefined):
+        return name
+    return kind
+
+def get_clients(config):
+    """Returns a client for each client section in use.  Clients of the
+    same seedbox after the first are told apart by their section."""
+    result = []
+    hostnames = []
+    for name in client_names(config):
+        hostname = getattr(config, name).hostname
+        section = name if hostname in hostnames else None
+        hostnames.append(hostname)
+        result.append(get_client(config, name, section))
+    return result
+
 def raw_input_default(prompt, default, choices=None):
     if callable(default):
 	    try: default = default()
@@ -74,92 +110,137 @@ def wizard():
           "Local download directory",
           cfg.general.local_download_dir,
     )
-    cfg.general.client = raw_input_default(
-          "Torrent server type",
-          cfg.general.client,
-          ["TorrentFluxClient", "TransmissionClient", "PulsedMedia"],
-    )
-    if cfg.general.client == 'TransmissionClient':
-        cfg[cfg.general.client].hostname = raw_input_default(
-              "Torrent server host name",
-              cfg[cfg.general.client].hostname,
-        )
-        cfg[cfg.general.client].ssh_hostname = raw_input_default(
-              "Server SSH host name (leave empty if is the same as the torrent server host name)",
-              cfg[cfg.general.client].ssh_hostname,
-        )
-        cfg[cfg.general.client].torrents_dir = raw_input_default(
-              "Directory where the torrent server stores torrent files",
-              cfg[cfg.general.client].torrents_dir,
-        )
-        cfg[cfg.general.client].incoming_dir = raw_input_default(
-              "Directory where the torrent server stores downloaded files",
-              cfg[cfg.general.client].incoming_dir,
-        )
-        cfg[cfg.general.client].transmission_remote_path = raw_input_default(
-              "Command to run transmission-remote locally",
-              cfg[cfg.general.client].transmission_remote_path,
-        )
-        cfg[cfg.general.client].transmission_remote_user = raw_input_default(
-              "User name for transmission-remote",
-              cfg[cfg.general.client].transmission_remote_user,
-        )
-        cfg[cfg.general.client].transmission_remote_password = raw_input_default(
-              "Password for transmission-remote",
-              cfg[cfg.general.client].transmission_remote_password,
-        )
-        cfg[cfg.general.client].torrentinfo_path = raw_input_default(
-              "Command to run torrentinfo-console in the server",
-              cfg[cfg.general.client].torrentinfo_path,
+    while True:
+        cfg.general.client = raw_input_default(
+              "Torrent server type (%s), or several client sections separated by commas" % ", ".join(client_types),
+              cfg.general.client,
         )
-    elif cfg.general.client == 'TorrentFluxClient':
-        cfg[cfg.general.client].hostname = raw_input_default(
-              "Torrent server host name",
-              cfg[cfg.general.client].hostname,
-        )
-        cfg[cfg.general.client].ssh_hostname = raw_input_default(
-              "Server SSH host name (leave empty if is the same as the torrent server host name)",
-              cfg[cfg.general.client].ssh_hostname,
-        )
-        cfg[cfg.general.client].base_dir = raw_input_default(
-              "Base directory where TorrentFlux stores its .transfers directory",
-              cfg[cfg.general.client].base_dir,
-        )
-        cfg[cfg.general.client].incoming_dir = raw_input_default(
-              "Directory where where TorrentFlux stores downloaded files",
-              cfg[cfg.general.client].incoming_dir,
-        )
-        cfg[cfg.general.client].fluxcli_path = raw_input_default(
-              "Command to run fluxcli in the server",
-              cfg[cfg.general.client].fluxcli_path,
-        )
-        cfg[cfg.general.client].torrentinfo_path = raw_input_default(
-              "Command to run torrentinfo-console in the server",
-              cfg[cfg.general.client].torrentinfo_path,
-        )
-    elif cfg.general.client == 'PulsedMedia':
-        cfg[cfg.general.client].hostname = raw_input_default(
-              "Hostname (x.pulsedmedia.com)",
-              lambda: cfg[cfg.general.client].hostname,
-        )
-        cfg[cfg.general.client].ssh_hostname = raw_input_default(
-              "Server SSH host name (leave empty if is the same as the torrent server host name)",
-              cfg[cfg.general.client].ssh_hostname,
-        )
-        cfg[cfg.general.client].label = raw_input_default(
-              "Label to download",
-              cfg[cfg.general.client].label,
-        )
-        cfg[cfg.general.client].login = raw_input_default(
-              "Login",
-              lambda: cfg[cfg.general.client].login,
-        )
-        cfg[cfg.general.client].password = raw_input_default(
-              "Password",
-              lambda: cfg[cfg.general.client].password,
-        )
-    else:
-        assert 0, "Not reached"
+        if client_names(cfg):
+            break
+        print("At least one torrent server is needed, please try again")
+    for name in client_names(cfg):
+        if isinstance(cfg[name], Undefined):
+            # A new section; every client type has a host name.
+            cfg[name].hostname = ''
+        if name not in client_types:
+            kind = client_type(cfg, name)
+            cfg[name].client = raw_input_default(
+                  "Torrent server type of client section %s" % name,
+                  kind if kind in client_types else 'TransmissionClient',
+                  client_types,
+            )
+        kind = client_type(cfg, name)
+        if kind == 'TransmissionClient':
+            cfg[name].hostname = raw_input_default(
+                  "Torrent server host name",
+                  cfg[name].hostname,
+            )
+            cfg[name].ssh_hostname = raw_input_default(
+                  "Server SSH host name (leave empty if is the same as the torrent server host name)",
+                  cfg[name].ssh_hostname,
+            )
+            cfg[name].torrents_dir = raw_input_default(
+                  "Directory where the torrent server stores torrent files",
+                  cfg[name].torrents_dir,
+            )
+            cfg[name].incoming_dir = raw_input_default(
+                  "Directory where the torrent server stores downloaded files",
+                  cfg[name].incoming_dir,
+            )
+            cfg[name].transmission_remote_path = raw_input_default(
+                  "Command to run transmission-remote locally",
+                  cfg[name].transmission_remote_path,
+            )
+            cfg[name].transmission_remote_user = raw_input_default(
+                  "User name for transmission-remote",
+                  cfg[name].transmission_remote_user,
+            )
+            cfg[name].transmission_remote_password = raw_input_default(
+                  "Password for transmission-remote",
+                  cfg[name].transmission_remote_password,
+            )
+            cfg[name].torrentinfo_path = raw_input_default(
+                  "Command to run torrentinfo-console in the server",
+                  cfg[name].torrentinfo_path,
+            )
+        elif kind == 'TransmissionRPCClient':
+            cfg[name].hostname = raw_input_default(
+                  "Torrent server host name (add :port if the RPC port is not 9091)",
+                  cfg[name].hostname,
+            )
+            cfg[name].ssh_hostname = raw_input_default(
+                  "Server SSH host name (leave empty if is the same as the torrent server host name)",
+                  cfg[name].ssh_hostname,
+            )
+            cfg[name].rpc_url = raw_input_default(
+                  "Transmission RPC URL (leave empty for http://<host name>/transmission/rpc)",
+                  cfg[name].rpc_url,
+            )
+            cfg[name].incoming_dir = raw_input_default(
+                  "Directory where the torrent server stores downloaded files",
+                  cfg[name].incoming_dir,
+            )
+            cfg[name].rpc_user = raw_input_default(
+                  "User name for the Transmission RPC",
+                  cfg[name].rpc_user,
+            )
+            cfg[name].rpc_password = raw_input_default(
+                  "Password for the Transmission RPC",
+                  cfg[name].rpc_password,
+            )
+        elif kind == 'TorrentFluxClient':
+            cfg[name].hostname = raw_input_default(
+                  "Torrent server host name",
+                  cfg[name].hostname,
+            )
+            cfg[name].ssh_hostname = raw_input_default(
+                  "Server SSH host name (leave empty if is the same as the torrent server host name)",
+                  cfg[name].ssh_hostname,
+            )
+            cfg[name].base_dir = raw_input_default(
+                  "Base directory where TorrentFlux stores its .transfers directory",
+                  cfg[name].base_dir,
+            )
+            cfg[name].incoming_dir = raw_input_default(
+                  "Directory where where TorrentFlux stores downloaded files",
+                  cfg[name].incoming_dir,
+            )
+            cfg[name].fluxcli_path = raw_input_default(
+                  "Command to run fluxcli in the server",
+                  cfg[name].fluxcli_path,
+            )
+            cfg[name].torrentinfo_path = raw_input_default(
+                  "Command to run torrentinfo-console in the server (optional, only used for torrents that cannot be read locally)",
+                  cfg[name].torrentinfo_path,
+            )
+        elif kind == 'PulsedMedia':
+            cfg[name].hostname = raw_input_default(
+                  "Hostname (x.pulsedmedia.com)",
+                  lambda: cfg[name].hostname,
+            )
+            cfg[name].ssh_hostname = raw_input_default(
+                  "Server SSH host name (leave empty if is the same as the torrent server host name)",
+                  cfg[name].ssh_hostname,
+            )
+            cfg[name].label = raw_input_default(
+                  "Label to download",
+                  cfg[name].label,
+            )
+            cfg[name].login = raw_input_default(
+                  "Login",
+                  lambda: cfg[name].login,
+            )
+            cfg[name].password = raw_input_default(
+                  "Password",
+                  lambda: cfg[name].password,
+            )
+            cfg[name].incremental_polling = raw_input_default(
+                  "Fetch only the changes to the torrent list on every poll",
+                  lambda: cfg[name].incremental_polling or "no",
+                  ["yes", "no"],
+            )
+        else:
+            assert 0, "Not reached"
     print("Writing this configuration to %s" % default_filename)
     print("===============8<================")
     print(cfg)
@@ -0,0 +1,115 @@
+"""
+Local disk space admission control for seedboxtools
+"""
+
+import os
+import stat
+import threading
+from seedboxtools import util
+
+
+def local_size(filename, directory="."):
+    """
+    Returns the bytes of filename (a file or a directory tree) already in
+    directory, counting what rsync kept of its unfinished files.
+    """
+    total = 0
+    for path in (
+        os.path.join(directory, filename),
+        os.path.join(directory, util.RSYNC_PARTIAL_DIR, filename),
+    ):
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if not stat.S_ISDIR(st.st_mode):
+            total += st.st_size
+            continue
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+    return total
+
+
+class DiskSpace:
+    """
+    Decides whether downloads fit in the file system of directory: a
+    download is admitted only if what it still has to write fits in the
+    free space, less reserve bytes and what the downloads admitted before
+    it still have to write.  Downloads are told apart by their filename
+    and owner (the identity of the client they come from, as the same name
+    may come from several seedboxes).  Safe to use from several threads.
+    """
+
+    def __init__(self, directory=".", reserve=0):
+        if reserve < 0:
+            raise ValueError("reserve cannot be negative")
+        self.directory = directory
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        # (owner, filename): [bytes to write, bytes written so far]
+        self._admitted = {}
+
+    def free(self):
+        """Returns the bytes free in the file system, or None if there is
+        no telling."""
+        try:
+            st = os.statvfs(self.directory)
+        except OSError:
+            return None
+        if not st.f_blocks:
+            return None
+        return st.f_bavail * st.f_frsize
+
+    def _committed(self):
+        # Must be called with the lock held.
+        return sum(max(needed - done, 0) for needed, done in self._admitted.values())
+
+    def available(self):
+        """Returns the bytes that downloads not yet admitted may use, or
+        None if there is no telling."""
+        free = self.free()
+        if free is None:
+            return None
+        with self._lock:
+            return free - self.reserve - self._committed()
+
+    def admit(self, filename, nbytes, owner=None):
+        """
+        Returns True if the download of filename, nbytes in all (None if
+        unknown), fits, counting what it still has to write as committed
+        until release(filename, owner).  Returns False if it does not fit.
+        """
+        key = (owner, filename)
+        needed = 0
+        if nbytes is not None:
+            needed = max(nbytes - local_size(filename, self.directory), 0)
+        free = self.free()
+        with self._lock:
+            if key in self._admitted:
+                return True
+            if free is not None:
+                available = free - self.reserve - self._committed()
+                if nbytes is None:
+                    # Of unknown size: only while there is room at all.
+                    fits = available > 0
+                else:
+                    fits = needed == 0 or needed <= available
+                if not fits:
+                    return False
+            self._admitted[key] = [needed, 0]
+            return True
+
+    def progress(self, filename, done, owner=None):
+        """Records that the download of filename wrote done bytes so far."""
+        with self._lock:
+            if (owner, filename) in self._admitted:
+                self._admitted[owner, filename][1] = done
+
+    def release(self, filename, owner=None):
+        """Stops counting filename as committed, once its download ended."""
+        with self._lock:
+            self._admitted.pop((owner, filename), None)
@@ -0,0 +1,186 @@
+"""
+Filesystem watching for seedboxtools
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Thin ctypes wrapper around the Linux inotify API.  Raises OSError on
+    creation if inotify is not available.
+    """
+
+    def __init__(self):
+        name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        """
+        Waits up to timeout seconds for events.  Returns a list of
+        (wd, mask, cookie, name) tuples, empty if none arrived in time.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events, pos = [], 0
+        while pos < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos : pos + length].rstrip(b"\0")
+            pos += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PathWatcher:
+    """
+    Calls back when paths appear as directories, from a single thread
+    shared by every registration.
+
+    It uses inotify on the parent directories of the paths, and falls back
+    to polling all registered paths from that one thread when inotify is
+    not available.  Registrations expire after timeout seconds, and are
+    dropped early when the path appears as a plain file, since that will
+    never turn into a directory.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, timeout=600):
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._wds = {}
+        self._thread = None
+        try:
+            self._inotify = Inotify()
+        except OSError:
+            self._inotify = None
+
+    def when_dir_appears(self, path, callback):
+        """Calls callback(path) once path is a directory."""
+        fullpath = os.path.abspath(path)
+        parent = os.path.dirname(fullpath)
+        with self._lock:
+            if self._inotify is not None and parent not in self._wds.values():
+                try:
+                    wd = self._inotify.add_watch(
+                        parent, IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+                    )
+                    self._wds[wd] = parent
+                except OSError:
+                    pass
+            # Check only once the watch is in place, lest we miss it.
+            if os.path.isdir(fullpath):
+                callback(path)
+                return
+            self._pending[fullpath] = (path, callback, time.time() + self.timeout)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def cancel(self, path):
+        """Drops the registration for path.  Once this returns, its
+        callback is not running and will not run."""
+        with self._lock:
+            self._pending.pop(os.path.abspath(path), None)
+
+    def _fire(self, fullpath):
+        # Must be called with the lock held.
+        path, callback, _ = self._pending.pop(fullpath)
+        callback(path)
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            for fullpath, (_, _, deadline) in list(self._pending.items()):
+                if deadline < now:
+                    del self._pending[fullpath]
+
+    def _poll(self):
+        with self._lock:
+            for fullpath in list(self._pending):
+                if os.path.isdir(fullpath):
+                    self._fire(fullpath)
+
+    def _run(self):
+        while True:
+            if self._inotify is None:
+                time.sleep(self.poll_interval)
+                self._poll()
+                self._expire()
+                continue
+            events = self._inotify.read(1.0)
+            with self._lock:
+                for wd, mask, _, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        self._poll()
+                        continue
+                    if mask & IN_IGNORED:
+                        self._wds.pop(wd, None)
+                        continue
+                    parent = self._wds.get(wd)
+                    if parent is None:
+                        continue
+                    fullpath = os.path.join(parent, name)
+                    if fullpath not in self._pending:
+                        continue
+                    if mask & IN_ISDIR:
+                        self._fire(fullpath)
+                    else:
+                        del self._pending[fullpath]
+            self._expire()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_watcher():
+    """Returns the process-wide PathWatcher."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PathWatcher()
+        return _shared
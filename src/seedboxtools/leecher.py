@@ -2,9 +2,16 @@
 This is the code in charge of downloading proper
 """
 
-import errno, os, signal, sys, subprocess, time, traceback
-from seedboxtools import util, cli, config
-from seedboxtools.clients import TemporaryMalfunction, Misconfiguration
+import errno, math, os, signal, sqlite3, sys, subprocess, threading, time, traceback
+from seedboxtools import util, cli, config, metrics, processor, state
+from seedboxtools.clients import TemporaryMalfunction, Misconfiguration, RemoteStat
+from seedboxtools.diskspace import DiskSpace
+from seedboxtools.ordering import Ordering
+from seedboxtools.pacing import AdaptivePacer
+from seedboxtools.processor import ProcessorQueue
+from seedboxtools.remotewatch import RemoteWatcher
+from seedboxtools.scheduler import TransferScheduler
+from seedboxtools.state import StateStore
 from requests.exceptions import ConnectionError
 
 EXIT_NOTCONFIGURED = 6
@@ -12,14 +19,331 @@ EXIT_NOPERMISSION = 4
 EXIT_INVALIDARGUMENT = 2
 EXIT_CHDIR = 200
 
-# start execution here
-def download(client, remove_finished=False, run_processor_program=None):
-    for torrent, status, filename in client.get_files_to_download():
-        # Set loop vars up
-        download_lockfile = ".%s.done" % filename
-        fully_downloaded = os.path.exists(download_lockfile)
-        seeding = status == "Seeding"
 
+def run_processor(run_processor_program, filename):
+    try:
+        started = time.monotonic()
+        retval = subprocess.call(
+            [run_processor_program, filename], stdin=open(os.devnull)
+        )
+        processor.report_exit(run_processor_program, filename, retval, started)
+    except OSError as e:
+        util.report_error(
+            "Program %r is not executable: %s" % (run_processor_program, e)
+        )
+
+
+def _size(nbytes):
+    for unit in ("bytes", "KiB", "MiB", "GiB"):
+        if nbytes < 1024:
+            break
+        nbytes /= 1024
+    else:
+        unit = "TiB"
+    return ("%d %s" if unit == "bytes" else "%.1f %s") % (nbytes, unit)
+
+
+class TransferMonitor:
+    """Keeps the metrics (and space, if given) up to date with the rsync
+    progress of filename, and reports it every interval seconds."""
+
+    interval = 60
+
+    # Latest progress of every download in progress, by (client identity,
+    # filename), which the metrics add up per client.
+    _lock = threading.Lock()
+    _running = {}
+
+    def __init__(self, client, filename, nbytes=None, space=None):
+        self.client = client
+        self.filename = filename
+        self.nbytes = nbytes
+        self.space = space
+        self.latest = None
+        self._reported = time.monotonic()
+
+    def __call__(self, progress):
+        if self.nbytes:
+            # More accurate than what rsync works out while it still
+            # looks for files to download.
+            left = max(self.nbytes - progress.bytes, 0)
+            progress = progress._replace(
+                percent=min(progress.bytes * 100 // self.nbytes, 100),
+                eta=int(left / progress.rate) if progress.rate else None,
+            )
+        self.latest = progress
+        if self.space is not None:
+            self.space.progress(self.filename, progress.bytes, self.client.identity)
+        with self._lock:
+            self._running[(self.client.identity, self.filename)] = progress
+        self._update_metrics()
+        now = time.monotonic()
+        if now - self._reported >= self.interval:
+            self._reported = now
+            util.report_message(self.describe())
+
+    def describe(self):
+        p = self.latest
+        text = "Downloading %s: %s" % (self.filename, _size(p.bytes))
+        if self.nbytes:
+            text += " of %s" % _size(self.nbytes)
+        text += " (%s%%), %s/s" % (p.percent, _size(p.rate))
+        if p.eta is not None:
+            text += ", %d:%02d:%02d left" % (p.eta // 3600, p.eta // 60 % 60, p.eta % 60)
+        return text
+
+    def _update_metrics(self):
+        identity = self.client.identity
+        with self._lock:
+            running = [p for (c, _), p in self._running.items() if c == identity]
+            metrics.TRANSFER_DONE_BYTES.labels(identity).set(
+                sum(p.bytes for p in running)
+            )
+            metrics.TRANSFER_RATE.labels(identity).set(sum(p.rate for p in running))
+            etas = [p.eta for p in running if p.eta is not None]
+            if etas:
+                metrics.TRANSFER_ETA.labels(identity).set(max(etas))
+            else:
+                metrics.TRANSFER_ETA.remove(identity)
+
+    def close(self):
+        with self._lock:
+            self._running.pop((self.client.identity, self.filename), None)
+        self._update_metrics()
+
+
+def torrent_id(snapshot, torrent):
+    """Returns the info hash of torrent in snapshot, or else its id, or
+    None."""
+    record = snapshot.by_name(torrent)
+    if record is None:
+        return None
+    if record.infohash:
+        return record.infohash.lower()
+    if record.id is not None:
+        return str(record.id)
+    return None
+
+
+def queue_transfer(client, store, torrent, filename, nbytes, snapshot=None):
+    """Records that filename waits for a transfer.  Returns the state it
+    was in before, for StateStore.unqueued() should it never start."""
+    util.report_message("Downloading %s from torrent %s" % (filename, torrent))
+    previous = store.queued(
+        client.identity,
+        torrent,
+        filename,
+        nbytes,
+        None if snapshot is None else torrent_id(snapshot, torrent),
+    )
+    metrics.TRANSFERS_QUEUED.labels(client.identity).inc()
+    return previous
+
+
+def admit_transfers(client, space, downloads):
+    """Returns the downloads that fit in the local disk, in order, and
+    reports the rest, which are held back."""
+    admitted = []
+    for download in downloads:
+        filename, nbytes = download[2], download[3]
+        if space.admit(filename, nbytes, client.identity):
+            admitted.append(download)
+            continue
+        util.report_message(
+            "Not downloading %s yet -- it needs %s, and only %s can be used "
+            "in the download directory"
+            % (
+                filename,
+                "an unknown amount" if nbytes is None else _size(nbytes),
+                _size(max(space.available() or 0, 0)),
+            )
+        )
+    metrics.TRANSFERS_HELD.labels(client.identity).set(
+        len(downloads) - len(admitted)
+    )
+    return admitted
+
+
+def start_transfer(client, store, torrent, filename):
+    """Records the start of a transfer.  Returns True if it resumes one
+    that was interrupted."""
+    resume = store.interrupted(client.identity, filename)
+    if resume:
+        util.report_message("Resuming interrupted download of %s" % filename)
+    store.transferring(client.identity, torrent, filename)
+    metrics.TRANSFERS_RUNNING.labels(client.identity).inc()
+    util.mark_dir_downloading_when_it_appears(filename)
+    return resume
+
+
+def end_transfer(client, store, torrent, filename, nbytes, retvalue):
+    """Records and reports the outcome of a transfer."""
+    metrics.TRANSFERS_RUNNING.labels(client.identity).dec()
+    if retvalue != 0:
+        # rsync failed
+        duration = store.finished(
+            client.identity, torrent, filename, False, returncode=retvalue
+        )
+        metrics.transfer_finished(client.identity, retvalue, duration)
+        util.mark_dir_error(filename)
+        return
+    # Rsync successful
+    # record file as downloaded
+    duration = store.finished(client.identity, torrent, filename, True, nbytes)
+    metrics.transfer_finished(client.identity, retvalue, duration, nbytes)
+    # report successful download
+    util.mark_dir_complete(filename)
+    util.report_message("Download of %s complete" % filename)
+
+
+def report_transfer_failure(filename, retvalue):
+    """Reports a failed transfer.  Returns 2 if it was interrupted by the
+    user, or 1 otherwise."""
+    if retvalue == 20:
+        util.report_error(
+            "Download of %s stopped -- rsync process interrupted" % (filename,)
+        )
+        return 2
+    elif retvalue < 0:
+        util.report_error(
+            "Download of %s failed -- rsync process killed with signal %s"
+            % (filename, -retvalue)
+        )
+    else:
+        util.report_error(
+            "Download of %s failed -- rsync process exited with return status %s"
+            % (filename, retvalue)
+        )
+    return 1
+
+
+def process_item(run_processor_program, filename, processors=None):
+    """Runs the processor program on filename, or queues it to run in the
+    background if there is a processor queue."""
+    if processors is not None:
+        processors.submit(run_processor_program, filename)
+    else:
+        run_processor(run_processor_program, filename)
+
+
+def transfer_item(
+    client,
+    store,
+    torrent,
+    filename,
+    nbytes,
+    run_processor_program=None,
+    shards=1,
+    processors=None,
+    snapshot=None,
+    space=None,
+):
+    """Downloads an item in a scheduler worker, then records it and runs
+    the processor program on it.  Returns the rsync status."""
+    metrics.TRANSFERS_QUEUED.labels(client.identity).dec()
+    if sighandled:
+        # Same status rsync returns when it is interrupted by a signal.
+        return 20
+    resume = start_transfer(client, store, torrent, filename)
+    monitor = TransferMonitor(client, filename, nbytes, space)
+    try:
+        if shards > 1:
+            retvalue = client.transfer_sharded(
+                filename, shards, monitor, resume, snapshot
+            )
+        else:
+            retvalue = client.transfer(filename, monitor, resume, snapshot)
+    except BaseException:
+        end_transfer(client, store, torrent, filename, nbytes, -1)
+        raise
+    finally:
+        monitor.close()
+        if space is not None:
+            space.release(filename, client.identity)
+    end_transfer(client, store, torrent, filename, nbytes, retvalue)
+    if retvalue == 0 and run_processor_program is not None:
+        process_item(run_processor_program, filename, processors)
+    return retvalue
+
+
+def remove_items(client, store, items, snapshot=None):
+    """Removes the downloads of items not seeding any more.  Returns 0, or
+    1 if some could not be removed."""
+    todo = []
+    for torrent, seeding, filename in items:
+        if seeding:
+            util.report_message(
+                "%s from %s is complete but still seeding, not removing"
+                % (filename, torrent)
+            )
+        else:
+            todo.append((torrent, filename))
+    if not todo:
+        return 0
+    started = time.monotonic()
+    results = client.remove_remote_downloads([f for _, f in todo], snapshot)
+    metrics.REMOVAL_SECONDS.labels(client.identity).observe(
+        time.monotonic() - started
+    )
+    retvalue = 0
+    markers = store.markers_owner() == client.identity
+    for (torrent, filename), error in zip(todo, results):
+        if error is not None:
+            if isinstance(error, IOError) and error.errno == errno.EINTR:
+                raise error
+            util.report_error(
+                "Removal of %s failed -- %s: %s"
+                % (filename, type(error).__name__, error)
+            )
+            retvalue = 1
+            continue
+        store.removed(client.identity, torrent, filename)
+        # Marker left behind by versions that did not have the state store,
+        # if it was this seedbox that the markers were imported for.
+        try:
+            if markers:
+                os.unlink(".%s.done" % filename)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        util.report_message("Removal of %s complete" % filename)
+    return retvalue
+
+
+def stat_on_server(client, filenames, snapshot=None):
+    """Returns {filename: RemoteStat} for filenames, in a single round trip
+    to the server if the client supports it."""
+    try:
+        return client.exists_on_server_many(filenames, snapshot)
+    except NotImplementedError:
+        return dict(
+            (f, RemoteStat(client.exists_on_server(f, snapshot), None, None))
+            for f in filenames
+        )
+
+
+def find_work(client, store, remove_finished=False):
+    """Returns the items to download, the items to remove from the server,
+    and the listing they come from."""
+    store.migrate_markers(client.identity)
+
+    # Set aside what is already downloaded, unless it has to be removed.
+    known = store.states(client.identity)
+    known_ids = store.torrent_ids(client.identity)
+    started = time.monotonic()
+    snapshot = client.list_torrents()
+    metrics.POLL_SECONDS.labels(client.identity).observe(time.monotonic() - started)
+    candidates = []
+    for torrent, status, filename in client.get_files_to_download(snapshot):
+        # Removed items are downloaded again if they ever show up again.
+        fully_downloaded = known.get(filename) == state.DONE
+        recorded, current = known_ids.get(filename), torrent_id(snapshot, torrent)
+        if fully_downloaded and recorded and current and recorded != current:
+            util.report_message(
+                "%s from %s was added to the seedbox again, downloading it again"
+                % (filename, torrent)
+            )
+            fully_downloaded = False
         # If the file is completely downloaded but not to be remotely removed, skip
         if fully_downloaded and not remove_finished:
             util.report_message(
@@ -27,92 +351,156 @@ def download(client, remove_finished=False, run_processor_program=None):
                 % (filename, torrent)
             )
             continue
+        candidates.append((torrent, status, filename, fully_downloaded))
 
-        # If the remote files don't exist, skip
-        util.report_message(
-            "Checking if %s from torrent %s exists on server" % (filename, torrent)
+    # Check on the server, in one go, which of the candidates still exist.
+    # What is already downloaded is only there to be removed, which does
+    # not need to know.
+    wanted = [c[2] for c in candidates if not c[3]]
+    manifest = {}
+    if wanted:
+        util.report_message("Checking if %s torrent(s) exist on server" % len(wanted))
+        started = time.monotonic()
+        manifest = stat_on_server(client, wanted, snapshot)
+        metrics.EXISTS_CHECK_SECONDS.labels(client.identity).observe(
+            time.monotonic() - started
         )
-        if not client.exists_on_server(filename):
+
+    downloads, removals = [], []
+    for torrent, status, filename, fully_downloaded in candidates:
+        seeding = status == "Seeding"
+        if fully_downloaded:
+            removals.append((torrent, seeding, filename))
+        # If the remote files don't exist, skip
+        elif not manifest[filename].exists:
             util.report_message(
                 "%s from %s is no longer available on server, continuing to next torrent"
                 % (filename, torrent)
             )
-            continue
+        else:
+            nbytes = manifest[filename].size
+            if nbytes is None and snapshot.by_name(torrent) is not None:
+                # Not as exact, but better than nothing.
+                nbytes = snapshot.by_name(torrent).size
+            downloads.append((torrent, seeding, filename, nbytes))
+    return downloads, removals, snapshot
 
-        if not fully_downloaded:
-
-            # Start download.
-            util.report_message("Downloading %s from torrent %s" % (filename, torrent))
-            util.mark_dir_downloading_when_it_appears(filename)
-            retvalue = client.transfer(filename)
-            if retvalue != 0:
-                # rsync failed
-                util.mark_dir_error(filename)
-                if retvalue == 20:
-                    util.report_error(
-                        "Download of %s stopped -- rsync process interrupted"
-                        % (filename,)
-                    )
-                    util.report_message("Finishing by user request")
-                    return 2
-                elif retvalue < 0:
-                    util.report_error(
-                        "Download of %s failed -- rsync process killed with signal %s"
-                        % (filename, -retvalue)
-                    )
-                    util.report_message("Aborting")
-                    return 1
-                else:
-                    util.report_error(
-                        "Download of %s failed -- rsync process exited with return status %s"
-                        % (filename, retvalue)
-                    )
-                    util.report_message("Aborting")
-                    return 1
-            # Rsync successful
-            # mark file as downloaded
-            try:
-                open(download_lockfile, "w").write("Done")
-            except OSError as e:
-                if e.errno != 17:
-                    raise
-            # report successful download
-            fully_downloaded = True
-            util.mark_dir_complete(filename)
-            util.report_message("Download of %s complete" % filename)
-
-            if run_processor_program is not None:
-                try:
-                    retval = subprocess.call(
-                        [run_processor_program, filename], stdin=open(os.devnull)
-                    )
-                    util.report_message(
-                        "Execution of %s %s exited with return value%s"
-                        % (
-                            run_processor_program,
-                            filename,
-                            retval,
-                        )
-                    )
-                except OSError as e:
-                    util.report_error(
-                        "Program %r is not executable: %s" % (run_processor_program, e)
-                    )
 
-        if remove_finished:
-            if seeding:
-                util.report_message(
-                    "%s from %s is complete but still seeding, not removing"
-                    % (filename, torrent)
-                )
+def next_poll_interval(client, pacer, run_every):
+    """Returns the seconds to sleep before the next leech cycle: always
+    run_every, unless there is an adaptive pacer."""
+    if pacer is None:
+        return run_every
+    progress = None
+    if client.latest is not None:
+        # Only from the last listing: the seedbox may be unreachable.
+        try:
+            progress = client.get_progress()
+        except NotImplementedError:
+            pass
+    # Rounding up means not polling before the next torrent is done.
+    return int(math.ceil(pacer.next_interval(progress)))
+
+
+def report_cycle_result(retvalue):
+    if retvalue == 2:
+        util.report_message("Finishing by user request")
+    elif retvalue:
+        util.report_message("Some downloads failed")
+
+
+# start execution here
+def download(
+    client,
+    remove_finished=False,
+    run_processor_program=None,
+    scheduler=None,
+    store=None,
+    shards=1,
+    processors=None,
+    ordering=None,
+    space=None,
+):
+    if scheduler is None:
+        scheduler = TransferScheduler()
+    if store is None:
+        store = StateStore()
+    batch = scheduler.batch()
+
+    downloads, removals, snapshot = find_work(client, store, remove_finished)
+    if ordering is not None:
+        downloads = ordering.order(downloads, snapshot)
+    if space is not None:
+        downloads = admit_transfers(client, space, downloads)
+
+    # Start downloads.  Removal, if requested, happens once the transfer
+    # has succeeded, along with the rest at the end of the cycle.
+    queued = {}
+    for torrent, seeding, filename, nbytes in downloads:
+        if sighandled:
+            break
+        queued[filename] = queue_transfer(
+            client, store, torrent, filename, nbytes, snapshot
+        )
+        batch.submit(
+            client.ssh_hostname,
+            (torrent, seeding, filename),
+            transfer_item,
+            client,
+            store,
+            torrent,
+            filename,
+            nbytes,
+            run_processor_program,
+            shards,
+            processors,
+            snapshot,
+            space,
+        )
+
+    # Collect the transfers.  A failed item is reported and does not stop
+    # the others; an interrupted one stops the jobs that have not started.
+    retvalue = 0
+    for job in batch.as_completed():
+        torrent, seeding, filename = job.key
+        if job.exception is not None:
+            util.report_error(
+                "Download of %s failed -- %s: %s"
+                % (filename, type(job.exception).__name__, job.exception)
+            )
+            traceback.print_exception(
+                type(job.exception), job.exception, job.exception.__traceback__
+            )
+            retvalue = retvalue or 1
+            continue
+        if job.result != 0:
+            if report_transfer_failure(filename, job.result) == 2:
+                batch.cancel()
+                retvalue = 2
             else:
-                client.remove_remote_download(filename)
-                try:
-                    os.unlink(download_lockfile)
-                except OSError as e:
-                    if e.errno != errno.ENOENT:
-                        raise
-                util.report_message("Removal of %s complete" % filename)
+                retvalue = retvalue or 1
+            continue
+        if remove_finished:
+            removals.append((torrent, seeding, filename))
+
+    # Jobs dropped by batch.cancel(), or skipped after a signal, never
+    # started: they leave the queue, give back the space they were
+    # admitted with, and their items go back to how they were.
+    metrics.TRANSFERS_QUEUED.labels(client.identity).set(0)
+    for filename, previous in queued.items():
+        store.unqueued(client.identity, filename, previous)
+    if space is not None:
+        for _, _, filename, _ in downloads:
+            space.release(filename, client.identity)
+
+    # Remove what had already been downloaded, and what was just now, in
+    # one go.
+    if removals and not sighandled:
+        if remove_items(client, store, removals, snapshot):
+            retvalue = retvalue or 1
+
+    report_cycle_result(retvalue)
+    return retvalue
 
 
 sighandled = False
@@ -129,33 +517,94 @@ def sighandler(signum, frame):
         sighandled = True
 
 
-def do_guarded(client, remove_finished, run_processor_program):
-    global sighandled
-    try:
-        return download(
-            client=client,
-            remove_finished=remove_finished,
-            run_processor_program=run_processor_program,
-        )
-    except IOError as e:
-        if e.errno == 4:
-            pass
-        else:
+def cycle_exception_status(e):
+    """Reports e, which ended a leech cycle, and returns the status of the
+    cycle, or re-raises it.  Must be called from the except block."""
+    if isinstance(e, IOError):
+        if e.errno != 4:
             traceback.print_exc()
         return 8
-    except Misconfiguration as e:
+    if isinstance(e, Misconfiguration):
         util.report_error(str(e))
         traceback.print_exc()
         return 16
-    except TemporaryMalfunction as e:
-        util.report_error(str(e))
-    except ConnectionError as e:
+    if isinstance(e, (TemporaryMalfunction, ConnectionError)):
         util.report_error(str(e))
-    except subprocess.CalledProcessError as e:
-        if not sighandled:
-            raise
+        return None
+    if isinstance(e, subprocess.CalledProcessError) and sighandled:
+        return None
+    raise
+
+
+def do_guarded(client, **kwargs):
+    try:
+        # Restarts the shared SSH connection if it died while idle.
+        client.ensure_connected()
+        retvalue = download(client=client, **kwargs)
     except Exception as e:
-        raise
+        metrics.cycle_finished(client.identity, None)
+        return cycle_exception_status(e)
+    metrics.cycle_finished(client.identity, retvalue)
+    return retvalue
+
+
+def leech_forever(client, cycle, run_every, pacer=None, watch=False):
+    """Runs cycle() every run_every seconds, or when the seedbox says
+    something finished, until a signal arrives."""
+    retvalue = 0
+    # Set when the seedbox reports that something finished.
+    wake = threading.Event()
+    watcher = None
+    if watch:
+        watcher = RemoteWatcher(client, lambda names: wake.set())
+    try:
+        while not sighandled:
+            wake.clear()
+            retvalue = cycle()
+            if watch and not sighandled and client.latest is not None:
+                watcher.watch(client.watch_dirs())
+            interval = next_poll_interval(client, pacer, run_every)
+            if not sighandled:
+                util.report_message("Sleeping %s seconds" % interval)
+            for _ in range(interval):
+                if sighandled or wake.wait(1):
+                    break
+    finally:
+        if watcher is not None:
+            watcher.stop()
+    return retvalue
+
+
+def run_all(clients, function):
+    """Runs function(client) for each of clients, each in a thread of its
+    own.  Returns the highest of their statuses."""
+    if len(clients) == 1:
+        return function(clients[0])
+    results = [0] * len(clients)
+
+    def run(n, client):
+        try:
+            results[n] = function(client)
+        except Exception as e:
+            util.report_error(
+                "Leeching from %s failed -- %s: %s"
+                % (client.identity, type(e).__name__, e)
+            )
+            traceback.print_exc()
+            results[n] = 1
+
+    threads = [
+        threading.Thread(target=run, args=(n, client), daemon=True)
+        for n, client in enumerate(clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        # With a timeout, so that signals are handled meanwhile.
+        while t.is_alive():
+            t.join(1)
+    # Temporary problems end cycles with None.
+    return max(r or 0 for r in results)
 
 
 def mainloop():
@@ -180,6 +629,46 @@ def mainloop():
         except ValueError as e:
             parser.error("option --run-every must be a positive integer")
 
+    if opts.parallel < 1:
+        parser.error("option --parallel must be a positive integer")
+    if opts.parallel_per_host < 0:
+        parser.error("option --parallel-per-host cannot be negative")
+    if opts.shards < 1:
+        parser.error("option --shards must be a positive integer")
+    if opts.adaptive and opts.run_every is False:
+        parser.error("option --adaptive requires --run-every")
+    if opts.watch and opts.run_every is False:
+        parser.error("option --watch requires --run-every")
+    if opts.poll_min < 1:
+        parser.error("option --poll-min must be a positive integer")
+    if opts.poll_max < opts.poll_min:
+        parser.error("option --poll-max cannot be less than --poll-min")
+    if opts.processor_jobs < 1:
+        parser.error("option --processor-jobs must be a positive integer")
+    if opts.processor_timeout < 0:
+        parser.error("option --processor-timeout cannot be negative")
+    if opts.processor_retries < 0:
+        parser.error("option --processor-retries cannot be negative")
+    if opts.processor_queue < 1:
+        parser.error("option --processor-queue must be a positive integer")
+    if not 0 <= opts.metrics_port <= 65535:
+        parser.error("option --metrics-port must be a port number")
+    if opts.metrics_textfile is not None and not opts.metrics_textfile.endswith(
+        ".prom"
+    ):
+        parser.error("option --metrics-textfile must name a .prom file")
+    if opts.metrics_textfile is not None:
+        # The working directory changes below.
+        opts.metrics_textfile = os.path.abspath(opts.metrics_textfile)
+    if opts.order_deadline < 0:
+        parser.error("option --order-deadline cannot be negative")
+    labels = [l.strip() for l in (opts.order_labels or "").split(",") if l.strip()]
+    if opts.order == "label" and not labels:
+        parser.error("option --order=label requires --order-labels")
+    reserve = util.parse_size(opts.min_free_space)
+    if reserve is None:
+        parser.error("option --min-free-space must be a size such as 10G")
+
     # check config availability and load configuration
     try:
         config_fobject = open(config.default_filename)
@@ -190,7 +679,10 @@ def mainloop():
         sys.exit(EXIT_NOTCONFIGURED)
     cfg = config.load_config(config_fobject)
     local_download_dir = cfg.general.local_download_dir
-    client = config.get_client(cfg)
+    clients = config.get_clients(cfg)
+    if not clients:
+        util.report_error("No torrent client configured -- run configleecher")
+        sys.exit(EXIT_NOTCONFIGURED)
 
     # check download dir and log file availability
     try:
@@ -200,6 +692,7 @@ def mainloop():
             "Cannot change to download directory %r: %s" % (local_download_dir, e)
         )
         sys.exit(EXIT_CHDIR)
+    space = DiskSpace(".", reserve)
 
     # check processor program availability
     if opts.run_processor_program is not None:
@@ -247,27 +740,119 @@ def mainloop():
             util.report_error("Another process has a lock on the download directory")
             sys.exit(0)
 
-    dg = lambda: do_guarded(
+    scheduler = TransferScheduler(opts.parallel, opts.parallel_per_host)
+    try:
+        store = StateStore(state.default_filename)
+    except sqlite3.Error as e:
+        util.report_error("Cannot open state database: %s" % e)
+        sys.exit(EXIT_NOPERMISSION)
+    # Before the seedboxes race for them: the markers of older versions
+    # go to the first one.
+    store.migrate_markers(clients[0].identity)
+    if opts.metrics_port:
+        try:
+            metrics.serve(opts.metrics_port, opts.metrics_address)
+        except (IOError, OSError) as e:
+            util.report_error(
+                "Cannot serve metrics on %s port %s: %s"
+                % (opts.metrics_address, opts.metrics_port, e)
+            )
+            sys.exit(EXIT_NOPERMISSION)
+    textfile = None
+    if opts.metrics_textfile is not None:
+        textfile = metrics.TextfileWriter(opts.metrics_textfile)
+    processors = None
+    if opts.run_processor_program is not None:
+        processors = ProcessorQueue(
+            store,
+            workers=opts.processor_jobs,
+            timeout=opts.processor_timeout or None,
+            retries=opts.processor_retries,
+            limit=opts.processor_queue,
+        )
+    # Each seedbox keeps its own order of downloads and polling pace.
+    orderings = dict(
+        (client, Ordering(opts.order, labels, opts.order_deadline))
+        for client in clients
+    )
+    pacers = dict.fromkeys(clients)
+    if opts.adaptive:
+        for client in clients:
+            pacers[client] = AdaptivePacer(
+                opts.poll_min, opts.poll_max, initial=opts.run_every
+            )
+    dg = lambda client: do_guarded(
         client,
         remove_finished=opts.remove_finished,
         run_processor_program=opts.run_processor_program,
+        scheduler=scheduler,
+        store=store,
+        shards=opts.shards,
+        processors=processors,
+        ordering=orderings[client],
+        space=space,
     )
 
     retvalue = 0
-    if opts.run_every is False:
-        util.report_message("Starting download of finished torrents")
-        retvalue = dg()
-        util.report_message("Download of finished torrents complete")
-    else:
-        util.report_message("Starting daemon for download of finished torrents")
-        while not sighandled:
-            retvalue = dg()
-            if not sighandled:
-                util.report_message("Sleeping %s seconds" % opts.run_every)
-            for _ in range(opts.run_every):
-                if not sighandled:
-                    time.sleep(1)
-        util.report_message("Download of finished torrents complete")
+    try:
+        if opts.engine == "asyncio":
+            from seedboxtools import aioleecher
+
+            if opts.run_every is False:
+                util.report_message("Starting download of finished torrents")
+            else:
+                util.report_message("Starting daemon for download of finished torrents")
+            parallel = opts.parallel
+            if opts.parallel_per_host:
+                parallel = min(parallel, opts.parallel_per_host)
+            engines = [
+                aioleecher.Engine(
+                    client,
+                    store,
+                    remove_finished=opts.remove_finished,
+                    run_processor_program=opts.run_processor_program,
+                    parallel=parallel,
+                    shards=opts.shards,
+                    processors=processors,
+                    pacer=pacers[client],
+                    watch=opts.watch,
+                    ordering=orderings[client],
+                    space=space,
+                )
+                for client in clients
+            ]
+            retvalue = aioleecher.run(engines, opts.run_every, opts.parallel)
+            util.report_message("Download of finished torrents complete")
+        elif opts.run_every is False:
+            util.report_message("Starting download of finished torrents")
+
+            retvalue = run_all(clients, dg)
+            util.report_message("Download of finished torrents complete")
+        else:
+            util.report_message("Starting daemon for download of finished torrents")
+            retvalue = run_all(
+                clients,
+                lambda client: leech_forever(
+                    client,
+                    lambda: dg(client),
+                    opts.run_every,
+                    pacers[client],
+                    opts.watch,
+                ),
+            )
+            util.report_message("Download of finished torrents complete")
+        if processors is not None and opts.run_every is False:
+            if not processors.drain(0):
+                util.report_message("Waiting for processor jobs to finish")
+            while not sighandled and not processors.drain(1):
+                pass
+    finally:
+        if processors is not None:
+            processors.close()
+        for client in clients:
+            client.close()
+        if textfile is not None:
+            textfile.close()
     if sighandled:
         return 0
     return retvalue
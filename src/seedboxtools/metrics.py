@@ -0,0 +1,360 @@
+"""
+Metrics for seedboxtools, in the Prometheus text exposition format
+
+The metrics below are updated by the leecher as it works, and can be read
+over HTTP (serve()) or written out for the node exporter's textfile
+collector (TextfileWriter).
+"""
+
+import http.server
+import math
+import threading
+import time
+from seedboxtools import util
+
+# Seconds, from a quick HTTP request to a large transfer.
+TIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, _escape(v)) for k, v in pairs)
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def labels(self, *values):
+        """Returns the child metric for the given label values."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(
+                "%s takes labels %s" % (self.name, ", ".join(self.labelnames))
+            )
+        values = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new()
+            return child
+
+    def remove(self, *values):
+        """Drops the child metric for the given label values."""
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+    def _only(self):
+        if self.labelnames:
+            raise ValueError("%s needs labels" % self.name)
+        return self._children[()]
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.documentation),
+            "# TYPE %s %s" % (self.name, self.kind),
+        ]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new = _Value
+
+    def inc(self, amount=1):
+        self._only().inc(amount)
+
+    def _render_child(self, values, child):
+        yield "%s%s %s" % (
+            self.name,
+            _labels(self.labelnames, values),
+            _number(child.value),
+        )
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self._only().dec(amount)
+
+    def set(self, value):
+        self._only().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("_lock", "buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=TIME_BUCKETS, registry=None
+    ):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        _Metric.__init__(self, name, documentation, labelnames, registry)
+
+    def _new(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._only().observe(value)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        for bound, count in zip(self.buckets, counts):
+            yield "%s_bucket%s %s" % (
+                self.name,
+                _labels(self.labelnames, values, [("le", _number(bound))]),
+                count,
+            )
+        labels = _labels(self.labelnames, values)
+        yield "%s_sum%s %s" % (self.name, labels, _number(total))
+        yield "%s_count%s %s" % (self.name, labels, counts[-1])
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """Returns every metric in the text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+POLL_SECONDS = Histogram(
+    "seedboxtools_poll_seconds",
+    "Time taken to list the finished torrents of the seedbox.",
+    ["client"],
+)
+EXISTS_CHECK_SECONDS = Histogram(
+    "seedboxtools_exists_check_seconds",
+    "Time taken to check which downloads still exist on the seedbox.",
+    ["client"],
+)
+CYCLES = Counter(
+    "seedboxtools_cycles_total",
+    "Leech cycles, by how they ended.",
+    ["client", "result"],
+)
+LAST_CYCLE = Gauge(
+    "seedboxtools_last_cycle_timestamp_seconds",
+    "When the last leech cycle ended.",
+    ["client"],
+)
+TRANSFERS_QUEUED = Gauge(
+    "seedboxtools_transfers_queued",
+    "Downloads waiting for a free slot.",
+    ["client"],
+)
+TRANSFERS_HELD = Gauge(
+    "seedboxtools_transfers_held",
+    "Downloads held back for lack of space in the download directory.",
+    ["client"],
+)
+TRANSFERS_RUNNING = Gauge(
+    "seedboxtools_transfers_running",
+    "Downloads in progress.",
+    ["client"],
+)
+TRANSFERS = Counter(
+    "seedboxtools_transfers_total",
+    "Finished downloads, by rsync exit code (0 for success).",
+    ["client", "exit_code"],
+)
+TRANSFER_SECONDS = Histogram(
+    "seedboxtools_transfer_seconds",
+    "Time taken by successful downloads.",
+    ["client"],
+)
+TRANSFER_BYTES = Counter(
+    "seedboxtools_transfer_bytes_total",
+    "Bytes of successful downloads.",
+    ["client"],
+)
+TRANSFER_THROUGHPUT = Gauge(
+    "seedboxtools_last_transfer_bytes_per_second",
+    "Average speed of the last successful download.",
+    ["client"],
+)
+TRANSFER_DONE_BYTES = Gauge(
+    "seedboxtools_transfer_done_bytes",
+    "Bytes done so far by the downloads in progress.",
+    ["client"],
+)
+TRANSFER_RATE = Gauge(
+    "seedboxtools_transfer_bytes_per_second",
+    "Current combined speed of the downloads in progress.",
+    ["client"],
+)
+TRANSFER_ETA = Gauge(
+    "seedboxtools_transfer_eta_seconds",
+    "Seconds the slowest download in progress is expected to take yet.",
+    ["client"],
+)
+REMOVAL_SECONDS = Histogram(
+    "seedboxtools_removal_seconds",
+    "Time taken to remove a batch of downloads from the seedbox.",
+    ["client"],
+)
+PROCESSOR_SECONDS = Histogram(
+    "seedboxtools_processor_seconds",
+    "Time taken by runs of the processor program.",
+    ["result"],
+)
+PROCESSOR_JOBS = Gauge(
+    "seedboxtools_processor_jobs",
+    "Processor program runs waiting or running.",
+)
+
+
+def cycle_finished(client, retvalue):
+    """Records the end of a leech cycle with the given status, or None if
+    it ended with an exception."""
+    if retvalue is None:
+        result = "error"
+    else:
+        result = {0: "ok", 2: "interrupted"}.get(retvalue, "failed")
+    CYCLES.labels(client, result).inc()
+    LAST_CYCLE.labels(client).set(time.time())
+
+
+def transfer_finished(client, retvalue, seconds, nbytes=None):
+    """Records the outcome of a download."""
+    TRANSFERS.labels(client, retvalue).inc()
+    if retvalue != 0:
+        return
+    TRANSFER_SECONDS.labels(client).observe(seconds)
+    if nbytes:
+        TRANSFER_BYTES.labels(client).inc(nbytes)
+        if seconds > 0:
+            TRANSFER_THROUGHPUT.labels(client).set(nbytes / seconds)
+
+
+def serve(port, address="127.0.0.1", registry=REGISTRY):
+    """Serves the metrics at /metrics from a daemon thread.  Returns the
+    server."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            data = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class TextfileWriter:
+    """
+    Writes the metrics to path every interval seconds from a daemon
+    thread, for the node exporter's textfile collector, and once more on
+    close().
+    """
+
+    def __init__(self, path, interval=15, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self):
+        try:
+            util.write_atomically(self.path, self.registry.render().encode("utf-8"))
+        except (IOError, OSError) as e:
+            util.report_error("Cannot write metrics to %s: %s" % (self.path, e))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
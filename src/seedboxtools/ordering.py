@@ -0,0 +1,86 @@
+"""
+Download ordering policies for seedboxtools
+"""
+
+import time
+
+# The name of every policy, the default first.
+POLICIES = ["listing", "smallest", "oldest", "label", "deadline"]
+
+
+class Ordering:
+    """
+    Decides which of the finished torrents waiting to be downloaded goes
+    first, from what the listing (a clients.Snapshot) says about them.
+
+    listing: in the order the seedbox lists them.
+    smallest: smallest first.
+    oldest: the one that finished on the seedbox longest ago first.
+    label: by the position of their label in labels, those with other
+      labels or none last, and smallest first within each label.
+    deadline: smallest first, except that those that finished more than
+      deadline seconds ago go before all others, oldest first.
+
+    When the seedbox does not say when a torrent finished, the time it was
+    first seen finished stands in.  Torrents of unknown size go after the
+    rest, and ties keep the order of the listing.
+    """
+
+    def __init__(self, policy="listing", labels=(), deadline=3600):
+        if policy not in POLICIES:
+            raise ValueError("unknown ordering policy %r" % policy)
+        if deadline < 0:
+            raise ValueError("deadline cannot be negative")
+        self.policy = policy
+        self.labels = list(labels)
+        self.deadline = deadline
+        # filename: when it was first seen finished.
+        self._first_seen = {}
+
+    def order(self, downloads, snapshot, now=None):
+        """
+        Returns downloads, a list of (torrent, seeding, filename, nbytes)
+        as leecher.find_work() makes them, sorted by the policy.
+        """
+        now = time.time() if now is None else now
+        first_seen = {}
+        for _, _, filename, _ in downloads:
+            first_seen[filename] = self._first_seen.get(filename, now)
+        # Only what still waits is remembered.
+        self._first_seen = first_seen
+        if self.policy == "listing":
+            return list(downloads)
+        return sorted(
+            downloads,
+            key=lambda d: self.key(snapshot.by_name(d[0]), d[2], d[3], now),
+        )
+
+    def key(self, torrent, filename, nbytes=None, now=None):
+        """
+        Returns the sort key of the download of filename, from torrent (a
+        clients.Torrent, or None if the listing does not have it) and its
+        size in bytes if known; lower goes first.
+        """
+        now = time.time() if now is None else now
+        if nbytes is None and torrent is not None:
+            nbytes = torrent.size
+        size = (nbytes is None, nbytes or 0)
+        completed = torrent.completed if torrent is not None else None
+        if completed is None:
+            completed = self._first_seen.get(filename, now)
+        if self.policy == "smallest":
+            return size
+        if self.policy == "oldest":
+            return (completed,)
+        if self.policy == "label":
+            label = torrent.label if torrent is not None else None
+            if label in self.labels:
+                rank = self.labels.index(label)
+            else:
+                rank = len(self.labels)
+            return (rank,) + size
+        if self.policy == "deadline":
+            if now - completed > self.deadline:
+                return (0, completed)
+            return (1,) + size
+        return ()
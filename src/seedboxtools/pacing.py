@@ -0,0 +1,76 @@
+"""
+Adaptive polling intervals for seedboxtools
+"""
+
+import time
+
+
+class AdaptivePacer:
+    """
+    Works out how long to wait before polling the seedbox again, from the
+    progress of its torrents (a list of clients.Progress).
+
+    The interval drops to minimum whenever a torrent finishes, appears or
+    goes away, and doubles (up to maximum) on every poll where none did.
+    While torrents are downloading, it is cut short to poll right when the
+    first of them is expected to finish, as estimated from its download
+    rate, or from how far it got since the previous poll.
+    """
+
+    def __init__(self, minimum, maximum, initial=None, factor=2):
+        if minimum <= 0:
+            raise ValueError("minimum must be positive")
+        if maximum < minimum:
+            raise ValueError("maximum cannot be less than minimum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.interval = self._clamp(minimum if initial is None else initial)
+        self._last = None
+        self._samples = {}
+
+    def _clamp(self, interval):
+        return min(max(interval, self.minimum), self.maximum)
+
+    def eta(self, progress, now=None):
+        """Returns the seconds until the first unfinished torrent in
+        progress is expected to finish, or None if there is no telling."""
+        now = time.monotonic() if now is None else now
+        etas = []
+        for p in progress:
+            if p.done >= p.size:
+                continue
+            rate = p.rate
+            sample = self._samples.get(p.torrent)
+            if not rate and sample is not None:
+                then, done = sample
+                if now > then and p.done > done:
+                    rate = (p.done - done) / (now - then)
+            if rate:
+                etas.append((p.size - p.done) / rate)
+        return min(etas) if etas else None
+
+    def next_interval(self, progress, now=None):
+        """
+        Returns the seconds to wait before the next poll, given progress
+        as of the poll that just happened (None if the client does not
+        report progress, which keeps the current interval).
+        """
+        if progress is None:
+            return self.interval
+        now = time.monotonic() if now is None else now
+        state = (
+            frozenset(p.torrent for p in progress),
+            frozenset(p.torrent for p in progress if p.done >= p.size),
+        )
+        if self._last is not None:
+            if state != self._last:
+                self.interval = self.minimum
+            else:
+                self.interval = self._clamp(self.interval * self.factor)
+        self._last = state
+        eta = self.eta(progress, now)
+        self._samples = dict((p.torrent, (now, p.done)) for p in progress)
+        if eta is None:
+            return self.interval
+        return self._clamp(min(eta, self.interval))
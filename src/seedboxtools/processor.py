@@ -0,0 +1,210 @@
+"""
+Background queue of processor program runs for seedboxtools
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from seedboxtools import metrics, state, util
+
+
+def exit_message(program, filename, returncode):
+    return "Execution of %s %s exited with return value %s" % (
+        program,
+        filename,
+        returncode,
+    )
+
+
+def report_exit(program, filename, returncode, started):
+    """Accounts for, and reports, a run of program that began at started
+    (a time.monotonic() value)."""
+    metrics.PROCESSOR_SECONDS.labels("ok" if returncode == 0 else "failed").observe(
+        time.monotonic() - started
+    )
+    util.report_message(exit_message(program, filename, returncode))
+
+
+class ProcessorQueue:
+    """
+    Runs the processor program on downloaded items from worker threads, so
+    that downloads do not wait for it.
+
+    Jobs live in the state store, so jobs still queued (or running) when
+    the leecher stops run when it starts again.  At most `workers` jobs run
+    at the same time, each for at most `timeout` seconds (None for no
+    limit).  A failed job runs again up to `retries` more times, waiting
+    `retry_delay` seconds the first time and twice as long every next time.
+    submit() blocks while `limit` jobs are already waiting or running.
+    """
+
+    # Bytes of output (the last ones) kept for every run.
+    output_limit = 65536
+
+    def __init__(
+        self, store, workers=1, timeout=None, retries=0, retry_delay=60, limit=100
+    ):
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        if limit < 1:
+            raise ValueError("limit must be a positive integer")
+        self.store = store
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.limit = limit
+        self._cond = threading.Condition()
+        self._threads = []
+        self._procs = set()
+        self._stopping = False
+        requeued = store.requeue_jobs()
+        if requeued:
+            util.report_message("Resuming %s interrupted processor job(s)" % requeued)
+        if store.count_jobs(state.PENDING):
+            with self._cond:
+                self._start_workers()
+
+    def submit(self, program, filename):
+        """Queues a run of program on filename."""
+        with self._cond:
+            while (
+                not self._stopping
+                and self.store.count_jobs(state.PENDING, state.RUNNING) >= self.limit
+            ):
+                self._cond.wait()
+            self.store.add_job(program, filename)
+            self._update_gauge()
+            self._start_workers()
+            self._cond.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits up to timeout seconds for the queue to empty.  Returns True
+        if it is empty."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self.store.count_jobs(state.PENDING, state.RUNNING):
+                remaining = None if deadline is None else deadline - time.time()
+                if self._stopping or (remaining is not None and remaining <= 0):
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self):
+        """
+        Stops the workers.  Running jobs are terminated and queued again,
+        to run the next time a queue is created on the same store.
+        """
+        with self._cond:
+            self._stopping = True
+            for proc in self._procs:
+                self._terminate(proc, signal.SIGTERM)
+            self._cond.notify_all()
+            threads = list(self._threads)
+        for t in threads:
+            t.join()
+
+    def _update_gauge(self):
+        metrics.PROCESSOR_JOBS.set(
+            self.store.count_jobs(state.PENDING, state.RUNNING)
+        )
+
+    def _start_workers(self):
+        # Must be called with the condition held.
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work, daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    @staticmethod
+    def _terminate(proc, signum):
+        # Jobs run in sessions of their own, so this reaches whatever
+        # they started too.
+        try:
+            os.killpg(proc.pid, signum)
+        except OSError:
+            pass
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    job = self.store.claim_job()
+                    if job is not None:
+                        break
+                    due = self.store.next_job_due()
+                    self._cond.wait(None if due is None else max(due - time.time(), 0))
+            self._run(job)
+            with self._cond:
+                self._update_gauge()
+                self._cond.notify_all()
+
+    def _run(self, job):
+        program, filename = job["program"], job["filename"]
+        timed_out = False
+        started = time.monotonic()
+        try:
+            # A session of its own keeps the job out of the signals the
+            # leecher passes on to its process group when it is stopped.
+            proc = subprocess.Popen(
+                [program, filename],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except OSError as e:
+            self._finish(job, 127, "Program %r is not executable: %s" % (program, e))
+            return
+        with self._cond:
+            self._procs.add(proc)
+            if self._stopping:
+                self._terminate(proc, signal.SIGTERM)
+        try:
+            try:
+                output, _ = proc.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                self._terminate(proc, signal.SIGKILL)
+                output, _ = proc.communicate()
+        finally:
+            with self._cond:
+                self._procs.discard(proc)
+        output = output[-self.output_limit :].decode("utf-8", "replace")
+        if self._stopping and proc.returncode != 0:
+            # Stopped by close(); it runs again next time.
+            self.store.release_job(job["id"])
+            return
+        if timed_out:
+            result = "timeout"
+        else:
+            result = "ok" if proc.returncode == 0 else "failed"
+        metrics.PROCESSOR_SECONDS.labels(result).observe(time.monotonic() - started)
+        if timed_out:
+            util.report_error(
+                "Execution of %s %s timed out after %s seconds"
+                % (program, filename, self.timeout)
+            )
+        self._finish(job, proc.returncode, output)
+
+    def _finish(self, job, returncode, output):
+        program, filename = job["program"], job["filename"]
+        if returncode == 0:
+            self.store.job_finished(job["id"], returncode, output)
+            util.report_message(exit_message(program, filename, returncode))
+            return
+        message = exit_message(program, filename, returncode)
+        retry_at = None
+        if job["attempts"] <= self.retries:
+            delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+            retry_at = time.time() + delay
+            message += " -- trying again in %s seconds" % delay
+        self.store.job_finished(job["id"], returncode, output, retry_at)
+        if output.strip():
+            lines = output.rstrip().splitlines()[-20:]
+            message += "\n" + "\n".join("  " + line for line in lines)
+        util.report_error(message)
@@ -0,0 +1,172 @@
+"""
+Watching seedbox directories over SSH for seedboxtools
+"""
+
+import os
+import select
+import subprocess
+import threading
+import time
+from seedboxtools import util
+
+# Watches the directories given after the interval, printing "done PATH"
+# when a file is written or something is moved in.  Without inotifywait,
+# it prints "changed PATH" for every path whose status changed, and "tick"
+# every interval seconds instead; a path that changed in one round and not
+# in the next has settled.
+REMOTE_WATCH_SCRIPT = r"""
+interval=$1 ; shift
+if command -v inotifywait >/dev/null 2>&1 ; then
+    exec inotifywait -m -r -q -e close_write -e moved_to --format 'done %w%f' -- "$@"
+fi
+stamp=$(mktemp) || exit 1
+trap 'rm -f "$stamp"' EXIT
+trap 'exit 0' HUP INT TERM PIPE
+while sleep "$interval" ; do
+    next=$(mktemp) || exit 1
+    find "$@" -cnewer "$stamp" -printf 'changed %p\n'
+    mv -f "$next" "$stamp"
+    echo tick 2>/dev/null || exit 0
+done
+"""
+
+
+class RemoteWatcher:
+    """
+    Keeps one SSH session open to the seedbox of client, watching the
+    directories given to watch(), and calls callback(names) from a thread
+    of its own with the names (first path components under the watched
+    directories) of what finished or was moved in.
+
+    Events that arrive within settle seconds of each other are reported
+    together.  If the session ends, it is opened again after retry_delay
+    seconds.
+    """
+
+    retry_delay = 60
+    settle = 2
+
+    def __init__(self, client, callback, interval=10):
+        self.client = client
+        self.callback = callback
+        self.interval = interval
+        self.dirs = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._proc = None
+        self._thread = None
+        self._stopping = False
+
+    def watch(self, dirs):
+        """Watches dirs, restarting the session if they changed."""
+        dirs = sorted(set(d.rstrip("/") or "/" for d in dirs))
+        with self._lock:
+            if dirs == self.dirs or self._stopping:
+                return
+            self.dirs = dirs
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            elif self._proc is not None:
+                self._proc.terminate()
+            self._wakeup.set()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            if self._proc is not None:
+                self._proc.terminate()
+            self._wakeup.set()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _name(self, path):
+        # The innermost directory, if some are inside others.
+        for d in sorted(self.dirs, key=len, reverse=True):
+            prefix = d if d.endswith("/") else d + "/"
+            if path.startswith(prefix):
+                return path[len(prefix) :].split("/", 1)[0] or None
+        return None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wakeup.clear()
+                if self._stopping:
+                    return
+                dirs = self.dirs
+                try:
+                    self._proc = self.client.popenssh(
+                        ["sh", "-c", REMOTE_WATCH_SCRIPT, "sh", str(self.interval)]
+                        + dirs,
+                        stdin=subprocess.DEVNULL,
+                        stdout=subprocess.PIPE,
+                        # Out of the way of the signals the leecher passes
+                        # on to its process group; stop() ends it.
+                        start_new_session=True,
+                    )
+                except OSError as e:
+                    self._proc = None
+                    util.report_error("Cannot watch the seedbox: %s" % e)
+            proc = self._proc
+            if proc is not None:
+                self._read(proc)
+                proc.stdout.close()
+                returncode = proc.wait()
+                with self._lock:
+                    self._proc = None
+                    if self._stopping:
+                        return
+                    if dirs != self.dirs:
+                        # Terminated by watch() to watch other directories.
+                        continue
+                util.report_error(
+                    "Watch on the seedbox ended with return status %s -- "
+                    "trying again in %s seconds" % (returncode, self.retry_delay)
+                )
+            self._wakeup.wait(self.retry_delay)
+
+    def _read(self, proc):
+        fd = proc.stdout.fileno()
+        buf = b""
+        pending = set()
+        changed, previous = set(), set()
+        deadline = None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    util.report_message(
+                        "Seedbox reports changes to %s" % ", ".join(sorted(pending))
+                    )
+                    self.callback(sorted(pending))
+                    pending = set()
+                    deadline = timeout = None
+            # Wake up now and then: the session can end while something
+            # it started still holds the pipe open.
+            if timeout is None or timeout > 1:
+                timeout = 1
+            ready = select.select([fd], [], [], timeout)[0]
+            if proc.poll() is not None:
+                return
+            if not ready:
+                continue
+            data = os.read(fd, 65536)
+            if not data:
+                return
+            lines = (buf + data).split(b"\n")
+            buf = lines.pop()
+            for line in lines:
+                kind, _, path = line.decode("utf-8", "surrogateescape").partition(" ")
+                name = self._name(path)
+                if kind == "done" and name:
+                    pending.add(name)
+                elif kind == "changed" and name:
+                    changed.add(name)
+                elif kind == "tick":
+                    pending |= previous - changed
+                    changed, previous = set(), changed
+            if pending and deadline is None:
+                deadline = time.monotonic() + self.settle
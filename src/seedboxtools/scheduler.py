@@ -0,0 +1,140 @@
+"""
+Transfer scheduling for seedboxtools
+"""
+
+import threading
+
+
+class Job:
+    """A unit of work submitted to the scheduler through a Batch."""
+
+    __slots__ = ("batch", "host", "key", "function", "args", "result", "exception")
+
+    def __init__(self, batch, host, key, function, args):
+        self.batch = batch
+        self.host = host
+        self.key = key
+        self.function = function
+        self.args = args
+        self.result = None
+        self.exception = None
+
+
+class Batch:
+    """
+    A group of jobs whose results are collected together.
+
+    Several batches can share one scheduler; each one only ever sees the
+    results of the jobs that were submitted through it.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._finished = []
+        self._outstanding = 0
+
+    def submit(self, host, key, function, *args):
+        """Queue function(*args) to run against host.  Returns the Job."""
+        return self.scheduler._submit(self, host, key, function, args)
+
+    def cancel(self):
+        """Drop the jobs of this batch that have not started yet."""
+        self.scheduler._cancel(self)
+
+    def as_completed(self):
+        """Yields jobs as they finish, until no job of this batch is left."""
+        cond = self.scheduler._cond
+        while True:
+            with cond:
+                while not self._finished and self._outstanding:
+                    cond.wait()
+                if not self._finished:
+                    return
+                job = self._finished.pop(0)
+            yield job
+
+
+class TransferScheduler:
+    """
+    Runs jobs on a pool of worker threads.
+
+    At most `workers` jobs run at any given time, and at most `per_host`
+    of them (when nonzero) run against the same host.  Jobs whose host is
+    saturated wait in the queue while jobs for other hosts go ahead.  A
+    worker that frees up takes the first job of the host with the fewest
+    jobs running, so that hosts share the workers fairly.
+    """
+
+    def __init__(self, workers=1, per_host=0):
+        if workers < 1:
+            raise ValueError("workers must be a positive integer")
+        if per_host < 0:
+            raise ValueError("per_host cannot be negative")
+        self.workers = workers
+        self.per_host = per_host
+        self._cond = threading.Condition()
+        self._pending = []
+        self._running = {}
+        self._threads = []
+
+    def batch(self):
+        return Batch(self)
+
+    def running(self, host=None):
+        """Returns the number of jobs running (against host, if given)."""
+        with self._cond:
+            if host is None:
+                return sum(self._running.values())
+            return self._running.get(host, 0)
+
+    def _submit(self, batch, host, key, function, args):
+        job = Job(batch, host, key, function, args)
+        with self._cond:
+            self._pending.append(job)
+            batch._outstanding += 1
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, daemon=True)
+                self._threads.append(t)
+                t.start()
+            self._cond.notify_all()
+        return job
+
+    def _cancel(self, batch):
+        with self._cond:
+            dropped = [j for j in self._pending if j.batch is batch]
+            self._pending = [j for j in self._pending if j.batch is not batch]
+            batch._outstanding -= len(dropped)
+            self._cond.notify_all()
+
+    def _next_job(self):
+        # Must be called with the condition held.
+        best = None
+        for n, job in enumerate(self._pending):
+            running = self._running.get(job.host, 0)
+            if self.per_host and running >= self.per_host:
+                continue
+            if best is None or running < best[0]:
+                best = (running, n)
+                if not running:
+                    break
+        if best is None:
+            return None
+        return self._pending.pop(best[1])
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.host] = self._running.get(job.host, 0) + 1
+            try:
+                job.result = job.function(*job.args)
+            except BaseException as e:
+                job.exception = e
+            with self._cond:
+                self._running[job.host] -= 1
+                job.batch._finished.append(job)
+                job.batch._outstanding -= 1
+                self._cond.notify_all()
@@ -0,0 +1,355 @@
+"""
+Local record of what has been downloaded, for seedboxtools
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+TRANSFERRING = "transferring"
+DONE = "done"
+REMOVED = "removed"
+FAILED = "failed"
+
+# States of processor jobs.
+PENDING = "pending"
+RUNNING = "running"
+
+default_filename = ".torrentleecher.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    client TEXT NOT NULL,
+    torrent TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL,
+    bytes INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    updated REAL NOT NULL,
+    torrent_id TEXT,
+    returncode INTEGER,
+    PRIMARY KEY (client, filename)
+);
+CREATE INDEX IF NOT EXISTS items_by_torrent ON items (client, torrent);
+CREATE INDEX IF NOT EXISTS items_by_state ON items (client, state);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    program TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    returncode INTEGER,
+    output TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, not_before);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class StateStore:
+    """
+    Durable record of every item the leecher has dealt with, keyed by
+    client and file name.  Only the last torrent of a file name is kept:
+    its torrent_id (the info hash, or else the id the seedbox gives it)
+    tells a torrent added again under the same name apart.  Safe to use
+    from several threads.
+    """
+
+    def __init__(self, path=default_filename):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            columns = [r[1] for r in self._db.execute("PRAGMA table_info(items)")]
+            for column, kind in (("torrent_id", "TEXT"), ("returncode", "INTEGER")):
+                if column not in columns:
+                    # Made by a version that did not record it.
+                    self._db.execute(
+                        "ALTER TABLE items ADD COLUMN %s %s" % (column, kind)
+                    )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get(self, client, filename):
+        """Returns the row for the item, or None if it is unknown."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM items WHERE client = ? AND filename = ?",
+                (client, filename),
+            ).fetchone()
+
+    def states(self, client):
+        """Returns {filename: state} for every item known for client."""
+        with self._lock:
+            return dict(
+                self._db.execute(
+                    "SELECT filename, state FROM items WHERE client = ?", (client,)
+                ).fetchall()
+            )
+
+    def torrent_ids(self, client):
+        """Returns {filename: torrent_id} for every item known for client
+        whose torrent_id was recorded."""
+        with self._lock:
+            return dict(
+                self._db.execute(
+                    "SELECT filename, torrent_id FROM items "
+                    "WHERE client = ? AND torrent_id IS NOT NULL",
+                    (client,),
+                ).fetchall()
+            )
+
+    def is_done(self, client, filename):
+        row = self.get(client, filename)
+        return row is not None and row["state"] == DONE
+
+    def _upsert(self, client, torrent, filename, state, **fields):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO items (client, torrent, filename, state, updated) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (client, filename) DO UPDATE SET "
+                "torrent = excluded.torrent, state = excluded.state, "
+                "updated = excluded.updated",
+                (client, torrent, filename, state, now),
+            )
+            for field, value in fields.items():
+                self._db.execute(
+                    "UPDATE items SET %s = ? WHERE client = ? AND filename = ?"
+                    % field,
+                    (value, client, filename),
+                )
+
+    def queued(self, client, torrent, filename, nbytes=None, torrent_id=None):
+        """Records that the item waits for a transfer.  Returns the state
+        it was in before, or None if it was unknown."""
+        row = self.get(client, filename)
+        fields = dict(bytes=nbytes)
+        if torrent_id is not None:
+            fields["torrent_id"] = torrent_id
+            if row is not None and row["torrent_id"] not in (None, torrent_id):
+                # Another torrent of the same name, that starts afresh.
+                fields["attempts"] = 0
+        self._upsert(client, torrent, filename, QUEUED, **fields)
+        return row["state"] if row else None
+
+    def unqueued(self, client, filename, previous):
+        """Puts back the item, if it is still queued, in the state previous
+        that queued() returned, as its transfer never started."""
+        with self._lock, self._db:
+            if previous is None:
+                self._db.execute(
+                    "DELETE FROM items "
+                    "WHERE client = ? AND filename = ? AND state = ?",
+                    (client, filename, QUEUED),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE items SET state = ?, updated = ? "
+                    "WHERE client = ? AND filename = ? AND state = ?",
+                    (previous, time.time(), client, filename, QUEUED),
+                )
+
+    def interrupted(self, client, filename):
+        """Returns True if the last transfer of the item was interrupted:
+        stopped by a signal, or never finished at all."""
+        row = self.get(client, filename)
+        if row is None or row["attempts"] == 0 or row["state"] == DONE:
+            return False
+        returncode = row["returncode"]
+        return returncode is None or returncode == 20 or returncode < 0
+
+    def transferring(self, client, torrent, filename):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT attempts FROM items WHERE client = ? AND filename = ?",
+                (client, filename),
+            ).fetchone()
+        attempts = (row["attempts"] if row else 0) + 1
+        self._upsert(
+            client,
+            torrent,
+            filename,
+            TRANSFERRING,
+            attempts=attempts,
+            started=now,
+            finished=None,
+            duration=None,
+            returncode=None,
+        )
+
+    def finished(
+        self, client, torrent, filename, success, nbytes=None, returncode=None
+    ):
+        """Records the end of a transfer, and the rsync status it ended
+        with.  Returns its duration."""
+        row = self.get(client, filename)
+        now = time.time()
+        started = row["started"] if row and row["started"] else now
+        if returncode is None:
+            returncode = 0 if success else 1
+        fields = dict(finished=now, duration=now - started, returncode=returncode)
+        if nbytes is not None:
+            fields["bytes"] = nbytes
+        self._upsert(client, torrent, filename, DONE if success else FAILED, **fields)
+        return now - started
+
+    def removed(self, client, torrent, filename):
+        # Should it show up again, it is downloaded again from scratch.
+        self._upsert(client, torrent, filename, REMOVED, attempts=0)
+
+    def forget(self, client, filename):
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM items WHERE client = ? AND filename = ?",
+                (client, filename),
+            )
+
+    def migrate_markers(self, client, directory="."):
+        """
+        Imports the .NAME.done marker files that older versions left in
+        directory as done items of client.  Runs once, for the first client
+        to ask, as the markers do not say which seedbox they came from;
+        returns the number of markers imported.
+        """
+        key = "markers_migrated:%s" % client
+        if self.markers_owner() is not None:
+            return 0
+        imported = 0
+        now = time.time()
+        with self._lock, self._db:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not (name.startswith(".") and name.endswith(".done")):
+                        continue
+                    filename = name[1:-5]
+                    if not filename:
+                        continue
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO items "
+                        "(client, torrent, filename, state, finished, updated) "
+                        "VALUES (?, '', ?, ?, ?, ?)",
+                        (client, filename, DONE, entry.stat().st_mtime, now),
+                    )
+                    imported += 1
+            self._db.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(now))
+            )
+        return imported
+
+    def markers_owner(self):
+        """Returns the client that the marker files were imported for, or
+        None if they have not been."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key FROM meta WHERE key LIKE 'markers_migrated:%' "
+                "ORDER BY value LIMIT 1"
+            ).fetchone()
+        return row[0].split(":", 1)[1] if row else None
+
+    def add_job(self, program, filename):
+        """Queues a run of program on filename.  Returns the job id."""
+        now = time.time()
+        with self._lock, self._db:
+            return self._db.execute(
+                "INSERT INTO jobs (program, filename, state, created, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (program, filename, PENDING, now, now),
+            ).lastrowid
+
+    def claim_job(self):
+        """
+        Marks the oldest pending job that is due as running, and returns
+        its row, or None if no job is due.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE state = ? AND not_before <= ? "
+                "ORDER BY id LIMIT 1",
+                (PENDING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                (RUNNING, now, row["id"]),
+            )
+            return self._db.execute(
+                "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+            ).fetchone()
+
+    def job_finished(self, job_id, returncode, output, retry_at=None):
+        """
+        Records the outcome of a run of a job.  If retry_at is not None,
+        the job goes back to pending, to run again no sooner than then.
+        """
+        if returncode == 0:
+            state = DONE
+        elif retry_at is not None:
+            state = PENDING
+        else:
+            state = FAILED
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, returncode = ?, output = ?, "
+                "not_before = ?, updated = ? WHERE id = ?",
+                (state, returncode, output, retry_at or 0, time.time(), job_id),
+            )
+
+    def release_job(self, job_id):
+        """Puts a running job back in the queue, as if it had not run."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts - 1, updated = ? "
+                "WHERE id = ?",
+                (PENDING, time.time(), job_id),
+            )
+
+    def requeue_jobs(self):
+        """
+        Puts the jobs left running by a process that went away back in the
+        queue.  Returns how many there were.
+        """
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE jobs SET state = ?, updated = ? WHERE state = ?",
+                (PENDING, time.time(), RUNNING),
+            ).rowcount
+
+    def count_jobs(self, *states):
+        """Returns the number of jobs in any of states."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN (%s)"
+                % ", ".join("?" * len(states)),
+                states,
+            ).fetchone()[0]
+
+    def next_job_due(self):
+        """Returns when the next pending job is due, or None if none is."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(not_before) FROM jobs WHERE state = ?", (PENDING,)
+            ).fetchone()[0]
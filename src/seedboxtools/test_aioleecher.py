@@ -0,0 +1,67 @@
+import seedboxtools.aioleecher as m
+from seedboxtools.state import StateStore
+from seedboxtools.test_leecher import FakeClient
+
+
+def test_engine_transfers_and_removes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = FakeClient(dict.fromkeys(["ft0", "ft1", "ft2", "ft3"], 1), ["ft2"])
+    store = StateStore(str(tmp_path / "state.sqlite"))
+    engine = m.Engine(client, store, remove_finished=True, parallel=2)
+    assert engine.run() == 1
+    removed = [f for e in client.events if e[0] == "remove" for f in e[1]]
+    assert sorted(removed) == ["ft0", "ft1", "ft3"]
+    assert store.states("box") == {
+        "ft0": "removed",
+        "ft1": "removed",
+        "ft2": "failed",
+        "ft3": "removed",
+    }
+    assert (tmp_path / "ft3").is_dir()
+
+
+def test_slots_go_to_the_lowest_key():
+    import asyncio
+
+    async def main():
+        slots = m.Slots(1)
+        await slots.acquire()
+        order = []
+
+        async def wait(name, key):
+            await slots.acquire(lambda: key)
+            order.append(name)
+            slots.release()
+
+        tasks = [
+            asyncio.ensure_future(wait(name, key))
+            for name, key in [("big", (5,)), ("small", (1,)), ("other", (1,))]
+        ]
+        await asyncio.sleep(0)
+        tasks[1].cancel()
+        slots.release()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return order
+
+    assert asyncio.run(main()) == ["other", "big"]
+
+
+class BrokenClient(FakeClient):
+    hostname = ssh_hostname = "broken"
+
+    def _list_torrents(self):
+        raise RuntimeError("no listing")
+
+
+def test_engines_share_a_loop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = StateStore(str(tmp_path / "state.sqlite"))
+    box = FakeClient(dict.fromkeys(["ft0", "ft1", "ft2", "ft3"], 1))
+    other = FakeClient({"gt0": 1, "gt1": 1})
+    other.hostname = "other"
+    clients = [box, BrokenClient({}), other]
+    engines = [m.Engine(c, store, parallel=2) for c in clients]
+    # The broken seedbox does not stop the others.
+    assert m.run(engines, parallel=1) == 1
+    assert sorted(store.states("box")) == ["ft0", "ft1", "ft2", "ft3"]
+    assert store.states("other") == {"gt0": "done", "gt1": "done"}
@@ -0,0 +1,23 @@
+import hashlib
+
+import pytest
+
+import seedboxtools.bencode as m
+
+INFO = b"d6:lengthi3e4:name7:foo.iso12:piece lengthi16384e6:pieces0:e"
+TORRENT = b"d8:announce9:http://x/4:info" + INFO + b"e"
+
+
+def test_decode():
+    assert m.decode(b"li-3e3:abcd1:ali1eeee") == [-3, b"abc", {b"a": [1]}]
+
+
+def test_infohash_and_name():
+    assert m.infohash(TORRENT) == hashlib.sha1(INFO).hexdigest()
+    assert m.torrent_name(TORRENT) == "foo.iso"
+
+
+@pytest.mark.parametrize("data", [b"", b"i1", b"5:abc", b"d1:a", b"x", b"i1ei2e"])
+def test_malformed(data):
+    with pytest.raises(m.BencodeError):
+        m.decode(data)
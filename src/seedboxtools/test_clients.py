@@ -0,0 +1,431 @@
+import os
+
+import pytest
+
+import seedboxtools.clients as m
+import seedboxtools.util as util
+
+
+def local_getssh(cmdline, inp=None):
+    return util.getstdout(["sh", "-c", util.quote_cmdline(cmdline)], inp)
+
+
+def test_remote_stat_many(tmp_path):
+    f = tmp_path / "it's a file"
+    f.write_bytes(b"x" * 10)
+    stats = m.remote_stat_many(
+        local_getssh, [str(f), str(tmp_path / "missing"), str(tmp_path)]
+    )
+    assert stats[0] == m.RemoteStat(True, 10, int(os.path.getmtime(f)))
+    assert stats[1] == m.MISSING
+    assert stats[2].exists
+
+
+def test_remote_stat_many_reports_bad_output(capsys):
+    def getssh(cmdline, inp=None):
+        return "0\t\t\n1\t-\nnonsense\n"
+
+    stats = m.remote_stat_many(getssh, ["/a", "/b"])
+    assert stats == [m.RemoteStat(True, None, None), m.MISSING]
+    assert "/a" in capsys.readouterr().err
+
+
+def test_remote_remove_many(tmp_path):
+    (tmp_path / "d" / "sub").mkdir(parents=True)
+    (tmp_path / "d" / "sub" / "x").write_bytes(b"x")
+    (tmp_path / "it's a file").write_bytes(b"x")
+    paths = [
+        str(tmp_path / "d"),
+        str(tmp_path / "it's a file"),
+        str(tmp_path / "missing"),
+        # rm refuses to remove ".".
+        str(tmp_path) + "/.",
+    ]
+    assert m.remote_remove_many(local_getssh, paths) == [True, True, True, False]
+    assert os.listdir(tmp_path) == []
+
+
+def test_transmission_rpc_session_id_and_listing():
+    import http.server
+    import json
+    import threading
+
+    calls = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.headers.get("X-Transmission-Session-Id") != "abc":
+                self.send_response(409)
+                self.send_header("X-Transmission-Session-Id", "abc")
+                self.end_headers()
+                return
+            calls.append(body)
+            args = {}
+            if body["method"] == "torrent-get":
+                args["torrents"] = [
+                    dict(id=1, name="A", hashString="a" * 40, status=6,
+                         leftUntilDone=0, downloadDir="/dl", sizeWhenDone=1,
+                         doneDate=1700000000, labels=["tv"],
+                         files=[{"name": "A/x.iso", "length": 1}]),
+                    dict(id=2, name="B", hashString="b" * 40, status=4,
+                         leftUntilDone=5, downloadDir="/dl", files=[]),
+                    dict(id=3, name="C.iso", hashString="c" * 40, status=0,
+                         leftUntilDone=0, downloadDir="/other",
+                         files=[{"name": "C.iso", "length": 1}]),
+                ]
+            out = json.dumps({"result": "success", "arguments": args}).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        c = m.TransmissionRPCClient(
+            "/tmp", "127.0.0.1:%s" % server.server_port, "/incoming"
+        )
+        assert c.get_finished_torrents() == [("C.iso", "Stopped"), ("A", "Seeding")]
+        assert c.get_file_name("A") == "A"
+        a = c.latest.by_name("A")
+        assert (a.size, a.completed, a.label) == (1, 1700000000, "tv")
+        assert c.latest.by_name("C.iso").completed is None
+        assert c.remote_path("C.iso") == "/other/C.iso"
+        c.remove_remote_download("A")
+        assert calls[-1]["method"] == "torrent-remove"
+        assert calls[-1]["arguments"] == {"ids": [1], "delete-local-data": True}
+        results = c.remove_remote_downloads(["C.iso", "nope", "A"])
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], KeyError)
+        assert calls[-1]["arguments"] == {"ids": [3, 1], "delete-local-data": True}
+    finally:
+        server.shutdown()
+
+
+def test_transmission_file_names_are_asked_once(monkeypatch):
+    rows = {"1": "foo", "2": "bar"}
+    asked = []
+
+    def getstdout(cmdline, *args):
+        if "-l" in cmdline:
+            lines = ["header"]
+            for i, name in sorted(rows.items()):
+                fields = (i, "100%", "10.0 MB", "Done", "0.0", "0.0", "0.0", "Idle")
+                lines.append(
+                    ("%6s  %4s  %9s  %-8s  %6s  %6s  %5s  %-11s " % fields).ljust(70)
+                    + name
+                )
+            return "\n".join(lines + ["totals"])
+        i = cmdline[cmdline.index("-t") + 1]
+        asked.append(i)
+        return "\n".join(["files", "header", " " * 34 + rows[i] + "/a.iso"])
+
+    monkeypatch.setattr(util, "getstdout", getstdout)
+    c = m.TransmissionClient("/tmp", "host", "/t", "/incoming", "", "tr", "u", "p")
+    assert sorted(c.get_finished_torrents()) == [("bar", "Seeding"), ("foo", "Seeding")]
+    assert sorted(c.get_finished_torrents()) == [("bar", "Seeding"), ("foo", "Seeding")]
+    assert sorted(asked) == ["1", "2"]
+    # The same id, given to another torrent.
+    rows["1"] = "baz"
+    assert sorted(c.get_finished_torrents()) == [("bar", "Seeding"), ("baz", "Seeding")]
+    assert sorted(asked) == ["1", "1", "2"]
+
+
+def test_torrentflux_reads_names_from_torrent_files(tmp_path, monkeypatch):
+    from seedboxtools.test_bencode import TORRENT
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    transfers = tmp_path / ".transfers"
+    transfers.mkdir()
+    (transfers / "-foo.torrent").write_bytes(TORRENT)
+    c = m.TorrentFluxClient(
+        "/tmp", "host", str(tmp_path), "/incoming", "", "fluxcli"
+    )
+
+    def getssh(cmdline, inp=None, encoding="utf-8"):
+        return util.getstdout(
+            ["sh", "-c", util.quote_cmdline(cmdline)], inp, encoding
+        )
+
+    c.getssh = getssh
+    assert c.get_file_name("-foo.torrent") == "foo.iso"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("remote work done for a cached torrent")
+
+    c = m.TorrentFluxClient(
+        "/tmp", "host", str(tmp_path), "/incoming", "", "fluxcli"
+    )
+    c.getssh = fail
+    assert c.get_file_name("-foo.torrent") == "foo.iso"
+
+
+def test_torrentflux_skips_unreadable_torrents(tmp_path, monkeypatch):
+    from seedboxtools.test_bencode import TORRENT
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    transfers = tmp_path / ".transfers"
+    transfers.mkdir()
+    (transfers / "-foo.torrent").write_bytes(TORRENT)
+    (transfers / "-bad.torrent").write_bytes(b"garbage")
+    # fluxcli prints two lines of header and five of totals.
+    listing = ["header"] * 2
+    listing += ["- -%s.torrent - 1.0 MB - Done" % n for n in ("bad", "foo")]
+    listing += ["totals"] * 5
+    errors = []
+    monkeypatch.setattr(util, "report_error", errors.append)
+    c = m.TorrentFluxClient(
+        "/tmp", "host", str(tmp_path), "/incoming", "", "fluxcli"
+    )
+
+    def getssh(cmdline, inp=None, encoding="utf-8"):
+        if cmdline == ["fluxcli", "transfers"]:
+            return "\n".join(listing)
+        return util.getstdout(
+            ["sh", "-c", util.quote_cmdline(cmdline)], inp, encoding
+        )
+
+    c.getssh = getssh
+    assert list(c.get_files_to_download()) == [("-foo.torrent", "Done", "foo.iso")]
+    assert any("-bad.torrent" in e for e in errors)
+    with pytest.raises(m.TemporaryMalfunction):
+        c.get_file_name("-bad.torrent")
+
+    calls = []
+
+    def listing_only(cmdline, inp=None, encoding="utf-8"):
+        calls.append(cmdline)
+        return getssh(cmdline, inp, encoding)
+
+    # The unreadable torrent is not fetched again while it stays the same.
+    c = m.TorrentFluxClient(
+        "/tmp", "host", str(tmp_path), "/incoming", "", "fluxcli"
+    )
+    c.getssh = listing_only
+    assert list(c.get_files_to_download()) == [("-foo.torrent", "Done", "foo.iso")]
+    assert calls == [["fluxcli", "transfers"]]
+    # Once it changes, it is read again.
+    (transfers / "-bad.torrent").write_bytes(TORRENT)
+    listing[2] = "- -bad.torrent - 2.0 MB - Done"
+    assert sorted(t[2] for t in c.get_files_to_download()) == ["foo.iso"] * 2
+    assert len(calls) == 3
+
+
+def rutorrent_row(path, completed=10, size=10, state="1", label=""):
+    row = [""] * 34
+    row[0], row[6], row[7], row[14], row[25] = state, completed, size, label, path
+    return row
+
+
+def test_pulsedmedia_incremental_polling():
+    c = m.PulsedMediaClient(
+        "/tmp", "host", "user", "pass", incremental_polling="yes"
+    )
+    responses = [
+        {"t": {"A": rutorrent_row("/d/a.iso"), "B": rutorrent_row("/d/b", 5)},
+         "cid": 1},
+        {"t": {"B": rutorrent_row("/d/b", state="0")}, "d": ["A"], "cid": 2},
+        {"t": {"C": rutorrent_row("/d/c")}, "cid": 3},
+    ]
+    sent = []
+
+    def _list(cid=None):
+        sent.append(cid)
+        return responses.pop(0)
+
+    c._list = _list
+    assert c.get_finished_torrents() == [("A", "Seeding")]
+    assert c.remote_path("a.iso") == "/d/a.iso"
+    assert c.get_finished_torrents() == [("B", "Done")]
+    assert c.latest.by_filename("a.iso") is None
+    assert c.remote_path("b") == "/d/b"
+    assert sorted(c.get_finished_torrents()) == [("B", "Done"), ("C", "Seeding")]
+    assert sent == [None, 1, 2]
+
+
+def test_pulsedmedia_changes_keep_polling_incremental():
+    c = m.PulsedMediaClient(
+        "/tmp", "host", "user", "pass", incremental_polling="yes"
+    )
+    a, b = rutorrent_row("/d/a.iso"), rutorrent_row("/d/b", 5)
+    responses = [
+        {"t": {"A": a, "B": b}, "cid": 1},
+        {"t": {"B": rutorrent_row("/d/b")}, "cid": 2},
+        {"t": {"C": rutorrent_row("/d/c")}, "cid": 3},
+        {"t": {}, "cid": 4},
+    ]
+    sent = []
+
+    def _list(cid=None):
+        sent.append(cid)
+        return responses.pop(0)
+
+    c._list = _list
+    assert len(c.get_finished_torrents()) == 1
+    assert len(c.get_finished_torrents()) == 2
+    assert len(c.get_finished_torrents()) == 3
+    assert len(c.get_finished_torrents()) == 3
+    assert sent == [None, 1, 2, 3]
+
+
+def test_pulsedmedia_dropped_cid():
+    c = m.PulsedMediaClient(
+        "/tmp", "host", "user", "pass", incremental_polling="yes"
+    )
+    a, b, d = rutorrent_row("/d/a.iso"), rutorrent_row("/d/b"), rutorrent_row("/d/d")
+    responses = [
+        {"t": {"A": a, "B": b, "D": d}, "cid": 1},
+        # A was deleted, and then the server forgot cid 1: the full list,
+        # told apart by the torrents it repeats unchanged.
+        {"t": {"B": b, "D": d}, "cid": 7},
+        # A delta again, that says what it deleted.
+        {"t": {}, "d": ["B"], "cid": 8},
+    ]
+    sent = []
+
+    def _list(cid=None):
+        sent.append(cid)
+        return responses.pop(0)
+
+    c._list = _list
+    assert len(c.get_finished_torrents()) == 3
+    assert sorted(c.get_finished_torrents()) == [("B", "Seeding"), ("D", "Seeding")]
+    assert c.get_finished_torrents() == [("D", "Seeding")]
+    assert sent == [None, 1, 7]
+
+
+def test_pulsedmedia_progress():
+    c = m.PulsedMediaClient("/tmp", "host", "user", "pass")
+    downloading = rutorrent_row("/d/b", 5, 10)
+    downloading[12], downloading[13] = "2048", "1024"
+    c._list = lambda cid=None: {
+        "t": {"A": rutorrent_row("/d/a.iso"), "B": downloading}
+    }
+    c.get_finished_torrents()
+    assert sorted(c.get_progress()) == [
+        m.Progress("A", 10, 10, None),
+        m.Progress("B", 5, 10, 2.0),
+    ]
+
+
+def test_snapshot_indexes():
+    snapshot = m.Snapshot(
+        [
+            m.Torrent("A", "Done", "a.iso", "/d/a.iso", 1, "a" * 40),
+            m.Torrent("B", "Seeding", "b", "/e/b", files=[("b/x", 1)]),
+        ],
+        dirs=["/e", "/d", "/e"],
+    )
+    assert len(snapshot) == 2
+    assert [t.name for t in snapshot] == ["A", "B"]
+    assert snapshot.by_id(1).name == "A"
+    assert snapshot.by_infohash("a" * 40).name == "A"
+    assert snapshot.by_name("B").path == "/e/b"
+    assert snapshot.by_filename("b").files == [("b/x", 1)]
+    assert snapshot.by_filename("c") is None
+    assert snapshot.dirs == ("/d", "/e")
+
+
+def test_get_file_list(tmp_path):
+    (tmp_path / "-t" / "sub").mkdir(parents=True)
+    (tmp_path / "-t" / "a").write_bytes(b"12")
+    (tmp_path / "-t" / "sub" / "b c").write_bytes(b"1")
+    c = m.TorrentFluxClient("/tmp", "host", "/base", str(tmp_path), "", "fluxcli")
+    c.getssh = local_getssh
+    assert sorted(c.get_file_list("-t")) == [("-t/a", 2), ("-t/sub/b c", 1)]
+
+
+def test_pulsedmedia_upload_many(tmp_path):
+    import http.server
+    import threading
+
+    calls = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            calls.append((self.path, self.client_address[1]))
+            failed = b"bad" in body.split(b"\r\n")
+            out = b"addTorrentFailed" if failed else b"addTorrentSuccess"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    good, bad = tmp_path / "good.torrent", tmp_path / "bad.torrent"
+    good.write_bytes(b"good")
+    bad.write_bytes(b"bad")
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        c = m.PulsedMediaClient("/tmp", "host", "user", "pass")
+        c.base_url = "http://127.0.0.1:%s/rutorrent" % server.server_port
+        results = c.upload_many(
+            ["magnet:?xt=1", str(good), str(tmp_path / "missing"), str(bad)]
+        )
+    finally:
+        server.shutdown()
+    assert results[0] is None and results[1] is None
+    assert isinstance(results[2], IOError)
+    assert isinstance(results[3], m.InvalidTorrent)
+    # Through addtorrent.php, for the defaults of the user, on one connection.
+    assert [path for path, _ in calls] == ["/rutorrent/php/addtorrent.php"] * 3
+    assert len(set(port for _, port in calls)) == 1
+
+
+def test_pulsedmedia_remove_remote_downloads():
+    import http.server
+    import threading
+    import xmlrpc.client
+
+    calls = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            params, method = xmlrpc.client.loads(body)
+            assert method == "system.multicall"
+            calls.append([(c["methodName"], c["params"][0]) for c in params[0]])
+            results = []
+            for call in params[0]:
+                if call["methodName"] == "d.erase" and call["params"][0] == "B":
+                    results.append({"faultCode": -501, "faultString": "no such"})
+                else:
+                    results.append([0])
+            out = xmlrpc.client.dumps((results,), methodresponse=True).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        c = m.PulsedMediaClient("/tmp", "host", "user", "pass")
+        c.base_url = "http://127.0.0.1:%s/rutorrent" % server.server_port
+        c._list = lambda cid=None: {
+            "t": {"A": rutorrent_row("/d/a.iso"), "B": rutorrent_row("/d/b")}
+        }
+        results = c.remove_remote_downloads(["b", "c", "a.iso"], c.list_torrents())
+    finally:
+        server.shutdown()
+    assert isinstance(results[0], m.TemporaryMalfunction)
+    assert isinstance(results[1], KeyError)
+    assert results[2] is None
+    assert len(calls) == 1
+    methods = ["d.custom5.set", "d.delete_tied", "d.erase"]
+    assert [name for name, _ in calls[0]] == methods * 2
+    assert [h for _, h in calls[0]] == ["B"] * 3 + ["A"] * 3
@@ -0,0 +1,49 @@
+import io
+
+import seedboxtools.config as m
+from seedboxtools.clients import TransmissionRPCClient
+
+CONFIG = """\
+[general]
+client = TransmissionRPCClient, secondbox
+local_download_dir = /tmp
+
+[TransmissionRPCClient]
+hostname = one.example.com
+incoming_dir = /downloads
+
+[secondbox]
+client = TransmissionRPCClient
+hostname = two.example.com:9092
+incoming_dir = /incoming
+"""
+
+
+def test_several_clients():
+    cfg = m.load_config(io.StringIO(CONFIG))
+    assert m.client_names(cfg) == ["TransmissionRPCClient", "secondbox"]
+    one, two = m.get_clients(cfg)
+    assert isinstance(two, TransmissionRPCClient)
+    assert (one.identity, one.incoming_dir) == ("one.example.com", "/downloads")
+    assert (two.identity, two.incoming_dir) == ("two.example.com:9092", "/incoming")
+    assert two.rpc_url == "http://two.example.com:9092/transmission/rpc"
+    assert m.get_client(cfg).identity == "one.example.com"
+
+
+def test_clients_of_the_same_seedbox():
+    cfg = m.load_config(
+        io.StringIO(
+            CONFIG.replace("two.example.com:9092", "one.example.com")
+            + "\n[third]\nclient = TransmissionRPCClient\n"
+            + "hostname = one.example.com\nincoming_dir = /third\n"
+        )
+    )
+    cfg.general.client = "TransmissionRPCClient, secondbox, third"
+    one, two, three = m.get_clients(cfg)
+    # The first one keeps the download history of the seedbox.
+    assert one.identity == "one.example.com"
+    assert two.identity == "secondbox@one.example.com"
+    assert three.identity == "third@one.example.com"
+    assert one.ssh_master.control_path != two.ssh_master.control_path
+    # Told apart from the start, not after the fact.
+    assert m.get_client(cfg, "secondbox", "secondbox").identity == two.identity
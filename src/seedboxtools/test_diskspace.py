@@ -0,0 +1,80 @@
+import pytest
+
+import seedboxtools.diskspace as m
+
+
+class FixedSpace(m.DiskSpace):
+    def __init__(self, directory, free, reserve=0):
+        m.DiskSpace.__init__(self, directory, reserve)
+        self._free = free
+
+    def free(self):
+        return self._free
+
+
+def test_local_size_counts_partial_files(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "x").write_bytes(b"1" * 10)
+    (tmp_path / ".rsync-partial" / "a").mkdir(parents=True)
+    (tmp_path / ".rsync-partial" / "a" / "y").write_bytes(b"2" * 5)
+    (tmp_path / "b").write_bytes(b"3" * 7)
+    assert m.local_size("a", str(tmp_path)) == 15
+    assert m.local_size("b", str(tmp_path)) == 7
+    assert m.local_size("c", str(tmp_path)) == 0
+
+
+def test_admit_counts_what_is_committed(tmp_path):
+    space = FixedSpace(str(tmp_path), 1000, reserve=100)
+    assert space.admit("a", 600)
+    assert space.available() == 300
+    assert not space.admit("b", 400)
+    assert space.admit("c", 300)
+    # Admitted already.
+    assert space.admit("a", 600)
+    space.release("a")
+    assert space.admit("b", 400)
+
+
+def test_admit_counts_what_is_there_already(tmp_path):
+    (tmp_path / "a").write_bytes(b"1" * 500)
+    space = FixedSpace(str(tmp_path), 100)
+    assert space.admit("a", 600)
+    assert space.available() == 0
+    # Nothing left to write.
+    assert space.admit("b", 0)
+
+
+def test_progress_gives_back_committed_space(tmp_path):
+    space = FixedSpace(str(tmp_path), 1000)
+    assert space.admit("a", 800)
+    assert space.available() == 200
+    space.progress("a", 500)
+    assert space.available() == 700
+    space.progress("gone", 500)
+    assert space.available() == 700
+
+
+def test_unknown_sizes_and_free_space(tmp_path):
+    space = FixedSpace(str(tmp_path), 100, reserve=100)
+    assert not space.admit("a", None)
+    space = FixedSpace(str(tmp_path), 101, reserve=100)
+    assert space.admit("a", None)
+    space = FixedSpace(str(tmp_path), None, reserve=100)
+    assert space.admit("b", 10 ** 12)
+    assert space.available() is None
+
+
+def test_free_and_reserve(tmp_path):
+    assert m.DiskSpace(str(tmp_path)).free() > 0
+    assert m.DiskSpace(str(tmp_path / "missing")).free() is None
+    with pytest.raises(ValueError):
+        m.DiskSpace(str(tmp_path), -1)
+
+
+def test_owners_keep_apart(tmp_path):
+    space = FixedSpace(str(tmp_path), 1000)
+    assert space.admit("a", 400, "box")
+    assert space.admit("a", 400, "otherbox")
+    assert space.available() == 200
+    space.release("a", "box")
+    assert space.available() == 600
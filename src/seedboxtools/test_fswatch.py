@@ -0,0 +1,46 @@
+import os
+import threading
+
+import pytest
+
+import seedboxtools.fswatch as m
+
+
+def make_watcher(use_inotify):
+    w = m.PathWatcher(timeout=5)
+    if not use_inotify:
+        w._inotify = None
+        w.poll_interval = 0.05
+    elif w._inotify is None:
+        pytest.skip("inotify not available")
+    return w
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_dir_appears(tmp_path, use_inotify):
+    w = make_watcher(use_inotify)
+    seen = threading.Event()
+    w.when_dir_appears(str(tmp_path / "d"), lambda p: seen.set())
+    os.mkdir(tmp_path / "d")
+    assert seen.wait(5)
+
+
+def test_plain_file_drops_registration(tmp_path):
+    w = make_watcher(True)
+    w.when_dir_appears(str(tmp_path / "f"), lambda p: None)
+    (tmp_path / "f").write_text("")
+    for _ in range(50):
+        if not w._pending:
+            break
+        threading.Event().wait(0.05)
+    assert not w._pending
+
+
+def test_cancel(tmp_path):
+    w = make_watcher(False)
+    calls = []
+    w.when_dir_appears(str(tmp_path / "d"), calls.append)
+    w.cancel(str(tmp_path / "d"))
+    os.mkdir(tmp_path / "d")
+    threading.Event().wait(0.2)
+    assert calls == []
@@ -0,0 +1,178 @@
+import pytest
+
+import seedboxtools.leecher as m
+from seedboxtools.clients import (
+    InvalidTorrent,
+    RemoteStat,
+    SeedboxClient,
+    Snapshot,
+    Torrent,
+)
+from seedboxtools.diskspace import DiskSpace
+from seedboxtools.scheduler import TransferScheduler
+from seedboxtools.state import DONE, FAILED, REMOVED, StateStore
+
+
+class FakeClient(SeedboxClient):
+    """The seedbox of every leecher and watch folder test."""
+
+    hostname = ssh_hostname = "box"
+    upload_batch_size = 10
+
+    def __init__(self, sizes, failing=(), seeding=()):
+        SeedboxClient.__init__(self, ".")
+        # filename: size on the server.
+        self.sizes = sizes
+        self.failing = failing
+        self.seeding = seeding
+        self.infohashes = {}
+        self.events = []
+        self.resumed = []
+        self.batches = []
+
+    def _list_torrents(self):
+        return Snapshot(
+            Torrent(
+                "t-%s" % f,
+                "Seeding" if f in self.seeding else "Done",
+                f,
+                "/d/%s" % f,
+                infohash=self.infohashes.get(f),
+            )
+            for f in sorted(self.sizes)
+        )
+
+    def exists_on_server_many(self, filenames, snapshot=None):
+        return dict((f, RemoteStat(True, self.sizes[f], None)) for f in filenames)
+
+    def transfer(self, filename, progress=None, resume=False, snapshot=None):
+        self.events.append(("transfer", filename))
+        if resume:
+            self.resumed.append(filename)
+        return 23 if filename in self.failing else 0
+
+    def transfer_cmdline(self, filename, resume=False, snapshot=None):
+        self.events.append(("transfer", filename))
+        status = "23" if filename in self.failing else "0"
+        return ["sh", "-c", 'mkdir "$0" && exit "$1"', filename, status]
+
+    def remove_remote_downloads(self, filenames, snapshot=None):
+        self.events.append(("remove", sorted(filenames)))
+        return [None] * len(filenames)
+
+    def upload_many(self, uploadables):
+        self.batches.append(uploadables)
+        return [
+            InvalidTorrent(u) if u.endswith("bad.torrent") else None
+            for u in uploadables
+        ]
+
+
+class FixedSpace(DiskSpace):
+    def __init__(self, free):
+        DiskSpace.__init__(self, ".")
+        self._free = free
+
+    def free(self):
+        return self._free
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return StateStore(str(tmp_path / "state.sqlite"))
+
+
+def test_failures_do_not_stop_other_items(store):
+    client = FakeClient({"a": 1, "b": 1, "c": 1}, failing=["b"])
+    retvalue = m.download(client, store=store, scheduler=TransferScheduler(2))
+    assert retvalue == 1
+    assert sorted(e[1] for e in client.events) == ["a", "b", "c"]
+    assert store.states("box") == {"a": DONE, "b": FAILED, "c": DONE}
+
+
+def test_removals_go_in_one_batch_at_the_end(store):
+    client = FakeClient(
+        {"a": 1, "b": 1, "c": 1, "old": 1, "seeded": 1},
+        failing=["b"],
+        seeding=["seeded"],
+    )
+    store.finished("box", "t-old", "old", True)
+    retvalue = m.download(client, remove_finished=True, store=store)
+    assert retvalue == 1
+    assert client.events[-1] == ("remove", ["a", "c", "old"])
+    assert [e for e in client.events if e[0] == "remove"] == [client.events[-1]]
+    assert store.states("box") == {
+        "a": REMOVED,
+        "b": FAILED,
+        "c": REMOVED,
+        "old": REMOVED,
+        "seeded": DONE,
+    }
+
+
+def test_items_that_do_not_fit_are_held_back(store):
+    client = FakeClient({"big": 800, "small": 300, "tiny": 100})
+    space = FixedSpace(500)
+    assert m.download(client, store=store, space=space) == 0
+    assert [e[1] for e in client.events] == ["small", "tiny"]
+    assert "big" not in store.states("box")
+    # Nothing stays committed once the cycle is over.
+    assert space.available() == 500
+
+
+def test_torrents_added_again_are_downloaded_again(store):
+    client = FakeClient({"a": 1, "b": 1})
+    client.infohashes = {"a": "AAAA", "b": "BBBB"}
+    assert m.download(client, store=store) == 0
+    client.infohashes["b"] = "CCCC"
+    client.events = []
+    assert m.download(client, store=store) == 0
+    assert client.events == [("transfer", "b")]
+    assert store.torrent_ids("box") == {"a": "aaaa", "b": "cccc"}
+
+
+def test_torrents_added_again_are_not_resumed(store):
+    client = FakeClient({"a": 1, "b": 1})
+    client.infohashes = {"a": "AAAA", "b": "BBBB"}
+    # b was the download of another torrent of the same name.
+    for filename, torrent_id in (("a", "aaaa"), ("b", "old")):
+        store.queued("box", "t-" + filename, filename, torrent_id=torrent_id)
+        store.transferring("box", "t-" + filename, filename)
+        store.finished("box", "t-" + filename, filename, False, returncode=20)
+    assert m.download(client, store=store) == 0
+    assert client.resumed == ["a"]
+
+
+def test_connection_failures_are_guarded(store):
+    from seedboxtools.clients import TemporaryMalfunction
+
+    class Unreachable(FakeClient):
+        def ensure_connected(self):
+            raise TemporaryMalfunction("cannot connect")
+
+    broken, working = Unreachable({"a": 1}), FakeClient({"b": 1})
+    broken.hostname = "broken"
+    results = m.run_all([broken, working], lambda c: m.do_guarded(c, store=store))
+    assert results == 0
+    assert store.states("broken") == {}
+    assert store.states("box") == {"b": DONE}
+
+
+def test_progress_metrics_are_per_client():
+    from seedboxtools import metrics
+    from seedboxtools.util import RsyncProgress
+
+    client = FakeClient({})
+    a, b = m.TransferMonitor(client, "a"), m.TransferMonitor(client, "b")
+    a(RsyncProgress(100, 10, 10.0, 90))
+    b(RsyncProgress(50, 50, 5.0, 10))
+    assert metrics.TRANSFER_DONE_BYTES.labels("box").value == 150
+    assert metrics.TRANSFER_RATE.labels("box").value == 15.0
+    assert metrics.TRANSFER_ETA.labels("box").value == 90
+    a.close()
+    assert metrics.TRANSFER_DONE_BYTES.labels("box").value == 50
+    assert metrics.TRANSFER_ETA.labels("box").value == 10
+    b.close()
+    assert metrics.TRANSFER_DONE_BYTES.labels("box").value == 0
+    assert len(metrics.TRANSFER_ETA.render()) == 2
@@ -0,0 +1,53 @@
+import urllib.request
+
+import seedboxtools.metrics as m
+
+
+def test_render():
+    registry = m.Registry()
+    c = m.Counter("c_total", "A counter.", ["client", "result"], registry=registry)
+    g = m.Gauge("g", "A gauge.", registry=registry)
+    h = m.Histogram("h_seconds", "A histogram.", buckets=(1, 10), registry=registry)
+    c.labels("box", "ok").inc()
+    c.labels("box", "ok").inc(2)
+    c.labels('say "hi"', "failed").inc()
+    g.set(5)
+    g.dec()
+    h.observe(0.5)
+    h.observe(5)
+    h.observe(50)
+    assert registry.render().splitlines() == [
+        "# HELP c_total A counter.",
+        "# TYPE c_total counter",
+        'c_total{client="box",result="ok"} 3',
+        'c_total{client="say \\"hi\\"",result="failed"} 1',
+        "# HELP g A gauge.",
+        "# TYPE g gauge",
+        "g 4",
+        "# HELP h_seconds A histogram.",
+        "# TYPE h_seconds histogram",
+        'h_seconds_bucket{le="1"} 1',
+        'h_seconds_bucket{le="10"} 2',
+        'h_seconds_bucket{le="+Inf"} 3',
+        "h_seconds_sum 55.5",
+        "h_seconds_count 3",
+    ]
+
+
+def test_serve_and_textfile(tmp_path):
+    registry = m.Registry()
+    m.Gauge("g", "A gauge.", registry=registry).set(1)
+    server = m.serve(0, registry=registry)
+    try:
+        url = "http://127.0.0.1:%s/metrics" % server.server_address[1]
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode("utf-8") == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    path = str(tmp_path / "leechtorrents.prom")
+    writer = m.TextfileWriter(path, interval=3600, registry=registry)
+    writer.close()
+    with open(path) as f:
+        assert f.read() == registry.render()
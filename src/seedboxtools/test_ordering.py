@@ -0,0 +1,52 @@
+import pytest
+
+import seedboxtools.ordering as m
+from seedboxtools.clients import Snapshot, Torrent
+
+SNAPSHOT = Snapshot(
+    [
+        Torrent("a", "Done", "a", "/a", size=300, completed=1000, label="tv"),
+        Torrent("b", "Done", "b", "/b", size=100, completed=3000),
+        Torrent("c", "Done", "c", "/c", completed=2000, label="movies"),
+        Torrent("d", "Done", "d", "/d", size=200, label="movies"),
+    ]
+)
+DOWNLOADS = [(t.name, False, t.filename, None) for t in SNAPSHOT]
+
+
+def names(ordering, now=5000):
+    return [d[0] for d in ordering.order(DOWNLOADS, SNAPSHOT, now=now)]
+
+
+def test_policies():
+    assert names(m.Ordering()) == ["a", "b", "c", "d"]
+    assert names(m.Ordering("smallest")) == ["b", "d", "a", "c"]
+    # d was first seen finished now.
+    assert names(m.Ordering("oldest")) == ["a", "c", "b", "d"]
+    assert names(m.Ordering("label", ["movies", "tv"])) == ["d", "c", "a", "b"]
+    assert names(m.Ordering("deadline", deadline=3500)) == ["a", "b", "d", "c"]
+
+
+def test_sizes_from_the_server_win():
+    downloads = [("a", False, "a", 50)] + DOWNLOADS[1:]
+    ordering = m.Ordering("smallest")
+    assert [d[0] for d in ordering.order(downloads, SNAPSHOT)][0] == "a"
+
+
+def test_first_seen_is_remembered():
+    ordering = m.Ordering("deadline", deadline=100)
+    snapshot = Snapshot([Torrent("x", "Done", "x", "/x", size=10)])
+    big = Snapshot([Torrent("y", "Done", "y", "/y", size=1000)])
+    ordering.order([("y", False, "y", None)], big, now=0)
+    assert ordering.key(big.by_name("y"), "y", now=50) > ordering.key(
+        snapshot.by_name("x"), "x", now=50
+    )
+    # Past its deadline, the big one goes first.
+    assert ordering.key(big.by_name("y"), "y", now=150) < ordering.key(
+        snapshot.by_name("x"), "x", now=150
+    )
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        m.Ordering("random")
@@ -0,0 +1,25 @@
+import seedboxtools.pacing as m
+from seedboxtools.clients import Progress
+
+
+def test_backs_off_while_nothing_changes():
+    p = m.AdaptivePacer(10, 100, initial=30)
+    idle = [Progress("a", 1, 1, None)]
+    assert p.next_interval(idle) == 30
+    assert p.next_interval(idle) == 60
+    assert p.next_interval(idle) == 100
+    assert p.next_interval(idle) == 100
+    # Something new finished: poll soon.
+    assert p.next_interval(idle + [Progress("b", 1, 1, None)]) == 10
+    assert p.next_interval(None) == 10
+
+
+def test_polls_when_a_torrent_should_finish():
+    p = m.AdaptivePacer(10, 1000, initial=500)
+    assert p.next_interval([Progress("a", 50, 100, 1.0)]) == 50
+    # Without a rate, the rate is worked out from the previous poll.
+    p = m.AdaptivePacer(10, 1000, initial=500)
+    assert p.next_interval([Progress("a", 20, 100, None)], now=0) == 500
+    assert p.next_interval([Progress("a", 40, 100, None)], now=100) == 300
+    # Never more often than the minimum.
+    assert p.next_interval([Progress("a", 99, 100, None)], now=200) == 10
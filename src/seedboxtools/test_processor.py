@@ -0,0 +1,66 @@
+import os
+import time
+
+import seedboxtools.processor as m
+from seedboxtools import state
+from seedboxtools.state import StateStore
+
+
+def write_program(tmp_path, text):
+    path = tmp_path / "program"
+    path.write_text("#!/bin/sh\n" + text)
+    os.chmod(path, 0o755)
+    return str(path)
+
+
+def jobs(store):
+    return dict(
+        (r["filename"], (r["state"], r["attempts"], r["returncode"], r["output"]))
+        for r in store._db.execute("SELECT * FROM jobs").fetchall()
+    )
+
+
+def test_runs_jobs_and_retries_failures(tmp_path):
+    program = write_program(tmp_path, 'echo "got $1"\n[ "$1" != bad ]\n')
+    store = StateStore(str(tmp_path / "state.sqlite"))
+    q = m.ProcessorQueue(store, workers=2, retries=1, retry_delay=0.1)
+    q.submit(program, "good")
+    q.submit(program, "bad")
+    assert q.drain(10)
+    q.close()
+    assert jobs(store) == {
+        "good": (state.DONE, 1, 0, "got good\n"),
+        "bad": (state.FAILED, 2, 1, "got bad\n"),
+    }
+
+
+def test_timeout(tmp_path):
+    program = write_program(tmp_path, "exec sleep 10\n")
+    store = StateStore(str(tmp_path / "state.sqlite"))
+    q = m.ProcessorQueue(store, timeout=0.2)
+    start = time.time()
+    q.submit(program, "slow")
+    assert q.drain(5)
+    q.close()
+    assert time.time() - start < 5
+    assert jobs(store)["slow"][0] == state.FAILED
+
+
+def test_jobs_survive_close(tmp_path):
+    program = write_program(tmp_path, 'touch "$0.$1"; exec sleep 10\n')
+    store = StateStore(str(tmp_path / "state.sqlite"))
+    q = m.ProcessorQueue(store)
+    q.submit(program, "a")
+    q.submit(program, "b")
+    while not os.path.exists(program + ".a"):
+        time.sleep(0.01)
+    q.close()
+    assert jobs(store)["a"][:2] == (state.PENDING, 0)
+    assert jobs(store)["b"][:2] == (state.PENDING, 0)
+
+    program = write_program(tmp_path, "true\n")
+    q = m.ProcessorQueue(store, workers=2)
+    assert q.drain(10)
+    q.close()
+    assert jobs(store)["a"][:2] == (state.DONE, 1)
+    assert jobs(store)["b"][:2] == (state.DONE, 1)
@@ -0,0 +1,52 @@
+import os
+import queue
+import subprocess
+import time
+
+import seedboxtools.remotewatch as m
+import seedboxtools.util as util
+
+
+class LocalClient:
+    """Runs the watch script locally instead of over SSH."""
+
+    def popenssh(self, cmdline, **kwargs):
+        return subprocess.Popen(["sh", "-c", util.quote_cmdline(cmdline)], **kwargs)
+
+
+def watch(dirs, interval=0.2):
+    names = queue.Queue()
+    w = m.RemoteWatcher(LocalClient(), names.put, interval)
+    w.settle = 0.1
+    w.watch(dirs)
+    return w, names
+
+
+def test_stat_loop_reports_settled_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", "/usr/bin:/bin")
+    w, names = watch([str(tmp_path) + "/"])
+    try:
+        # Changes before the script starts go unnoticed.
+        time.sleep(0.5)
+        (tmp_path / "d").mkdir()
+        (tmp_path / "d" / "f").write_text("data")
+        assert names.get(timeout=10) == ["d"]
+    finally:
+        w.stop()
+
+
+def test_inotifywait_events(tmp_path, monkeypatch):
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    shim = bindir / "inotifywait"
+    # Reports a file written in a subdirectory of the last argument.
+    shim.write_text(
+        '#!/bin/sh\nfor d ; do : ; done\necho "done $d/sub/file"\nexec sleep 60\n'
+    )
+    os.chmod(shim, 0o755)
+    monkeypatch.setenv("PATH", "%s:/usr/bin:/bin" % bindir)
+    w, names = watch([str(tmp_path / "other"), str(tmp_path)])
+    try:
+        assert names.get(timeout=10) == ["sub"]
+    finally:
+        w.stop()
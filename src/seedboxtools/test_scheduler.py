@@ -0,0 +1,72 @@
+import threading
+import time
+
+from seedboxtools.scheduler import TransferScheduler
+
+
+def test_failures_do_not_stop_other_jobs():
+    s = TransferScheduler(workers=3)
+    b = s.batch()
+
+    def job(n):
+        if n == 2:
+            raise ValueError(n)
+        return n * 10
+
+    for n in range(5):
+        b.submit("host", n, job, n)
+    jobs = dict((j.key, j) for j in b.as_completed())
+    assert sorted(jobs) == [0, 1, 2, 3, 4]
+    assert isinstance(jobs[2].exception, ValueError)
+    assert [jobs[n].result for n in (0, 1, 3, 4)] == [0, 10, 30, 40]
+
+
+def test_per_host_cap():
+    s = TransferScheduler(workers=4, per_host=1)
+    b = s.batch()
+    lock = threading.Lock()
+    peak = {"a": 0, "b": 0}
+    current = {"a": 0, "b": 0}
+
+    def job(host):
+        with lock:
+            current[host] += 1
+            peak[host] = max(peak[host], current[host])
+        time.sleep(0.02)
+        with lock:
+            current[host] -= 1
+
+    for n in range(6):
+        b.submit("a" if n % 2 else "b", n, job, "a" if n % 2 else "b")
+    assert len(list(b.as_completed())) == 6
+    assert peak == {"a": 1, "b": 1}
+
+
+def test_batches_only_see_their_jobs():
+    s = TransferScheduler(workers=2)
+    b1, b2 = s.batch(), s.batch()
+    b1.submit("h", "one", lambda: 1)
+    b2.submit("h", "two", lambda: 2)
+    assert [j.key for j in b1.as_completed()] == ["one"]
+    assert [j.key for j in b2.as_completed()] == ["two"]
+
+
+def test_hosts_share_workers_fairly():
+    s = TransferScheduler(workers=2)
+    b = s.batch()
+    started = []
+    gate = threading.Event()
+
+    def job(name):
+        started.append(name)
+        if name == "a1":
+            gate.set()
+
+    # Nothing starts until every job is queued.
+    with s._cond:
+        b.submit("a", "blocker", gate.wait, 5)
+        for name in ["a0", "a1", "b0", "b1"]:
+            b.submit(name[0], name, job, name)
+    assert len(list(b.as_completed())) == 5
+    # Host a already has a job running, so b goes first.
+    assert started == ["b0", "b1", "a0", "a1"]
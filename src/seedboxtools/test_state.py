@@ -0,0 +1,100 @@
+import seedboxtools.state as m
+
+
+def test_lifecycle(tmp_path):
+    s = m.StateStore(str(tmp_path / "state.sqlite"))
+    s.queued("box", "t1", "f1", 100)
+    assert not s.interrupted("box", "f1")
+    s.transferring("box", "t1", "f1")
+    s.finished("box", "t1", "f1", False, returncode=23)
+    s.queued("box", "t1", "f1", 100)
+    assert not s.interrupted("box", "f1")
+    s.transferring("box", "t1", "f1")
+    s.finished("box", "t1", "f1", False, returncode=20)
+    s.queued("box", "t1", "f1", 100)
+    assert s.interrupted("box", "f1")
+    s.transferring("box", "t1", "f1")
+    # As if the leecher died during the transfer.
+    s.queued("box", "t1", "f1", 100)
+    assert s.interrupted("box", "f1")
+    s.transferring("box", "t1", "f1")
+    s.finished("box", "t1", "f1", True)
+    assert not s.interrupted("box", "f1")
+    row = s.get("box", "f1")
+    assert row["state"] == m.DONE
+    assert row["attempts"] == 4
+    assert row["bytes"] == 100
+    assert row["duration"] >= 0
+    assert s.is_done("box", "f1")
+    assert not s.is_done("otherbox", "f1")
+    s.removed("box", "t1", "f1")
+    assert s.states("box") == {"f1": m.REMOVED}
+    s.queued("box", "t1", "f1", 100)
+    assert not s.interrupted("box", "f1")
+
+
+def test_migrate_markers_once(tmp_path):
+    (tmp_path / ".a.iso.done").write_text("Done")
+    (tmp_path / ".b dir.done").write_text("Done")
+    (tmp_path / "c.iso").write_text("")
+    s = m.StateStore(str(tmp_path / "state.sqlite"))
+    assert s.migrate_markers("box", str(tmp_path)) == 2
+    assert s.states("box") == {"a.iso": m.DONE, "b dir": m.DONE}
+    (tmp_path / ".d.done").write_text("Done")
+    assert s.migrate_markers("box", str(tmp_path)) == 0
+
+
+def test_markers_go_to_one_client(tmp_path):
+    (tmp_path / ".a.iso.done").write_text("Done")
+    s = m.StateStore(str(tmp_path / "state.sqlite"))
+    assert s.markers_owner() is None
+    assert s.migrate_markers("box", str(tmp_path)) == 1
+    assert s.migrate_markers("otherbox", str(tmp_path)) == 0
+    assert s.states("otherbox") == {}
+    assert s.markers_owner() == "box"
+
+
+def test_unqueued_puts_back_the_state(tmp_path):
+    s = m.StateStore(str(tmp_path / "state.sqlite"))
+    assert s.queued("box", "t1", "f1", 100, torrent_id="abc") is None
+    s.finished("box", "t1", "f1", False)
+    assert s.queued("box", "t1", "f1", 100) == m.FAILED
+    s.unqueued("box", "f1", m.FAILED)
+    assert s.states("box") == {"f1": m.FAILED}
+    assert s.torrent_ids("box") == {"f1": "abc"}
+    assert s.queued("box", "t2", "f2") is None
+    s.unqueued("box", "f2", None)
+    assert s.states("box") == {"f1": m.FAILED}
+    # Not once the transfer started.
+    s.queued("box", "t2", "f2")
+    s.transferring("box", "t2", "f2")
+    s.unqueued("box", "f2", None)
+    assert s.states("box")["f2"] == m.TRANSFERRING
+
+
+def test_torrent_id_added_to_old_databases(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "state.sqlite")
+    db = sqlite3.connect(path)
+    schema = m.SCHEMA.replace("    torrent_id TEXT,\n", "")
+    db.executescript(schema.replace("    returncode INTEGER,\n", "", 1))
+    db.close()
+    s = m.StateStore(path)
+    s.queued("box", "t1", "f1", torrent_id="abc")
+    assert s.torrent_ids("box") == {"f1": "abc"}
+    s.transferring("box", "t1", "f1")
+    s.finished("box", "t1", "f1", False, returncode=20)
+    assert s.interrupted("box", "f1")
+
+
+def test_another_torrent_of_the_same_name_starts_afresh(tmp_path):
+    s = m.StateStore(str(tmp_path / "state.sqlite"))
+    s.queued("box", "t1", "f1", torrent_id="abc")
+    s.transferring("box", "t1", "f1")
+    s.finished("box", "t1", "f1", False, returncode=20)
+    s.queued("box", "t1", "f1", torrent_id="abc")
+    assert s.interrupted("box", "f1")
+    s.queued("box", "t2", "f1", torrent_id="def")
+    assert not s.interrupted("box", "f1")
+    assert s.get("box", "f1")["attempts"] == 0
@@ -4,3 +4,77 @@ def test_which():
    # Should be true on most Unices.
    assert m.which("true").endswith("true")
    assert m.which("narostnaironstio") == None
+
+def test_split_shards():
+   files = [("a", 50), ("b", 40), ("c", 30), ("d", 20), ("e", 10)]
+   shards = m.split_shards(files, 2)
+   sizes = dict(files)
+   assert sorted(sum(sizes[f] for f in s) for s in shards) == [70, 80]
+   assert sorted(f for s in shards for f in s) == ["a", "b", "c", "d", "e"]
+   assert m.split_shards(files[:1], 4) == [["a"]]
+
+def test_rsync_sharded_reports_failures(monkeypatch):
+   calls = []
+   def fake_rsync(source, destination, rsh=None, extra_opts=(), progress=None, resume=False):
+      listfile = extra_opts[1].split("=", 1)[1]
+      paths = open(listfile, "rb").read().split(b"\0")[:-1]
+      calls.append(paths)
+      return 23 if b"t/bad" in paths else 0
+   monkeypatch.setattr(m, "rsync", fake_rsync)
+   files = [("t/ok1", 1), ("t/ok2", 1), ("t/bad", 1)]
+   assert m.rsync_sharded("h:/in/", files, "/tmp", 3) == 23
+   assert sorted(calls) == [[b"t/bad"], [b"t/ok1"], [b"t/ok2"]]
+   assert m.rsync_sharded("h:/in/", files[:2], "/tmp", 3) == 0
+
+def test_rsync_cmdline_resume():
+   fresh = m.rsync_cmdline("h:/in/a", "/tmp")
+   resumed = m.rsync_cmdline("h:/in/a", "/tmp", resume=True)
+   assert "--whole-file" in fresh and "--append-verify" not in fresh
+   assert "--append-verify" in resumed and "--whole-file" not in resumed
+   assert "--partial-dir=.rsync-partial" in fresh and resumed[-2:] == ["h:/in/a", "/tmp"]
+
+def test_parse_rsync_progress():
+   p = m.parse_rsync_progress("    153,092,096  42%   12.34MB/s    0:00:17  ")
+   assert p == m.RsyncProgress(153092096, 42, 12.34 * 1024 * 1024, 17)
+   p = m.parse_rsync_progress("  1,024 100%  1.00kB/s  1:02:03 (xfr#1, to-chk=0/2)")
+   assert p == m.RsyncProgress(1024, 100, 1024.0, None)
+   assert m.parse_rsync_progress("Linux-ISO/disc 1.iso") is None
+   assert m.parse_rsync_progress("sent 1,234 bytes  received 35 bytes") is None
+
+def test_rsync_output(capsys):
+   updates = []
+   output = m.RsyncOutput(updates.append)
+   output.feed(b"receiving file list ...\ndone\nt/a\n\r      512  50%  1.00kB/s")
+   output.feed(b"    0:00:01\r      1,024 100%  1.00kB/s    0:00:01 (xfr#1, to-chk=0/1)\n")
+   output.feed(b"sent 10 bytes")
+   output.close()
+   assert updates == [
+      m.RsyncProgress(512, 50, 1024.0, 1),
+      m.RsyncProgress(1024, 100, 1024.0, None),
+   ]
+   assert capsys.readouterr().out.splitlines() == [
+      "receiving file list ...",
+      "done",
+      "t/a",
+      "sent 10 bytes",
+   ]
+
+def test_rsync_sharded_progress(monkeypatch):
+   def fake_rsync(source, destination, rsh=None, extra_opts=(), progress=None, resume=False):
+      progress(m.RsyncProgress(100, 50, 10.0, 10))
+      return 0
+   monkeypatch.setattr(m, "rsync", fake_rsync)
+   updates = []
+   files = [("t/a", 200), ("t/b", 200)]
+   assert m.rsync_sharded("h:/in/", files, "/tmp", 2, progress=updates.append) == 0
+   assert updates[-1] == m.RsyncProgress(200, 50, 20.0, 10)
+
+def test_parse_size():
+   assert m.parse_size("1.5 KB") == 1536
+   assert m.parse_size("2 GB") == 2 * 1024 ** 3
+   assert m.parse_size("10 kB") == 10240
+   assert m.parse_size("10G") == 10 * 1024 ** 3
+   assert m.parse_size("4096") == 4096
+   assert m.parse_size("None") is None
+   assert m.parse_size("1.2.3 MB") is None
+   assert m.parse_size("1.5 parsecs") is None
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+import seedboxtools.watchfolder as m
+from seedboxtools.test_leecher import FakeClient
+
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_submits_and_moves_files(tmp_path, use_inotify):
+    (tmp_path / "old.torrent").write_bytes(b"old")
+    client = FakeClient({})
+    w = m.WatchFolder(client, [str(tmp_path)])
+    if not use_inotify:
+        w._inotify = None
+        w.poll_interval = 0.05
+    elif w._inotify is None:
+        pytest.skip("inotify not available")
+    w.settle = 0.1
+    t = threading.Thread(target=w.run)
+    t.start()
+    try:
+        assert wait_for(lambda: (tmp_path / "done" / "old.torrent").exists())
+        with open(tmp_path / "slow.torrent", "wb") as f:
+            f.write(b"part")
+            f.flush()
+            time.sleep(0.5)
+            if use_inotify:
+                # Polling only sees that it stopped changing.
+                assert (tmp_path / "slow.torrent").exists()
+            f.write(b"rest")
+        (tmp_path / "bad.torrent").write_bytes(b"bad")
+        (tmp_path / "link.magnet").write_text("magnet:?xt=1\n")
+        (tmp_path / "notes.txt").write_text("")
+        assert wait_for(lambda: (tmp_path / "done" / "slow.torrent").exists())
+        assert wait_for(lambda: (tmp_path / "done" / "link.magnet").exists())
+        assert wait_for(lambda: (tmp_path / "error" / "bad.torrent").exists())
+    finally:
+        w.stop()
+        t.join()
+    assert (tmp_path / "notes.txt").exists()
+    uploaded = sorted(u.rsplit("/", 1)[-1] for b in client.batches for u in b)
+    assert uploaded == ["bad.torrent", "magnet:?xt=1", "old.torrent", "slow.torrent"]
+
+
+def test_every_path_is_released(tmp_path):
+    class ShortClient(FakeClient):
+        def upload_many(self, uploadables):
+            return FakeClient.upload_many(self, uploadables)[:1]
+
+    def report(uploadable, error):
+        if uploadable.endswith("b.torrent"):
+            raise OSError("cannot report")
+
+    paths = [str(tmp_path / n) for n in ("a.torrent", "b.torrent", "c.torrent")]
+    for path in paths:
+        open(path, "wb").close()
+    w = m.WatchFolder(ShortClient({}), [str(tmp_path)], report=report)
+    if w._inotify is not None:
+        w._inotify.close()
+    w._busy.update(paths)
+    w._submit(paths)
+    assert w._busy == set()
+    assert (tmp_path / "done" / "a.torrent").exists()
+    # No result for it: an error.
+    assert (tmp_path / "error" / "c.torrent").exists()
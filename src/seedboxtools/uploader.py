@@ -1,11 +1,34 @@
 from seedboxtools import cli, config, util
+from seedboxtools.clients import is_magnet_link
+from seedboxtools.watchfolder import WatchFolder
 from requests.exceptions import ConnectionError
+from concurrent.futures import ThreadPoolExecutor
 import os
+import signal
 import sys
+import time
+
+def report_result(uploadable, error):
+    if error is None:
+        name = uploadable if is_magnet_link(uploadable) else os.path.basename(uploadable)
+        util.report_message("%s submitted to seedbox" % name)
+        return
+    extramessage = ""
+    if isinstance(error, ConnectionError):
+        if getattr(error.args[0], "errno", None) == -2:
+            extramessage = "\nCheck the hostname in your seedboxtools configuration."
+    util.report_error("error while uploading %s: %s%s" % (uploadable, error, extramessage))
 
 def main():
     parser = cli.get_uploader_parser()
     args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("option --jobs must be a positive integer")
+    if not args.torrents and not args.watch:
+        parser.error("give at least one TORRENT, or a directory to --watch")
+    for d in args.watch:
+        if not os.path.isdir(d):
+            parser.error("%s is not a directory" % d)
 
     # check config availability and load configuration
     try:
@@ -16,38 +39,42 @@ def main():
     cfg = config.load_config(config_fobject)
     client = config.get_client(cfg)
 
-    # separate the wheat from the chaff
-    # and when I say 'wheat' and 'chaff', I mean 'torrent files' and 'magnet links'
-    is_magnet = lambda _: _.startswith("magnet:")
-    is_torrent = lambda _: not is_magnet(_)
+    # give all the torrents/magnets to the client, as many at a time as it
+    # takes in a single request, and several requests at the same time
+    size = client.upload_batch_size
+    batches = [args.torrents[n:n + size] for n in range(0, len(args.torrents), size)]
+    start = time.time()
+    failed = 0
+    with ThreadPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(client.upload_many, batch) for batch in batches]
+        for batch, future in zip(batches, futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [e] * len(batch)
+            for uploadable, error in zip(batch, results):
+                if error is not None:
+                    if args.debug:
+                        raise error
+                    failed += 1
+                report_result(uploadable, error)
 
-    # give all the torrents/magnets to the client
-    failed = False
-    for uploadable in args.torrents:
-        try:
-            if type(uploadable) is str:
-                try:
-                    uploadable = uploadable.decode(sys.getfilesystemencoding())
-                except AttributeError:
-                    pass
-            if is_magnet(uploadable):
-                client.upload_magnet_link(uploadable)
-                util.report_message("%s submitted to seedbox" % uploadable)
-            elif is_torrent(uploadable):
-                client.upload_torrent(uploadable)
-                util.report_message("%s submitted to seedbox" % os.path.basename(uploadable))
-            else:
-                raise ValueError("%s is not a torrent or a magnet link" % uploadable)
-        except Exception as e:
-            if args.debug:
-                raise
-            extramessage = ""
-            if isinstance(e, ConnectionError):
-                if e.args[0].errno == -2:
-                    extramessage = "\nCheck the hostname in your seedboxtools configuration."
-            util.report_error("error while uploading %s: %s%s" % (uploadable, e, extramessage))
-            failed = True
+    if args.torrents:
+        util.report_message(
+            "%s of %s torrent(s) submitted in %.1f seconds"
+            % (len(args.torrents) - failed, len(args.torrents), time.time() - start)
+        )
 
+    if args.watch:
+        try:
+            watcher = WatchFolder(client, args.watch, jobs=args.jobs, report=report_result)
+        except OSError as e:
+            util.report_error("Cannot watch %s: %s" % (", ".join(args.watch), e))
+            return 4
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: watcher.stop())
+        util.report_message("Watching %s for torrents" % ", ".join(args.watch))
+        watcher.run()
     if failed:
         return 4
     else:
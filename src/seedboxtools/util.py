@@ -7,20 +7,28 @@ from subprocess import Popen, PIPE, STDOUT, call, check_call
 import os
 import sys
 import fcntl
-from threading import Thread
-import time
+import hashlib
+import heapq
+import re
+import tempfile
+from collections import namedtuple
+from threading import Lock, Thread
+
+from seedboxtools import fswatch
 
 
 def shell_quote(shellarg):
     return "'%s'" % shellarg.replace("'", r"'\''")
 
 
-def getstdout(cmdline):
-    p = Popen(cmdline, stdout=PIPE)
-    output = p.communicate()[0].decode("utf-8")
+def getstdout(cmdline, inp=None, encoding="utf-8"):
+    """Returns the standard output of cmdline, decoded unless encoding is
+    None."""
+    p = Popen(cmdline, stdin=PIPE if inp is not None else None, stdout=PIPE)
+    output = p.communicate(inp)[0]
     if p.returncode != 0:
         raise Exception("Command %s return code %s" % (cmdline, p.returncode))
-    return output
+    return output.decode(encoding) if encoding else output
 
 
 def getstdoutstderr(
@@ -37,10 +45,198 @@ def passthru(cmdline: list[str]) -> int:
     return call(cmdline)  # return status code, pass the outputs thru
 
 
-def rsync(source: str, destination: str) -> int:
-    RSYNC_OPTS = ["-rtlDvzP", "--chmod=go+rX", "--chmod=u+rwX", "--executability"]
-    cmdline = ["rsync"] + RSYNC_OPTS + ["--", source, destination]
-    return passthru(cmdline)
+# Where rsync keeps what it got of a file when it is interrupted, in the
+# directory the file goes to.
+RSYNC_PARTIAL_DIR = ".rsync-partial"
+
+
+def rsync_cmdline(
+    source: str, destination: str, rsh=None, extra_opts=(), resume=False
+) -> list:
+    """
+    Returns the rsync command line that downloads source to destination.
+    With resume, rsync appends to whatever an interrupted download of the
+    same source left, checking that it matches; without it, rsync assumes
+    there is nothing to reuse and sends files whole, without working out
+    deltas.
+    """
+    RSYNC_OPTS = [
+        "-rtlDvz",
+        "--partial-dir=%s" % RSYNC_PARTIAL_DIR,
+        "--info=progress2",
+        "--chmod=go+rX",
+        "--chmod=u+rwX",
+        "--executability",
+    ]
+    RSYNC_OPTS.append("--append-verify" if resume else "--whole-file")
+    cmdline = ["rsync"] + RSYNC_OPTS + list(extra_opts)
+    if rsh:
+        cmdline += ["-e", quote_cmdline(rsh)]
+    cmdline += ["--", source, destination]
+    return cmdline
+
+
+# bytes done, percentage done, bytes per second, and seconds left (None
+# when rsync does not say).
+RsyncProgress = namedtuple("RsyncProgress", "bytes percent rate eta")
+
+_RSYNC_PROGRESS = re.compile(
+    r"^\s*([\d,.']+)\s+(\d+)%\s+([\d.,]+)([kMGT]?B)/s\s+(\d+):(\d+):(\d+)(.*)$"
+)
+_RSYNC_UNITS = {"B": 1, "kB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+
+
+def parse_rsync_progress(line):
+    """
+    Returns the RsyncProgress in a line of rsync --info=progress2 output,
+    or None if the line is something else.
+    """
+    m = _RSYNC_PROGRESS.match(line)
+    if m is None:
+        return None
+    nbytes, percent, rate, unit, hours, minutes, seconds, rest = m.groups()
+    rate = float(rate.replace(",", ".")) * _RSYNC_UNITS[unit]
+    eta = None
+    if "xfr#" not in rest:
+        # After a file is done, rsync shows the time so far instead.
+        eta = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+    return RsyncProgress(int(re.sub(r"\D", "", nbytes)), int(percent), rate, eta)
+
+
+class RsyncOutput:
+    """
+    Takes the output of rsync --info=progress2 as it arrives, and passes
+    progress updates to progress(RsyncProgress) and every other line to
+    standard output, so logs get the names of the files but none of the
+    updates rsync keeps rewriting in place.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self._buf = b""
+
+    def feed(self, data):
+        lines = re.split(b"[\r\n]", self._buf + data)
+        self._buf = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def close(self):
+        if self._buf:
+            self._line(self._buf)
+            self._buf = b""
+
+    def _line(self, line):
+        text = line.decode("utf-8", "replace")
+        if not text.strip():
+            return
+        update = parse_rsync_progress(text)
+        if update is not None:
+            self.progress(update)
+            return
+        with _report_lock:
+            sys.stdout.write(text + "\n")
+            sys.stdout.flush()
+
+
+def run_rsync(cmdline, progress=None):
+    """
+    Runs the rsync of cmdline, passing its progress to progress(RsyncProgress)
+    if given, or its whole output through if not.  Returns its status.
+    """
+    if progress is None:
+        return passthru(cmdline)
+    p = Popen(cmdline, stdout=PIPE)
+    output = RsyncOutput(progress)
+    try:
+        while True:
+            data = os.read(p.stdout.fileno(), 65536)
+            if not data:
+                break
+            output.feed(data)
+        output.close()
+    finally:
+        p.stdout.close()
+    return p.wait()
+
+
+def rsync(
+    source: str, destination: str, rsh=None, extra_opts=(), progress=None, resume=False
+) -> int:
+    return run_rsync(
+        rsync_cmdline(source, destination, rsh, extra_opts, resume), progress
+    )
+
+
+def split_shards(files, shards):
+    """
+    Splits a list of (path, size) into at most shards lists of paths whose
+    total sizes are as even as possible, biggest files first.
+    """
+    groups = [(0, n, []) for n in range(min(shards, len(files)))]
+    heapq.heapify(groups)
+    for path, size in sorted(files, key=lambda f: f[1], reverse=True):
+        total, n, paths = heapq.heappop(groups)
+        paths.append(path)
+        heapq.heappush(groups, (total + size, n, paths))
+    return [paths for _, _, paths in sorted(groups, key=lambda g: g[1])]
+
+
+def rsync_sharded(
+    source, files, destination, shards, rsh=None, progress=None, resume=False
+):
+    """
+    Transfers files, a list of (path relative to source, size), from
+    source to destination with up to shards rsync processes at a time.
+    Returns 0 if all succeeded, or the status of the first that did not
+    (20, interrupted, taking precedence).  progress, if given, gets the
+    progress of all of them together.
+    """
+    returncodes = []
+    total = sum(size for _, size in files)
+    latest = {}
+    lock = Lock()
+
+    def report(n, update):
+        with lock:
+            latest[n] = update
+            done = sum(u.bytes for u in latest.values())
+            rate = sum(u.rate for u in latest.values())
+            progress(
+                RsyncProgress(
+                    done,
+                    min(done * 100 // total, 100) if total else 100,
+                    rate,
+                    int(max(total - done, 0) / rate) if rate else None,
+                )
+            )
+
+    def run(n, paths):
+        with tempfile.NamedTemporaryFile("wb", prefix=".rsync-shard-") as f:
+            f.write(b"".join(os.fsencode(p) + b"\0" for p in paths))
+            f.flush()
+            returncodes.append(
+                rsync(
+                    source,
+                    destination,
+                    rsh=rsh,
+                    extra_opts=["--from0", "--files-from=%s" % f.name],
+                    progress=None if progress is None else lambda u: report(n, u),
+                    resume=resume,
+                )
+            )
+
+    threads = [
+        Thread(target=run, args=(n, p))
+        for n, p in enumerate(split_shards(files, shards))
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if 20 in returncodes:
+        return 20
+    return next((r for r in returncodes if r != 0), 0)
 
 
 def quote_cmdline(cmdline):
@@ -48,18 +244,104 @@ def quote_cmdline(cmdline):
     return " ".join(shell_quote(x) for x in cmdline)
 
 
-def ssh_getstdout(hostname, cmdline):
+SSH_OPTS = ["-o", "BatchMode yes", "-o", "ForwardX11 no"]
+
+
+def ssh_getstdout(hostname, cmdline, ssh_opts=(), inp=None, encoding="utf-8"):
     cmd = quote_cmdline(cmdline)
     return getstdout(
-        ["ssh", "-o", "BatchMode yes", "-o", "ForwardX11 no", hostname, cmd]
+        ["ssh"] + SSH_OPTS + list(ssh_opts) + [hostname, cmd], inp, encoding
     )
 
 
-def ssh_passthru(hostname, cmdline):
+def ssh_passthru(hostname, cmdline, ssh_opts=()):
     cmd = quote_cmdline(cmdline)
-    return passthru(
-        ["ssh", "-o", "BatchMode yes", "-o", "ForwardX11 no", hostname, cmd]
-    )
+    return passthru(["ssh"] + SSH_OPTS + list(ssh_opts) + [hostname, cmd])
+
+
+def ssh_popen(hostname, cmdline, ssh_opts=(), **kwargs):
+    """Starts cmdline on hostname, returning the Popen of the ssh client."""
+    cmd = quote_cmdline(cmdline)
+    return Popen(["ssh"] + SSH_OPTS + list(ssh_opts) + [hostname, cmd], **kwargs)
+
+
+class SSHMaster:
+    """
+    A multiplexed SSH connection (ControlMaster) to a host.
+
+    Commands run with the options returned by opts() go through the master
+    connection when it is up, and fall back to a connection of their own
+    when it is not, so a dead master only costs handshakes, never errors.
+    """
+
+    # Seconds the master lingers once idle, in case we die without
+    # closing it.
+    persist = 600
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        rundir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+        # UNIX socket paths are short; hash the host name to fit, along
+        # with what tells this master from others to the same host.
+        digest = hashlib.sha1(
+            ("%s %s" % (hostname, id(self))).encode("utf-8")
+        ).hexdigest()[:16]
+        self.control_path = os.path.join(
+            rundir, "seedboxtools-ssh-%s-%s" % (os.getpid(), digest)
+        )
+        self._lock = Lock()
+
+    def opts(self):
+        """SSH options that route a command through this master."""
+        return ["-o", "ControlPath %s" % self.control_path, "-o", "ControlMaster no"]
+
+    def rsh(self):
+        """The remote shell command line for rsync -e."""
+        return ["ssh"] + SSH_OPTS + self.opts()
+
+    def _control(self, command):
+        with open(os.devnull, "w") as null:
+            return call(
+                ["ssh"] + SSH_OPTS + self.opts() + ["-O", command, self.hostname],
+                stdin=null,
+                stdout=null,
+                stderr=null,
+            )
+
+    def alive(self):
+        return os.path.exists(self.control_path) and self._control("check") == 0
+
+    def ensure(self):
+        """Starts the master, or restarts it if it has died.  Returns
+        True if the master is up."""
+        with self._lock:
+            if self.alive():
+                return True
+            try:
+                os.unlink(self.control_path)
+            except OSError:
+                pass
+            cmdline = ["ssh"] + SSH_OPTS + [
+                "-o",
+                "ControlPath %s" % self.control_path,
+                "-o",
+                "ControlMaster yes",
+                "-o",
+                "ControlPersist %s" % self.persist,
+                "-o",
+                "ServerAliveInterval 30",
+                "-f",
+                "-N",
+                self.hostname,
+            ]
+            with open(os.devnull) as null:
+                returncode = call(cmdline, stdin=null)
+            return returncode == 0
+
+    def close(self):
+        with self._lock:
+            if os.path.exists(self.control_path):
+                self._control("exit")
 
 
 def firstcomponent(path):
@@ -74,6 +356,42 @@ def firstcomponent(path):
     return oldpath
 
 
+def parse_bool(value):
+    """Interprets a configuration value as a boolean."""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "yes", "true", "on")
+
+
+def parse_size(text):
+    """Returns the bytes in a size like "1.5 GB" (as torrent listings show
+    them), "10G" or "4096", or None if text is not a size."""
+    match = re.match(r"([0-9.]+) *([KMGT]?)(I?B)?$", text.strip().upper())
+    if not match:
+        return None
+    try:
+        number = float(match.group(1))
+    except ValueError:
+        return None
+    return int(number * 1024 ** " KMGT".index(match.group(2) or " "))
+
+
+def cache_dir():
+    """Returns (creating it if need be) the cache directory of seedboxtools."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    path = os.path.join(base, "seedboxtools")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_atomically(path, data):
+    """Replaces the contents of path with data (bytes) in one step."""
+    tmp = "%s.%s.tmp" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.rename(tmp, path)
+
+
 # unix process utilities
 
 
@@ -173,6 +491,7 @@ Icon = % s
 
 
 def mark_dir_complete(filename):
+    fswatch.shared_watcher().cancel(filename)
     set_dir_icon(filename, "dialog-ok-apply.png")
 
 
@@ -181,24 +500,12 @@ def mark_dir_downloading(filename):
 
 
 def mark_dir_error(filename):
+    fswatch.shared_watcher().cancel(filename)
     set_dir_icon(filename, "dialog-cancel.png")
 
 
 def mark_dir_downloading_when_it_appears(filename):
-    isdir = os.path.isdir
-    tiem = time.time
-    sleep = time.sleep
-    starttime = tiem()
-
-    def dowatch():
-        while not isdir(filename) and tiem() - starttime < 600:
-            sleep(0.1)
-        if isdir(filename):
-            mark_dir_downloading(filename)
-
-    tehrd = Thread(target=dowatch)
-    tehrd.setDaemon(True)
-    tehrd.start()
+    fswatch.shared_watcher().when_dir_appears(filename, mark_dir_downloading)
 
 
 # message reporting utilities
@@ -258,18 +565,24 @@ def set_verbose(v):
     verbose = v
 
 
+# Transfers report from several threads; keep their lines whole.
+_report_lock = Lock()
+
+
 def report_message(text):
     global verbose
     if verbose:
         if use_linux_gui():
             notify_send(text.capitalize())
-        print(text, file=sys.stderr)
+        with _report_lock:
+            print(text, file=sys.stderr)
 
 
 def report_error(text):
     if use_linux_gui():
         notify_send(text.capitalize(), transient=False)
-    print(text, file=sys.stderr)
+    with _report_lock:
+        print(text, file=sys.stderr)
 
 
 def executable_exists(path):
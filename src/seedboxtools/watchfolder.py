@@ -0,0 +1,226 @@
+"""
+Watch folders for uploadtorrents
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ConnectionError
+from seedboxtools import fswatch, util
+from seedboxtools.clients import TemporaryMalfunction
+
+DONE_DIR = "done"
+ERROR_DIR = "error"
+
+# Torrent files, and files holding a magnet link.
+SUFFIXES = (".torrent", ".magnet")
+
+_MISSING = object()
+
+
+class WatchFolder:
+    """
+    Submits the torrent files and .magnet files (holding a magnet link)
+    that show up in dirs to the seedbox through client, then moves each of
+    them to the done or error folder inside its directory.
+
+    A file is submitted settle seconds after it was last closed or moved
+    in, and not while something still writes to it.  Files that are ready
+    at the same time go up in batches of client.upload_batch_size, up to
+    jobs batches at a time.  Files that failed because the seedbox could
+    not be reached stay put, and are submitted again after retry_delay
+    seconds.  Without inotify, the directories are checked every
+    poll_interval seconds, and files are ready once they stop changing.
+    """
+
+    settle = 0.5
+    poll_interval = 1.0
+    retry_delay = 60
+
+    def __init__(self, client, dirs, jobs=4, report=None):
+        self.client = client
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.jobs = jobs
+        self.report = report or (lambda uploadable, error: None)
+        # path: when it is ready to go.
+        self._pending = {}
+        # path: (size, mtime) as of the last check, when polling.
+        self._seen = {}
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        for d in self.dirs:
+            for sub in (DONE_DIR, ERROR_DIR):
+                os.makedirs(os.path.join(d, sub), exist_ok=True)
+        self._wds = {}
+        try:
+            self._inotify = fswatch.Inotify()
+        except OSError:
+            self._inotify = None
+        if self._inotify is not None:
+            mask = (
+                fswatch.IN_CREATE
+                | fswatch.IN_MODIFY
+                | fswatch.IN_CLOSE_WRITE
+                | fswatch.IN_MOVED_TO
+            )
+            for d in self.dirs:
+                self._wds[self._inotify.add_watch(d, mask)] = d
+
+    def stop(self):
+        """Makes run() return, once the submissions under way are done."""
+        self._stop.set()
+
+    def run(self):
+        """Watches the directories until stop() is called."""
+        if self._inotify is not None:
+            # Whatever is there already, now that the watches are in place.
+            self._rescan()
+        with ThreadPoolExecutor(self.jobs) as pool:
+            while not self._stop.is_set():
+                if self._inotify is None:
+                    self._poll()
+                else:
+                    self._read()
+                ready = self._ready()
+                size = self.client.upload_batch_size
+                for n in range(0, len(ready), size):
+                    pool.submit(self._submit, ready[n : n + size])
+        if self._inotify is not None:
+            self._inotify.close()
+
+    @staticmethod
+    def _wanted(name):
+        return name.endswith(SUFFIXES) and not name.startswith(".")
+
+    def _rescan(self):
+        ready = time.monotonic() + self.settle
+        with self._lock:
+            for d in self.dirs:
+                for name in os.listdir(d):
+                    if self._wanted(name):
+                        self._pending.setdefault(os.path.join(d, name), ready)
+
+    def _read(self):
+        timeout = 1.0
+        with self._lock:
+            if self._pending:
+                first = min(self._pending.values())
+                timeout = min(max(first - time.monotonic(), 0), timeout)
+        events = self._inotify.read(timeout)
+        with self._lock:
+            for wd, mask, _, name in events:
+                d = self._wds.get(wd)
+                if d is None or mask & fswatch.IN_ISDIR or not self._wanted(name):
+                    continue
+                path = os.path.join(d, name)
+                if mask & (fswatch.IN_CLOSE_WRITE | fswatch.IN_MOVED_TO):
+                    self._pending[path] = time.monotonic() + self.settle
+                else:
+                    # Still being written; it is ready once closed.
+                    self._pending.pop(path, None)
+        if any(mask & fswatch.IN_Q_OVERFLOW for _, mask, _, _ in events):
+            # Events were lost.
+            self._rescan()
+
+    def _poll(self):
+        self._stop.wait(self.poll_interval)
+        now = time.monotonic()
+        seen = {}
+        with self._lock:
+            for d in self.dirs:
+                for name in os.listdir(d):
+                    if not self._wanted(name):
+                        continue
+                    path = os.path.join(d, name)
+                    try:
+                        s = os.stat(path)
+                    except OSError:
+                        continue
+                    seen[path] = (s.st_size, s.st_mtime)
+                    if self._seen.get(path) != seen[path]:
+                        # New or changed; ready if it stays like this.
+                        self._pending[path] = now + self.settle
+        self._seen = seen
+
+    def _ready(self):
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, when in list(self._pending.items()):
+                if when > now or path in self._busy:
+                    continue
+                del self._pending[path]
+                if os.path.isfile(path):
+                    ready.append(path)
+                    self._busy.add(path)
+        return sorted(ready)
+
+    def _submit(self, paths):
+        uploadables = []
+        for path in paths:
+            if not path.endswith(".magnet"):
+                uploadables.append(path)
+                continue
+            try:
+                with open(path) as f:
+                    link = f.read().strip()
+                if not link.startswith("magnet:"):
+                    raise ValueError("%s holds no magnet link" % path)
+                uploadables.append(link)
+            except (IOError, OSError, ValueError) as e:
+                uploadables.append(e)
+        batch = [u for u in uploadables if isinstance(u, str)]
+        try:
+            results = iter(self.client.upload_many(batch) if batch else [])
+        except Exception as e:
+            results = iter([e] * len(batch))
+        for path, uploadable in zip(paths, uploadables):
+            try:
+                if isinstance(uploadable, str):
+                    error = next(results, _MISSING)
+                    if error is _MISSING:
+                        error = RuntimeError("the seedbox client gave no result")
+                else:
+                    uploadable, error = path, uploadable
+                self._finish(path, uploadable, error)
+            except Exception as e:
+                util.report_error(
+                    "Cannot submit %s -- %s: %s"
+                    % (os.path.basename(path), type(e).__name__, e)
+                )
+                traceback.print_exc()
+            finally:
+                with self._lock:
+                    self._busy.discard(path)
+
+    def _finish(self, path, uploadable, error):
+        """Reports how the submission of path went, and moves it out of
+        the way, or has it submitted again later if the seedbox could not
+        be reached."""
+        if isinstance(error, (ConnectionError, TemporaryMalfunction)):
+            util.report_error(
+                "Cannot submit %s -- trying again in %s seconds: %s"
+                % (os.path.basename(path), self.retry_delay, error)
+            )
+            with self._lock:
+                self._pending[path] = time.monotonic() + self.retry_delay
+            return
+        self.report(uploadable, error)
+        self._move(path, DONE_DIR if error is None else ERROR_DIR)
+
+    @staticmethod
+    def _move(path, subdir):
+        d, name = os.path.split(path)
+        base, ext = os.path.splitext(name)
+        dest = os.path.join(d, subdir, name)
+        n = 1
+        while os.path.exists(dest):
+            dest = os.path.join(d, subdir, "%s-%s%s" % (base, n, ext))
+            n += 1
+        try:
+            os.rename(path, dest)
+        except OSError as e:
+            util.report_error("Cannot move %s to %s: %s" % (path, dest, e))